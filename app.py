@@ -4,6 +4,7 @@ import random
 import datetime
 import pytz
 import csv
+from concurrent.futures import ThreadPoolExecutor
 from playwright.sync_api import sync_playwright
 
 # Load .env file
@@ -14,13 +15,23 @@ try:
 except ImportError:
     print("⚠️  python-dotenv not installed. Install with: pip install python-dotenv")
 
-from reports import process_financial_report, process_ro_marketing_report, combine_ro_reports, verify_data_accuracy
-from sql import upload_all_reports
+from reports import (process_financial_report, process_ro_reports_batch, combine_ro_reports, run_verification,
+                     EXPECTED_LOCATIONS)
+from sql import upload_table_report, create_connection, release_connection, reset_connection_stats, get_connection_stats, get_upload_stats, reset_upload_stats
+from artifact_store import store_artifact, run_store_maintenance
+from artifact_manifest import record_artifact
+from pipeline import Stage, run_pipeline
+import upload_queue
+import notification_queue
 
 class TekmetricSession:
+    # Replays feed recorded exports through the same download code and must not re-archive them
+    store_downloads = True
+    
     def __init__(self, page):
         self.page = page
         self.is_authenticated = False
+        self.first_download_at = None
         
     def wait_random(self, min_sec=2, max_sec=4):
         time.sleep(random.uniform(min_sec, max_sec))
@@ -177,6 +188,8 @@ class TekmetricSession:
             min_size = 100 if report_type == "financial" else 50
             if os.path.exists(file_path) and os.path.getsize(file_path) > min_size:
                 print(f"✅ Downloaded: {filename} ({os.path.getsize(file_path)} bytes)")
+                if self.first_download_at is None:
+                    self.first_download_at = time.perf_counter()
                 return filename  # Return the actual filename used
             else:
                 print(f"❌ Download failed or file too small")
@@ -195,18 +208,20 @@ def format_date(dt):
 def format_date_short(dt):
     return f"{dt.month:02d}.{dt.day:02d}.{dt.year-2000:02d}"
 
-def get_current_hour_12format():
-    az_now = get_arizona_time()
+def get_current_hour_12format(az_now=None):
+    az_now = az_now or get_arizona_time()
     return az_now.strftime("%I %p").lstrip('0')
 
-def get_date_info():
-    az_now = get_arizona_time()
+def get_date_info(az_now=None):
+    """Dates for one run, all taken from a single clock reading (run_at keys its artifacts)"""
+    az_now = az_now or get_arizona_time()
     return {
         "yesterday_file": format_date(az_now),
         "yesterday_short": format_date_short(az_now),
         "yesterday_us": az_now.strftime("%m/%d/%Y"),
         "yesterday_date": az_now.date(),
-        "current_hour": get_current_hour_12format()
+        "current_hour": get_current_hour_12format(az_now),
+        "run_at": az_now
     }
 
 def setup_directories():
@@ -260,6 +275,8 @@ def create_empty_financial_csv_safe(filename, directory, report_date, created_at
         return False
 
 def download_financial_report(session, dirs, dates):
+    """Browser half of the financial report: returns {'filename', 'hour'} (filename None if no download)"""
+    az_time = dates['run_at']
     try:
         print("\n📊 DOWNLOADING FINANCIAL REPORT")
         print("="*50)
@@ -291,30 +308,53 @@ def download_financial_report(session, dirs, dates):
         session.page.goto(financial_url, timeout=90000)
         session.page.wait_for_timeout(5000)
         
-        az_time = get_arizona_time()
         base_filename = f"{dates['yesterday_file']}_H{az_time.hour:02d}.csv"
         
         # Use safe download method
         actual_filename = session.download_csv_safe(base_filename, dirs["financial"], "financial")
         
         if actual_filename:
-            process_financial_report(actual_filename, dates['current_hour'])
+            financial_path = os.path.join(dirs["financial"], actual_filename)
+            if session.store_downloads:
+                store_artifact(financial_path, "financial", "ALL", dates['yesterday_date'], az_time.hour)
+            record_artifact(financial_path, "financial", "ALL", dates['yesterday_date'], az_time.hour, "downloaded")
+        
+        return {'filename': actual_filename or None, 'base_filename': base_filename, 'hour': az_time.hour}
+        
+    except Exception as e:
+        print(f"❌ Financial report error: {e}")
+        # Continue with RO reports even if financial fails
+        return {'filename': None, 'base_filename': f"{dates['yesterday_file']}_H{az_time.hour:02d}.csv",
+                'hour': az_time.hour}
+
+def process_financial_download(download, dirs, dates):
+    """CPU half of the financial report; falls back to an all-zero file when nothing downloaded"""
+    try:
+        actual_filename = download['filename']
+        if actual_filename:
+            processed = process_financial_report(actual_filename, dates['current_hour'])
+            record_artifact(os.path.join(dirs["financial"], actual_filename), "financial", "ALL",
+                            dates['yesterday_date'], download['hour'], "processed", "ok" if processed else "failed")
             print("✅ Financial report processed successfully")
-        else:
-            print("⚠️  Creating empty financial file...")
-            actual_filename = create_empty_financial_csv_safe(base_filename, dirs["financial"], 
-                                     dates['yesterday_us'], dates['current_hour'])
-            if actual_filename:
-                process_financial_report(actual_filename, dates['current_hour'])
-                print("✅ Empty financial report processed")
+            return bool(processed)
         
+        print("⚠️  Creating empty financial file...")
+        actual_filename = create_empty_financial_csv_safe(download['base_filename'], dirs["financial"],
+                                 dates['yesterday_us'], dates['current_hour'])
+        if actual_filename:
+            process_financial_report(actual_filename, dates['current_hour'])
+            record_artifact(os.path.join(dirs["financial"], actual_filename), "financial", "ALL",
+                            dates['yesterday_date'], download['hour'], "processed", "empty")
+            print("✅ Empty financial report processed")
         return True
         
     except Exception as e:
-        print(f"❌ Financial report error: {e}")
-        return True  # Continue with RO reports even if financial fails
+        print(f"❌ Financial processing error: {e}")
+        return False
 
 def download_ro_reports(session, dirs, dates):
+    """Browser half of the RO reports: returns {'success', 'downloads': [(location, filename)], 'hour'}"""
+    az_time = dates['run_at']
     try:
         print("\n📈 DOWNLOADING RO MARKETING REPORTS")
         print("="*50)
@@ -329,7 +369,7 @@ def download_ro_reports(session, dirs, dates):
         ]
         
         success_count = 0
-        az_time = get_arizona_time()
+        downloads = []
         
         for i, location in enumerate(locations):
             try:
@@ -352,27 +392,253 @@ def download_ro_reports(session, dirs, dates):
                 actual_filename = session.download_csv_safe(base_filename, dirs["ro"], "RO")
                 
                 if actual_filename:
-                    process_ro_marketing_report(location['name'], actual_filename, dates['current_hour'])
-                    print(f"✅ {location['name']} processed successfully")
+                    ro_path = os.path.join(dirs["ro"], actual_filename)
+                    if session.store_downloads:
+                        store_artifact(ro_path, "ro", location['name'], dates['yesterday_date'], az_time.hour)
+                    record_artifact(ro_path, "ro", location['name'], dates['yesterday_date'], az_time.hour,
+                                    "downloaded")
+                    downloads.append((location['name'], actual_filename))
+                    print(f"✅ {location['name']} downloaded")
                 else:
                     print(f"⚠️  Creating empty file for {location['name']}...")
-                    # Create empty RO file logic here
+                    # The combine step fills in a placeholder; record the miss so the manifest shows it
+                    record_artifact(os.path.join(dirs["ro"], base_filename), "ro", location['name'],
+                                    dates['yesterday_date'], az_time.hour, "downloaded", "failed")
                 
                 success_count += 1
                 session.wait_random(2, 3)
                 
             except Exception as e:
                 print(f"❌ Error with {location['name']}: {e}")
+                record_artifact(os.path.join(dirs["ro"], f"{location['name'].replace(' ', '-')}-"
+                                f"{dates['yesterday_short']}_H{az_time.hour:02d}.csv"), "ro", location['name'],
+                                dates['yesterday_date'], az_time.hour, "downloaded", "failed")
                 success_count += 1  # Continue with other locations
         
-        print(f"\n📊 RO processing completed: {success_count}/6 locations")
-        return success_count >= 4
+        print(f"\n📊 RO downloads completed: {success_count}/6 locations")
+        return {'success': success_count >= 4, 'downloads': downloads, 'hour': az_time.hour}
         
     except Exception as e:
         print(f"❌ RO reports error: {e}")
+        return {'success': False, 'downloads': [], 'hour': az_time.hour}
+
+def process_ro_downloads(download, dates):
+    """Parse/normalize the downloaded RO files (fans out to worker processes); returns the download's success"""
+    if download['downloads']:
+        print(f"\n🔧 Processing {len(download['downloads'])} downloaded RO reports...")
+        for result in process_ro_reports_batch(download['downloads'], dates['current_hour']):
+            record_artifact(result['filepath'], "ro", result['location'], dates['yesterday_date'],
+                            download['hour'], "processed",
+                            "empty" if result['created_empty'] else "ok" if result['success'] else "failed")
+    return download['success']
+
+WARMUP_CONFIG = {
+    # Minutes before the scheduled trigger to launch the browser, log in and open SQL/Graph
+    'minutes': int(os.getenv('WARMUP_MINUTES', '3'))
+}
+
+def launch_browser(playwright):
+    """Headless Chromium plus a download-enabled page, returns (browser, page)"""
+    browser = playwright.chromium.launch(
+        headless=True,  # Force headless
+        args=[
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-gpu',
+            '--disable-web-security',
+            '--disable-extensions',
+            '--no-first-run',
+            '--disable-default-apps'
+        ]
+    )
+    
+    context = browser.new_context(
+        accept_downloads=True,
+        viewport={"width": 1920, "height": 1080}
+    )
+    
+    page = context.new_page()
+    page.set_default_timeout(90000)
+    return browser, page
+
+def warm_sql_connection():
+    """Open a pooled connection and hand it straight back, so the run's first checkout is warm"""
+    conn = create_connection()
+    if not conn:
         return False
+    release_connection(conn)
+    return True
+
+def warm_graph_token():
+    from notifications import get_access_token
+    return get_access_token() is not None
+
+def close_warm_session(warm):
+    try:
+        if warm.get('browser'):
+            warm['browser'].close()
+    except Exception as e:
+        print(f"⚠️ Browser close failed: {e}")
+    finally:
+        warm['playwright'].stop()
+
+def warm_up(graph_token=True):
+    """Launch the browser and log in on this thread while SQL and the Graph token warm up on others.
 
-def main():
+    Returns a warm session for main(), or None, with everything already
+    torn down, if any part failed (the run then starts cold as before).
+    graph_token=False skips the token, for processes that do not send mail.
+    """
+    started = time.perf_counter()
+    print(f"\n🔥 WARM-UP: browser + login, SQL connection{' and Graph token' if graph_token else ''} in parallel")
+    warm = {'playwright': sync_playwright().start(), 'browser': None, 'session': None}
+    
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup") as executor:
+        futures = [('sql', executor.submit(warm_sql_connection))]
+        if graph_token:
+            futures.append(('graph_token', executor.submit(warm_graph_token)))
+        
+        # Playwright's sync API is bound to this thread, so the browser stays here
+        logged_in = False
+        try:
+            warm['browser'], page = launch_browser(warm['playwright'])
+            warm['session'] = TekmetricSession(page)
+            logged_in = warm['session'].login()
+        except Exception as e:
+            print(f"❌ Browser warm-up failed: {e}")
+        
+        steps = {'login': logged_in}
+        for name, future in futures:
+            try:
+                steps[name] = bool(future.result())
+            except Exception as e:
+                print(f"❌ {name} warm-up failed: {e}")
+                steps[name] = False
+    
+    elapsed = time.perf_counter() - started
+    failed = [name for name, ok in steps.items() if not ok]
+    if failed:
+        print(f"⚠️ Warm-up aborted after {elapsed:.1f}s ({', '.join(failed)} failed), run will start cold")
+        close_warm_session(warm)
+        return None
+    
+    print(f"✅ Warm-up ready in {elapsed:.1f}s")
+    return warm
+
+def build_run_result(dates, started_at, login, results=None, timings=None, error=None):
+    """What happened in this run (stages, timings, counts, per-shop status) for the notification.
+
+    Built only from values the run already holds, so the email needs no
+    file reads or SQL probes of its own.
+    """
+    results = results or {}
+    timings = timings or {}
+    recon = results.get('verify')
+    financial_download = results.get('financial_download') or {}
+    downloaded = {location for location, _ in (results.get('ro_download') or {}).get('downloads', [])}
+    
+    upload_stats = get_upload_stats()
+    uploads = {}
+    for stage_name, table in (('financial_upload', 'custom_financials_2'), ('ro_upload', 'ro_marketing_2')):
+        if stage_name in results:
+            uploads[table] = dict(upload_stats.get(table, {}), success=bool(results[stage_name]))
+    
+    shops = {}
+    for location in EXPECTED_LOCATIONS:
+        entry = (recon or {}).get('locations', {}).get(location, {})
+        shops[location] = {
+            'ro_downloaded': location in downloaded,
+            'in_financial': entry.get('in_financial', False),
+            'in_ro': entry.get('in_ro', False),
+            'car_count': entry.get('car_count', 0),
+            'ro_count': entry.get('ro_count', 0),
+            'matched': location not in (recon or {}).get('mismatched_locations', [])
+        }
+    
+    return {
+        'report_date': dates['yesterday_us'],
+        'created_at_hour': dates['current_hour'],
+        'started_at': started_at,
+        'login': login,
+        'error': error,
+        'stages': {name: {'seconds': round(timing['end'] - timing['start'], 3), 'error': timing['error']}
+                   for name, timing in timings.items()},
+        'files': {
+            'financial': bool(results.get('financial_process')),
+            'financial_downloaded': bool(financial_download.get('filename')),
+            'ro': bool(results.get('combine')),
+            'ro_downloaded': len(downloaded)
+        },
+        'reconciliation': recon,
+        'uploads': uploads,
+        'upload_success': len(uploads) == 2 and all(upload['success'] for upload in uploads.values()),
+        'shops': shops
+    }
+
+# Result of the last main() in this process, for the scheduler parent of an isolated run
+LAST_RUN = {'result': None}
+
+def send_run_notification(run_result):
+    """Hand the run result to the notification queue; delivery happens on the worker thread"""
+    LAST_RUN['result'] = run_result
+    try:
+        from notifications import queue_hourly_report
+        queue_hourly_report(run_result)
+    except Exception as e:
+        print(f"⚠️ Notification failed: {e}")
+
+def build_run_stages(session, dirs, dates):
+    """The hourly run as a dependency graph.
+
+    Browser stages stay on the main thread (Playwright's sync API), so the
+    financial file is processed and uploaded while the RO downloads continue,
+    and verification overlaps the RO upload.
+    """
+    def financial_upload(results):
+        print("\n📤 Uploading financial report to SQL...")
+        return upload_table_report('custom_financials_2', dates['current_hour'], dates['run_at'])
+    
+    def combine(results):
+        if not results['ro_process']:
+            return False
+        return combine_ro_reports(dates['yesterday_short'], dates['current_hour'], dates['run_at']) is not None
+    
+    def ro_upload(results):
+        print("\n📤 Uploading RO reports to SQL...")
+        return upload_table_report('ro_marketing_2', dates['current_hour'], dates['run_at'])
+    
+    def maintenance(results):
+        run_store_maintenance()
+        if upload_queue.QUEUE_CONFIG['enabled']:
+            upload_queue.prune_finished()
+        if notification_queue.NOTIFY_CONFIG['enabled']:
+            notification_queue.prune_finished()
+    
+    def verify(results):
+        return run_verification(dates['yesterday_file'], dates['yesterday_short'], dates['current_hour'],
+                                dates['run_at'])
+    
+    return [
+        Stage('financial_download', lambda results: download_financial_report(session, dirs, dates),
+              main_thread=True),
+        Stage('ro_download', lambda results: download_ro_reports(session, dirs, dates),
+              deps=['financial_download'], main_thread=True),
+        Stage('financial_process', lambda results: process_financial_download(results['financial_download'], dirs, dates),
+              deps=['financial_download']),
+        Stage('financial_upload', financial_upload, deps=['financial_process']),
+        Stage('ro_process', lambda results: process_ro_downloads(results['ro_download'], dates),
+              deps=['ro_download']),
+        Stage('combine', combine, deps=['ro_process']),
+        Stage('ro_upload', ro_upload, deps=['combine']),
+        Stage('verify', verify, deps=['financial_process', 'combine']),
+        Stage('store_maintenance', maintenance, deps=['financial_upload', 'ro_upload'])
+    ]
+
+def main(warm=None, triggered_at=None):
+    """One hourly run; warm is a session from warm_up() (consumed and closed here)"""
+    triggered_at = triggered_at or time.perf_counter()
+    started_at = get_arizona_time()
+    dates = get_date_info()
     print("TEKMETRIC AUTOMATION - PERMISSION FIXED VERSION")
     print("="*60)
     
@@ -385,101 +651,76 @@ def main():
     
     if not email or not password:
         print("\n❌ Credentials not loaded!")
+        if warm:
+            close_warm_session(warm)
         # Send failure notification for missing credentials
-        try:
-            from notifications import send_hourly_automation_report
-            send_hourly_automation_report()
-        except Exception as e:
-            print(f"⚠️ Notification failed: {e}")
+        send_run_notification(build_run_result(dates, started_at, 'missing_credentials'))
         return False
     
     dirs = setup_directories()
-    dates = get_date_info()
+    reset_connection_stats()
+    reset_upload_stats()
     
     print(f"\nProcessing date: {dates['yesterday_us']} at {dates['current_hour']}")
     print("="*60)
     
-    with sync_playwright() as p:
-        browser = None
-        try:
-            browser = p.chromium.launch(
-                headless=True,  # Force headless
-                args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                    '--disable-web-security',
-                    '--disable-extensions',
-                    '--no-first-run',
-                    '--disable-default-apps'
-                ]
-            )
-            
-            context = browser.new_context(
-                accept_downloads=True,
-                viewport={"width": 1920, "height": 1080}
-            )
-            
-            page = context.new_page()
-            page.set_default_timeout(90000)
-            
+    if not warm:
+        warm = {'playwright': sync_playwright().start(), 'browser': None, 'session': None}
+    session = None
+    login = 'not_started'
+    try:
+        if warm['session']:
+            session = warm['session']
+            login = 'ok'
+            print("\nSTEP 1: Using warm browser session (logged in during warm-up)")
+        else:
+            warm['browser'], page = launch_browser(warm['playwright'])
             session = TekmetricSession(page)
             
             print("\nSTEP 1: Authenticating...")
             if not session.login():
                 print("❌ Authentication failed")
                 # Send failure notification for login failure
-                try:
-                    from notifications import send_hourly_automation_report
-                    send_hourly_automation_report()
-                except Exception as e:
-                    print(f"⚠️ Notification failed: {e}")
+                send_run_notification(build_run_result(dates, started_at, 'failed'))
                 return False
-            
-            print("\nSTEP 2: Downloading reports...")
-            financial_success = download_financial_report(session, dirs, dates)
-            ro_success = download_ro_reports(session, dirs, dates)
-            
-            if ro_success:
-                print("\nSTEP 3: Combining RO reports...")
-                combine_ro_reports(dates['yesterday_short'], dates['current_hour'])
-            
-            print("\nSTEP 4: Verifying data...")
-            verify_data_accuracy(dates['yesterday_file'], dates['yesterday_short'], dates['current_hour'])
-            
-            print("\nSTEP 5: Uploading to SQL...")
-            upload_success = upload_all_reports(dates['current_hour'])
-            
-            print("\n" + "="*60)
-            if upload_success:
-                print("✅ AUTOMATION COMPLETED SUCCESSFULLY!")
-            else:
-                print("⚠️  AUTOMATION COMPLETED WITH UPLOAD ERRORS")
-            print("="*60)
-            
-            # STEP 6: Send notification email after automation completes (success or failure)
-            print("\nSTEP 6: Sending hourly notification email...")
-            try:
-                from notifications import send_hourly_automation_report
-                send_hourly_automation_report()
-                print("✅ Hourly notification email sent")
-            except Exception as e:
-                print(f"⚠️ Notification failed: {e}")
-            
-            return upload_success
-            
-        except Exception as e:
-            print(f"\n❌ AUTOMATION FAILED: {e}")
-            # Send failure notification for general automation failure
-            try:
-                from notifications import send_hourly_automation_report
-                send_hourly_automation_report()
-            except Exception as e:
-                print(f"⚠️ Notification failed: {e}")
-            return False
-        finally:
-            if browser:
-                browser.close()
+            login = 'ok'
+        
+        print("\nSTEP 2: Running download → process → upload pipeline...")
+        results, timings = run_pipeline(build_run_stages(session, dirs, dates))
+        run_result = build_run_result(dates, started_at, login, results, timings)
+        upload_success = run_result['upload_success']
+        
+        print("\n" + "="*60)
+        if upload_success:
+            print("✅ AUTOMATION COMPLETED SUCCESSFULLY!")
+        else:
+            print("⚠️  AUTOMATION COMPLETED WITH UPLOAD ERRORS")
+        print("="*60)
+        
+        print("\nSTEP 3: Queueing hourly notification email...")
+        send_run_notification(run_result)
+        
+        return upload_success
+        
+    except Exception as e:
+        print(f"\n❌ AUTOMATION FAILED: {e}")
+        # Send failure notification for general automation failure
+        send_run_notification(build_run_result(dates, started_at, login, error=str(e)))
+        return False
+    finally:
+        close_warm_session(warm)
+        
+        if session and session.first_download_at:
+            print(f"⏱️  Trigger to first download: {session.first_download_at - triggered_at:.1f}s")
+        stats = get_connection_stats()
+        print(f"🔌 SQL connections: {stats['opened']} opened in {stats['connect_seconds']:.2f}s, "
+              f"{stats['reused']} reused, {stats['reconnects']} reconnects, {stats['idle']} idle")
+        for table, upload_stats in get_upload_stats().items():
+            if upload_stats.get('retries'):
+                print(f"🔁 {table}: {upload_stats['retries']} retries, "
+                      f"{upload_stats['backoff_seconds']:.1f}s backoff over {upload_stats['batches']} batches")
 
 if __name__ == "__main__":
     main()
+    from notifications import flush_notifications
+    flush_notifications()
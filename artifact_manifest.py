@@ -0,0 +1,249 @@
+import os
+import csv
+import sqlite3
+import hashlib
+import datetime
+import pytz
+
+MANIFEST_CONFIG = {
+    'db_path': os.getenv('ARTIFACT_MANIFEST_DB', os.path.join(os.getcwd(), "Artifact Store", "manifest.db"))
+}
+
+STAGES = ['downloaded', 'processed', 'combined', 'verified', 'uploaded']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    report TEXT NOT NULL,
+    shop TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    row_count INTEGER,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    -- The artifact store's index: the raw download's content hash (blob_*), kept when later
+    -- stages re-record the working file, and whether the blob has moved into its day archive
+    blob_hash TEXT,
+    blob_size INTEGER,
+    stored_size INTEGER,
+    blob_name TEXT,
+    stored_at TEXT,
+    archived INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (report, shop, report_date, hour)
+);
+CREATE INDEX IF NOT EXISTS ix_artifacts_run ON artifacts (report_date, hour);
+"""
+
+def get_arizona_time():
+    return datetime.datetime.now(pytz.timezone('US/Arizona'))
+
+def date_key(report_date):
+    if isinstance(report_date, (datetime.date, datetime.datetime)):
+        return report_date.strftime("%Y-%m-%d")
+    return str(report_date)
+
+def timestamp():
+    return get_arizona_time().strftime('%Y-%m-%dT%H:%M:%S')
+
+def connect(db_path=None):
+    db_path = db_path or MANIFEST_CONFIG['db_path']
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def describe_file(path):
+    """Size, SHA-256 and data row count of a CSV in one read"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        row_count = max(sum(1 for _ in csv.reader(file)) - 1, 0)
+    return os.path.getsize(path), digest.hexdigest(), row_count
+
+def record_artifact(path, report, shop, report_date, hour, stage, status='ok'):
+    """Register (or replace) the file a stage produced for (report, shop, date, hour); store fields are kept"""
+    try:
+        size, sha256, row_count = None, None, None
+        if os.path.exists(path):
+            size, sha256, row_count = describe_file(path)
+
+        conn = connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO artifacts "
+                    "(report, shop, report_date, hour, path, size, sha256, row_count, stage, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (report, shop, report_date, hour) DO UPDATE SET path = excluded.path, "
+                    "size = excluded.size, sha256 = excluded.sha256, row_count = excluded.row_count, "
+                    "stage = excluded.stage, status = excluded.status, updated_at = excluded.updated_at",
+                    (report, shop, date_key(report_date), int(hour), os.path.abspath(path), size, sha256,
+                     row_count, stage, status, timestamp())
+                )
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not record artifact {path}: {e}")
+        return False
+
+def mark_stage(report, shop, report_date, hour, stage, status='ok'):
+    """Advance the stage/status of an already recorded artifact"""
+    try:
+        conn = connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE artifacts SET stage = ?, status = ?, updated_at = ? "
+                    "WHERE report = ? AND shop = ? AND report_date = ? AND hour = ?",
+                    (stage, status, timestamp(), report, shop, date_key(report_date), int(hour))
+                )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ Could not update artifact stage: {e}")
+        return False
+
+def find_artifact(report, shop, report_date, hour):
+    """Primary-key lookup of one artifact, returns a dict or None"""
+    try:
+        conn = connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM artifacts WHERE report = ? AND shop = ? AND report_date = ? AND hour = ?",
+                (report, shop, date_key(report_date), int(hour))
+            ).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ Artifact manifest lookup failed: {e}")
+        return None
+
+def find_artifact_path(report, shop, report_date, hour, default_path=None):
+    """Path recorded for the artifact if it is still on disk, else the conventional default"""
+    artifact = find_artifact(report, shop, report_date, hour)
+    if artifact and os.path.exists(artifact['path']):
+        return artifact['path']
+    return default_path
+
+def list_run_artifacts(report_date, hour=None):
+    """All artifacts for a date (and optionally one hour), ordered for display"""
+    try:
+        conn = connect()
+        try:
+            if hour is None:
+                rows = conn.execute(
+                    "SELECT * FROM artifacts WHERE report_date = ? ORDER BY hour, report, shop",
+                    (date_key(report_date),)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM artifacts WHERE report_date = ? AND hour = ? ORDER BY report, shop",
+                    (date_key(report_date), int(hour))
+                ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ Artifact manifest listing failed: {e}")
+        return []
+
+def latest_run_hour(report_date):
+    """Hour of the most recent run recorded for a date, or None"""
+    try:
+        conn = connect()
+        try:
+            row = conn.execute("SELECT MAX(hour) FROM artifacts WHERE report_date = ?",
+                               (date_key(report_date),)).fetchone()
+            return row[0]
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ Artifact manifest lookup failed: {e}")
+        return None
+
+def record_blob(report, shop, report_date, hour, path, digest, blob_size, stored_size, stored_at=None):
+    """Index a stored raw download on its artifact row (created as 'downloaded' if new)"""
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO artifacts (report, shop, report_date, hour, path, size, sha256, stage, status, updated_at, "
+                "blob_hash, blob_size, stored_size, blob_name, stored_at, archived) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 'downloaded', 'ok', ?, ?, ?, ?, ?, ?, 0) "
+                "ON CONFLICT (report, shop, report_date, hour) DO UPDATE SET blob_hash = excluded.blob_hash, "
+                "blob_size = excluded.blob_size, stored_size = excluded.stored_size, blob_name = excluded.blob_name, "
+                "stored_at = excluded.stored_at, archived = 0",
+                (report, shop, date_key(report_date), int(hour), os.path.abspath(path), blob_size, digest, timestamp(),
+                 digest, blob_size, stored_size, os.path.basename(path), stored_at or timestamp())
+            )
+    finally:
+        conn.close()
+
+def stored_artifacts(report_date=None, before=None, archived=None, db_path=None):
+    """Rows that have a stored blob, filtered by date (exact or < before) and archived flag"""
+    clauses, params = ["blob_hash IS NOT NULL"], []
+    if report_date is not None:
+        clauses.append("report_date = ?")
+        params.append(date_key(report_date))
+    if before is not None:
+        clauses.append("report_date < ?")
+        params.append(date_key(before))
+    if archived is not None:
+        clauses.append("archived = ?")
+        params.append(int(archived))
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(f"SELECT * FROM artifacts WHERE {' AND '.join(clauses)} "
+                            "ORDER BY report_date, hour, report, shop", params).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+def mark_archived(report_date):
+    """Flag a day's stored blobs as moved into its archive"""
+    conn = connect()
+    try:
+        with conn:
+            conn.execute("UPDATE artifacts SET archived = 1 WHERE report_date = ? AND blob_hash IS NOT NULL",
+                         (date_key(report_date),))
+    finally:
+        conn.close()
+
+def live_blob_hashes():
+    """Hashes still served from the hot objects directory"""
+    conn = connect()
+    try:
+        return {row[0] for row in conn.execute(
+            "SELECT DISTINCT blob_hash FROM artifacts WHERE blob_hash IS NOT NULL AND archived = 0")}
+    finally:
+        conn.close()
+
+def forget_before(report_date):
+    """Drop rows for dates before report_date (their archives have expired)"""
+    conn = connect()
+    try:
+        with conn:
+            return conn.execute("DELETE FROM artifacts WHERE report_date < ?", (date_key(report_date),)).rowcount
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    import sys
+
+    target_date = sys.argv[1] if len(sys.argv) > 1 else get_arizona_time().strftime("%Y-%m-%d")
+    target_hour = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    for item in list_run_artifacts(target_date, target_hour):
+        print(f"{item['report_date']} H{item['hour']:02d} {item['report']:<12} {item['shop']:<16} "
+              f"{item['stage']:<10} {item['status']:<6} {item['row_count'] or 0:>5} rows  "
+              f"{os.path.basename(item['path'])}")
@@ -0,0 +1,276 @@
+import os
+import gzip
+import json
+import hashlib
+import zipfile
+import datetime
+import pytz
+
+import artifact_manifest
+
+STORE_CONFIG = {
+    'root': os.getenv('ARTIFACT_STORE_DIR', os.path.join(os.getcwd(), "Artifact Store")),
+    'compact_after_days': int(os.getenv('ARTIFACT_COMPACT_AFTER_DAYS', '2')),
+    'retention_days': int(os.getenv('ARTIFACT_RETENTION_DAYS', '90')),
+    'working_retention_days': int(os.getenv('WORKING_FILE_RETENTION_DAYS', '3'))
+}
+
+WORKING_DIRS = ["Financial Reports", "RO Reports"]
+
+def get_arizona_time():
+    return datetime.datetime.now(pytz.timezone('US/Arizona'))
+
+def get_store_paths():
+    root = STORE_CONFIG['root']
+    return {
+        'root': root,
+        'objects': os.path.join(root, "objects"),
+        'archives': os.path.join(root, "archives")
+    }
+
+def make_entry_key(report, shop, report_date, hour):
+    """Manifest key for one hourly artifact: report|shop|YYYY-MM-DD|HH"""
+    if isinstance(report_date, (datetime.date, datetime.datetime)):
+        report_date = report_date.strftime("%Y-%m-%d")
+    return f"{report}|{shop}|{report_date}|{int(hour):02d}"
+
+def object_path(digest):
+    """Blobs are fanned out by hash prefix so no directory grows unbounded"""
+    return os.path.join(get_store_paths()['objects'], digest[:2], f"{digest}.csv.gz")
+
+def archive_entry(row):
+    """A manifest row as the day archive's manifest.json entry (archives stay self-describing)"""
+    return {'hash': row['blob_hash'], 'size': row['blob_size'], 'stored': row['stored_size'],
+            'name': row['blob_name'], 'saved_at': row['stored_at']}
+
+def write_blob(payload):
+    """Store payload once per content hash, returns (digest, compressed_size, is_new)"""
+    digest = hashlib.sha256(payload).hexdigest()
+    path = object_path(digest)
+    if os.path.exists(path):
+        return digest, os.path.getsize(path), False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wb', compresslevel=9) as file:
+        file.write(payload)
+    os.replace(tmp_path, path)
+    return digest, os.path.getsize(path), True
+
+def store_artifact(filepath, report, shop, report_date, hour):
+    """Add a downloaded file to the content-addressed store and index it"""
+    try:
+        with open(filepath, 'rb') as file:
+            payload = file.read()
+
+        digest, stored_size, is_new = write_blob(payload)
+        artifact_manifest.record_blob(report, shop, report_date, hour, filepath, digest, len(payload), stored_size)
+
+        if is_new:
+            print(f"🗄️  Stored {os.path.basename(filepath)}: {len(payload)} -> {stored_size} bytes ({digest[:12]})")
+        else:
+            print(f"🗄️  {os.path.basename(filepath)} unchanged, deduplicated to {digest[:12]}")
+        return digest
+
+    except Exception as e:
+        print(f"⚠️ Could not store artifact {filepath}: {e}")
+        return None
+
+def read_archived_blob(report_date, digest):
+    archive_path = os.path.join(get_store_paths()['archives'], f"{report_date}.zip")
+    if not os.path.exists(archive_path):
+        return None
+    with zipfile.ZipFile(archive_path, 'r') as archive:
+        try:
+            return gzip.decompress(archive.read(f"objects/{digest}.csv.gz"))
+        except KeyError:
+            return None
+
+def load_archive_manifest(report_date):
+    archive_path = os.path.join(get_store_paths()['archives'], f"{report_date}.zip")
+    if not os.path.exists(archive_path):
+        return {}
+    with zipfile.ZipFile(archive_path, 'r') as archive:
+        return json.loads(archive.read("manifest.json"))
+
+def load_artifact(report, shop, report_date, hour):
+    """Return the raw bytes stored for (report, shop, date, hour), or None"""
+    key = make_entry_key(report, shop, report_date, hour)
+    date_key = key.split('|')[2]
+    try:
+        row = artifact_manifest.find_artifact(report, shop, date_key, hour)
+        if row and row['blob_hash']:
+            if not row['archived']:
+                with gzip.open(object_path(row['blob_hash']), 'rb') as file:
+                    return file.read()
+            return read_archived_blob(date_key, row['blob_hash'])
+
+        # Archives can outlive their manifest rows (copied in from elsewhere)
+        entry = load_archive_manifest(date_key).get(key)
+        if entry:
+            return read_archived_blob(date_key, entry['hash'])
+
+        return None
+    except Exception as e:
+        print(f"⚠️ Could not load artifact {key}: {e}")
+        return None
+
+def restore_artifact(report, shop, report_date, hour, dest_path):
+    """Write a stored artifact back out as a plain CSV"""
+    payload = load_artifact(report, shop, report_date, hour)
+    if payload is None:
+        return False
+    with open(dest_path, 'wb') as file:
+        file.write(payload)
+    return True
+
+def list_artifacts(report_date=None):
+    """List stored entries (hot and archived) as dicts, optionally for one date"""
+    entries = []
+    manifest_entries = {}
+
+    if report_date:
+        report_date = artifact_manifest.date_key(report_date)
+        manifest_entries.update(load_archive_manifest(report_date))
+    for row in artifact_manifest.stored_artifacts(report_date):
+        manifest_entries[make_entry_key(row['report'], row['shop'], row['report_date'], row['hour'])] = archive_entry(row)
+
+    for key, entry in manifest_entries.items():
+        report, shop, date_key, hour = key.split('|')
+        if report_date and date_key != report_date:
+            continue
+        entries.append(dict(entry, report=report, shop=shop, date=date_key, hour=int(hour)))
+
+    return sorted(entries, key=lambda e: (e['date'], e['hour'], e['report'], e['shop']))
+
+def compact_store(today=None):
+    """Roll hourly entries older than the compaction window into one zip per day"""
+    paths = get_store_paths()
+    today = today or get_arizona_time().date()
+    cutoff = (today - datetime.timedelta(days=STORE_CONFIG['compact_after_days'])).strftime("%Y-%m-%d")
+
+    by_date = {}
+    for row in artifact_manifest.stored_artifacts(before=cutoff, archived=False):
+        key = make_entry_key(row['report'], row['shop'], row['report_date'], row['hour'])
+        by_date.setdefault(row['report_date'], {})[key] = archive_entry(row)
+
+    if not by_date:
+        return 0
+
+    os.makedirs(paths['archives'], exist_ok=True)
+
+    for date_key, day_entries in sorted(by_date.items()):
+        archive_path = os.path.join(paths['archives'], f"{date_key}.zip")
+
+        # Merge with an existing archive for that day (late replays, reruns)
+        day_manifest = load_archive_manifest(date_key)
+        existing_blobs = {}
+        if os.path.exists(archive_path):
+            with zipfile.ZipFile(archive_path, 'r') as archive:
+                for name in archive.namelist():
+                    if name.startswith("objects/"):
+                        existing_blobs[name] = archive.read(name)
+        day_manifest.update(day_entries)
+
+        tmp_path = f"{archive_path}.tmp"
+        # Blobs are already gzip-compressed, so store them without recompressing
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+            archive.writestr("manifest.json", json.dumps(day_manifest, separators=(',', ':'), sort_keys=True))
+            written = set()
+            for name, blob in existing_blobs.items():
+                archive.writestr(name, blob)
+                written.add(name)
+            for entry in day_entries.values():
+                name = f"objects/{entry['hash']}.csv.gz"
+                if name not in written:
+                    archive.write(object_path(entry['hash']), name)
+                    written.add(name)
+        os.replace(tmp_path, archive_path)
+        artifact_manifest.mark_archived(date_key)
+
+        print(f"🗜️  Compacted {len(day_entries)} hourly artifacts into {date_key}.zip")
+
+    remove_unreferenced_blobs()
+    return sum(len(entries) for entries in by_date.values())
+
+def remove_unreferenced_blobs():
+    live = artifact_manifest.live_blob_hashes()
+    removed = 0
+    objects_dir = get_store_paths()['objects']
+    if not os.path.isdir(objects_dir):
+        return 0
+
+    for prefix in os.listdir(objects_dir):
+        prefix_dir = os.path.join(objects_dir, prefix)
+        for name in os.listdir(prefix_dir):
+            if name.split('.')[0] not in live:
+                os.remove(os.path.join(prefix_dir, name))
+                removed += 1
+        if not os.listdir(prefix_dir):
+            os.rmdir(prefix_dir)
+
+    return removed
+
+def apply_retention(today=None):
+    """Delete expired daily archives and stale working CSVs already held by the store"""
+    today = today or get_arizona_time().date()
+    removed_archives = 0
+    removed_files = 0
+
+    archive_cutoff = (today - datetime.timedelta(days=STORE_CONFIG['retention_days'])).strftime("%Y-%m-%d")
+    archives_dir = get_store_paths()['archives']
+    if os.path.isdir(archives_dir):
+        for name in os.listdir(archives_dir):
+            if name.endswith(".zip") and name[:-4] < archive_cutoff:
+                os.remove(os.path.join(archives_dir, name))
+                removed_archives += 1
+    artifact_manifest.forget_before(archive_cutoff)
+
+    file_cutoff = datetime.datetime.combine(
+        today - datetime.timedelta(days=STORE_CONFIG['working_retention_days']), datetime.time.min
+    ).timestamp()
+    for dir_name in WORKING_DIRS:
+        working_dir = os.path.join(os.getcwd(), dir_name)
+        if not os.path.isdir(working_dir):
+            continue
+        for entry in os.scandir(working_dir):
+            if entry.is_file() and entry.name.endswith(".csv") and entry.stat().st_mtime < file_cutoff:
+                try:
+                    os.remove(entry.path)
+                    removed_files += 1
+                except Exception as e:
+                    print(f"⚠️ Could not delete {entry.path}: {e}")
+
+    return removed_archives, removed_files
+
+def get_store_usage():
+    total = 0
+    for dirpath, _, filenames in os.walk(get_store_paths()['root']):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+def run_store_maintenance(today=None):
+    """Compaction + retention pass, safe to call at the end of every run"""
+    try:
+        compacted = compact_store(today)
+        removed_archives, removed_files = apply_retention(today)
+        usage = get_store_usage()
+
+        print(f"🗄️  Artifact store: {usage / 1024:.1f} KB, {compacted} entries compacted, "
+              f"{removed_archives} archives expired, {removed_files} working files pruned")
+        return True
+    except Exception as e:
+        print(f"⚠️ Artifact store maintenance failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--list":
+        target_date = sys.argv[2] if len(sys.argv) > 2 else None
+        for item in list_artifacts(target_date):
+            print(f"{item['date']} H{item['hour']:02d} {item['report']:<10} {item['shop']:<16} "
+                  f"{item['size']:>8} bytes  {item['hash'][:12]}  {item['name']}")
+    else:
+        run_store_maintenance()
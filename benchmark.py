@@ -0,0 +1,298 @@
+import os
+import sys
+import csv
+import time
+import random
+import shutil
+import tempfile
+
+MARKETING_SOURCES = ['Google', 'Yelp', 'Facebook', 'Referral', 'Drive By', 'Repeat Customer',
+                     'Fleet', 'Website', 'Mailer', 'Radio', 'Walk In', 'No Data']
+
+RO_HEADERS = ['Marketing Source', 'Total Sales', 'RO Count', 'New Sales', 'New RO Count',
+              'Repeat Sales', 'Repeat RO Count', 'Average RO', 'GP $', 'GP %', 'Close Ratio']
+
+def write_synthetic_ro_files(directory, file_count, rows_per_file=40):
+    """Write per-location RO exports shaped like Tekmetric's, returns (location, filename) pairs"""
+    rng = random.Random(file_count)
+    downloads = []
+    for i in range(file_count):
+        location = f"Shop {i:04d}"
+        filename = f"Shop-{i:04d}-bench.csv"
+        with open(os.path.join(directory, filename), 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(RO_HEADERS)
+            for j in range(rows_per_file):
+                ro_count = rng.randint(0, 30)
+                writer.writerow([f"{MARKETING_SOURCES[j % len(MARKETING_SOURCES)]} {j}",
+                                 f"${rng.uniform(0, 20000):,.2f}", ro_count,
+                                 f"${rng.uniform(0, 8000):,.2f}", ro_count // 2,
+                                 f"${rng.uniform(0, 8000):,.2f}", ro_count - ro_count // 2,
+                                 f"${rng.uniform(0, 900):,.2f}", f"${rng.uniform(0, 9000):,.2f}",
+                                 f"{rng.uniform(0, 70):.1f}%", f"{rng.uniform(0, 100):.1f}%"])
+        downloads.append((location, filename))
+    return downloads
+
+def bench_parse(file_counts=(6, 60, 600), pool_sizes=None):
+    """Serial vs process-pool RO normalization across growing shop counts"""
+    import reports
+
+    pool_sizes = pool_sizes or sorted({2, 4, os.cpu_count() or 1} - {1})
+    original_cwd = os.getcwd()
+    original_min_files = reports.PARSE_CONFIG['min_files_for_pool']
+    workdir = tempfile.mkdtemp(prefix="parse_bench_")
+
+    print("\n📊 PARSE/NORMALIZE BENCHMARK")
+    print("=" * 60)
+    print(f"CPUs: {os.cpu_count()}, pool sizes: {pool_sizes}")
+    print(f"{'Files':>6} {'Mode':>10} {'Seconds':>10} {'Files/s':>10} {'Speedup':>8}")
+
+    try:
+        os.chdir(workdir)
+        ro_dir = os.path.join(workdir, "RO Reports")
+        os.makedirs(ro_dir)
+        reports.PARSE_CONFIG['min_files_for_pool'] = 0
+
+        # Silence per-file progress lines so timings measure parsing, not the terminal
+        devnull = open(os.devnull, 'w')
+
+        for file_count in file_counts:
+            for name in os.listdir(ro_dir):
+                os.remove(os.path.join(ro_dir, name))
+            downloads = write_synthetic_ro_files(ro_dir, file_count)
+
+            serial_seconds = None
+            for pool_size in [0] + list(pool_sizes):
+                stdout = sys.stdout
+                sys.stdout = devnull
+                try:
+                    start = time.perf_counter()
+                    reports.process_ro_reports_batch(downloads, "1 PM", pool_size=pool_size)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    sys.stdout = stdout
+
+                if serial_seconds is None:
+                    serial_seconds = elapsed
+                mode = "serial" if pool_size == 0 else f"pool x{pool_size}"
+                print(f"{file_count:>6} {mode:>10} {elapsed:>10.3f} {file_count / elapsed:>10.0f} "
+                      f"{serial_seconds / elapsed:>7.2f}x")
+
+        devnull.close()
+    finally:
+        reports.PARSE_CONFIG['min_files_for_pool'] = original_min_files
+        os.chdir(original_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("=" * 60)
+    print("Set PARSE_POOL_SIZE / PARSE_POOL_MIN_FILES from the row where the pool first wins.")
+
+def synthetic_ro_rows(row_count, report_date="01/15/2025", created_at="1 PM"):
+    """Sanitized ro_marketing_2 headers plus row_count unique (source, location) rows"""
+    rng = random.Random(row_count)
+    headers = ['Marketing_Source', 'Total_Sales', 'RO_Count', 'New_Sales', 'New_RO_Count', 'Repeat_Sales',
+               'Repeat_RO_Count', 'Average_RO', 'GP_Dollar', 'GP_Percent', 'Location', 'Report_Date', 'Created_At']
+    data = []
+    for i in range(row_count):
+        ro_count = rng.randint(0, 30)
+        data.append([f"{MARKETING_SOURCES[i % len(MARKETING_SOURCES)]} {i}", f"${rng.uniform(0, 20000):,.2f}",
+                     str(ro_count), f"${rng.uniform(0, 8000):,.2f}", str(ro_count // 2),
+                     f"${rng.uniform(0, 8000):,.2f}", str(ro_count - ro_count // 2),
+                     f"${rng.uniform(0, 900):,.2f}", f"${rng.uniform(0, 9000):,.2f}",
+                     f"{rng.uniform(0, 70):.1f}%", f"Shop {i % 50:02d}", report_date, created_at])
+    return headers, data
+
+def bench_upload(row_counts=(1000, 10000, 50000), modes=('merge', 'row')):
+    """Staged MERGE vs row-by-row upsert against the local SQLite backend"""
+    workdir = tempfile.mkdtemp(prefix="upload_bench_")
+    # The backend is chosen when sql is imported, so point everything at the scratch dir first
+    os.environ['DB_BACKEND'] = 'sqlite'
+    os.environ['SQLITE_DB_PATH'] = os.path.join(workdir, "bench.db")
+    os.environ['SQL_SCHEMA_CACHE'] = os.path.join(workdir, "schema_cache.json")
+    os.environ['ARTIFACT_MANIFEST_DB'] = os.path.join(workdir, "manifest.db")
+    import sql
+
+    print("\n📊 UPLOAD BENCHMARK (SQLite backend)")
+    print("=" * 60)
+    print(f"{'Rows':>6} {'Mode':>6} {'Pass':>7} {'Seconds':>9} {'Rows/s':>9} {'Trips':>7}")
+
+    devnull = open(os.devnull, 'w')
+    try:
+        for row_count in row_counts:
+            headers, data = synthetic_ro_rows(row_count)
+            for mode in modes:
+                if mode == 'row' and row_count > 10000:
+                    print(f"{row_count:>6} {mode:>6}   skipped (row-by-row is O(rows) round trips)")
+                    continue
+
+                sql.UPLOAD_CONFIG['mode'] = mode
+                conn = sql.create_connection()
+                try:
+                    conn.cursor().execute("DROP TABLE IF EXISTS [ro_marketing_2]")
+                    conn.commit()
+                    sql.invalidate_schema_cache()
+
+                    # First pass inserts every row, second pass updates every row in place
+                    for label in ('insert', 'update'):
+                        stdout = sys.stdout
+                        sys.stdout = devnull
+                        try:
+                            start = time.perf_counter()
+                            sql.upsert_data_with_created_at(conn, 'ro_marketing_2', headers,
+                                                            [list(row) for row in data],
+                                                            sql.TABLE_KEYS['ro_marketing_2'])
+                            elapsed = time.perf_counter() - start
+                        finally:
+                            sys.stdout = stdout
+
+                        stats = sql.UPLOAD_STATS.get('ro_marketing_2', {})
+                        print(f"{row_count:>6} {mode:>6} {label:>7} {elapsed:>9.3f} {row_count / elapsed:>9.0f} "
+                              f"{stats.get('round_trips', 0):>7}")
+                finally:
+                    sql.release_connection(conn)
+    finally:
+        devnull.close()
+        sql.close_all_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("=" * 60)
+
+class NullCursor:
+    """Accepts statements without a database, answering every existence check with 'found'"""
+    def __init__(self):
+        self.statements = 0
+    
+    def execute(self, query, params=None):
+        self.statements += 1
+    
+    def fetchone(self):
+        return (1,)
+
+def legacy_row_upsert(sql, cursor, table_name, headers, data, valid_headers, key_columns, column_types):
+    """The per-row loop as it was before upload plans, minus the progress print"""
+    header_types = [column_types.get(h) for h in headers]
+    for row in data:
+        row = list(row)
+        while len(row) < len(headers):
+            row.append('')
+        row = [sql.coerce_value(value, data_type) for value, data_type in zip(row[:len(headers)], header_types)]
+        
+        valid_row = []
+        for header in valid_headers:
+            if header in headers:
+                header_index = headers.index(header)
+                valid_row.append(row[header_index] if header_index < len(row) else '')
+            else:
+                valid_row.append('')
+        
+        where_parts = []
+        where_values = []
+        for key_col in key_columns:
+            if key_col in valid_headers:
+                col_index = headers.index(key_col) if key_col in headers else -1
+                if col_index >= 0:
+                    where_parts.append(f"[{key_col}] = %s")
+                    where_values.append(row[col_index] if col_index < len(row) else '')
+        
+        if where_parts:
+            cursor.execute(f"SELECT COUNT(*) FROM [{table_name}] WHERE {' AND '.join(where_parts)}", where_values)
+            if cursor.fetchone()[0] > 0:
+                set_parts = []
+                update_values = []
+                for header in valid_headers:
+                    if header not in key_columns:
+                        header_index = headers.index(header) if header in headers else -1
+                        if header_index >= 0:
+                            set_parts.append(f"[{header}] = %s")
+                            update_values.append(row[header_index] if header_index < len(row) else '')
+                if set_parts:
+                    cursor.execute(f"UPDATE [{table_name}] SET {', '.join(set_parts)} WHERE {' AND '.join(where_parts)}",
+                                   update_values + where_values)
+                continue
+        
+        placeholders = ', '.join(['%s'] * len(valid_headers))
+        cursor.execute(f"INSERT INTO [{table_name}] ([{'], ['.join(valid_headers)}]) VALUES ({placeholders})", valid_row)
+
+def legacy_prepare_rows(sql, headers, data, valid_headers, column_types):
+    """Row projection for the staged MERGE as it was before upload plans"""
+    indexes = [headers.index(h) for h in valid_headers]
+    types = [column_types.get(h) for h in valid_headers]
+    width = len(headers)
+    rows = []
+    for row in data:
+        row = (list(row) + [''] * (width - len(row)))[:width]
+        rows.append(tuple(sql.coerce_value(row[i], t) for i, t in zip(indexes, types)))
+    return rows
+
+def planned_row_upsert(plan, cursor, data):
+    """The same statements driven by a compiled UploadPlan"""
+    for values in plan.project_rows(data):
+        if plan.check_sql:
+            key_params = plan.key_of(values)
+            cursor.execute(plan.check_sql, key_params)
+            if cursor.fetchone()[0] > 0:
+                if plan.update_sql:
+                    cursor.execute(plan.update_sql, plan.update_params(values) + key_params)
+                continue
+        cursor.execute(plan.insert_sql, values)
+
+def bench_plan(row_counts=(1000, 20000), repeats=3):
+    """Per-row Python cost of the upsert loop before and after compiled upload plans"""
+    import sql
+    
+    table_name = 'ro_marketing_2'
+    key_columns = sql.TABLE_KEYS[table_name]
+    
+    print("\n📊 UPLOAD PLAN MICROBENCHMARK (no database)")
+    print("=" * 60)
+    print(f"{'Rows':>6} {'Path':>8} {'Legacy us/row':>14} {'Plan us/row':>12} {'Speedup':>8}")
+    
+    for row_count in row_counts:
+        headers, data = synthetic_ro_rows(row_count)
+        column_types = {h: sql.column_sql_type(table_name, h).split('(')[0].lower() for h in headers}
+        valid_headers = list(dict.fromkeys(headers))
+        sql.SCHEMA_CACHE = {table_name: {'columns': valid_headers, 'types': column_types, 'signatures': []}}
+        
+        def best_of(func):
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            return min(timings) / row_count * 1e6
+        
+        devnull = open(os.devnull, 'w')
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            legacy_rows = best_of(lambda: legacy_row_upsert(sql, NullCursor(), table_name, headers, data,
+                                                            valid_headers, key_columns, column_types))
+            planned_rows = best_of(lambda: planned_row_upsert(
+                sql.get_upload_plan(table_name, headers, valid_headers, key_columns), NullCursor(), data))
+            legacy_merge = best_of(lambda: legacy_prepare_rows(sql, headers, data, valid_headers, column_types))
+            planned_merge = best_of(lambda: sql.get_upload_plan(table_name, headers, valid_headers,
+                                                                key_columns).project_rows(data))
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+        print(f"{row_count:>6} {'row':>8} {legacy_rows:>14.2f} {planned_rows:>12.2f} {legacy_rows / planned_rows:>7.2f}x")
+        print(f"{row_count:>6} {'merge':>8} {legacy_merge:>14.2f} {planned_merge:>12.2f} "
+              f"{legacy_merge / planned_merge:>7.2f}x")
+    
+    print("=" * 60)
+
+BENCHMARKS = {
+    'parse': bench_parse,
+    'upload': bench_upload,
+    'plan': bench_plan
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("\n📖 BENCHMARK COMMANDS")
+        print("=" * 40)
+        for name, func in BENCHMARKS.items():
+            print(f"python benchmark.py {name:<10} - {func.__doc__}")
+        print("=" * 40)
+    else:
+        BENCHMARKS[sys.argv[1]]()
@@ -0,0 +1,220 @@
+import os
+import re
+import sqlite3
+import decimal
+import datetime
+
+SQLITE_CONFIG = {
+    'path': os.getenv('SQLITE_DB_PATH', os.path.join(os.getcwd(), "Artifact Store", "local.db"))
+}
+
+# Azure SQL throttling, failover and dropped-connection errors worth retrying:
+# 40501 service busy, 40613/40197/4060 database unavailable or reconfiguring,
+# 10928/10929 resource limits, 49918-49920 too many operations, 1205 deadlock victim,
+# 233/64/10053/10054/10060 transport errors, 20003/20006/20009/20047 DB-Lib timeouts/dead link
+SQL_SERVER_TRANSIENT_CODES = {40501, 40613, 40197, 4060, 4221, 10928, 10929, 49918, 49919, 49920,
+                              1205, 233, 64, 10053, 10054, 10060, 20003, 20006, 20009, 20047}
+
+def error_code(exc):
+    """Numeric server/DB-Lib error code carried by a driver exception, or None"""
+    number = getattr(exc, 'number', None)
+    if isinstance(number, int):
+        return number
+    for arg in exc.args[:1]:
+        if isinstance(arg, int):
+            return arg
+        if isinstance(arg, tuple) and arg and isinstance(arg[0], int):
+            return arg[0]
+    match = re.search(r'\b(?:error|Msg)\s*(?:number|message)?\s*(\d{3,5})\b', str(exc), re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+class SqlServerBackend:
+    """Azure SQL / SQL Server through pymssql (the production backend)"""
+    name = 'sqlserver'
+    max_rows_per_insert = 1000   # SQL Server limit for a VALUES list
+    max_params_per_insert = 2000  # stay under the 2100 parameter limit
+    supports_type_migration = True
+
+    def __init__(self, sql_config):
+        self.sql_config = sql_config
+
+    def describe(self):
+        return f"SQL Server: {self.sql_config['server']}"
+
+    def is_transient(self, exc):
+        return error_code(exc) in SQL_SERVER_TRANSIENT_CODES
+
+    def connect(self):
+        import pymssql
+
+        return pymssql.connect(
+            server=self.sql_config['server'],
+            user=self.sql_config['username'],
+            password=self.sql_config['password'],
+            database=self.sql_config['database'],
+            port=self.sql_config['port'],
+            timeout=30
+        )
+
+    def table_exists(self, cursor, table_name):
+        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = %s", (table_name,))
+        return cursor.fetchone()[0] > 0
+
+    def column_types(self, cursor, table_name):
+        cursor.execute("SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+                       "WHERE TABLE_NAME = %s ORDER BY ORDINAL_POSITION", (table_name,))
+        return {row[0]: row[1].lower() for row in cursor.fetchall()}
+
+    def add_columns(self, cursor, table_name, column_defs):
+        cursor.execute(f"ALTER TABLE [{table_name}] ADD {', '.join(column_defs)}")
+
+    def index_exists(self, cursor, table_name, index_name):
+        cursor.execute("SELECT COUNT(*) FROM sys.indexes WHERE name = %s AND object_id = OBJECT_ID(%s)",
+                       (index_name, table_name))
+        return cursor.fetchone()[0] > 0
+
+    def drop_index(self, cursor, table_name, index_name):
+        cursor.execute(f"DROP INDEX [{index_name}] ON [{table_name}]")
+
+    def create_stage(self, cursor, table_name, column_list):
+        stage = f"#stage_{table_name}"
+        cursor.execute(f"IF OBJECT_ID('tempdb..{stage}') IS NOT NULL DROP TABLE {stage}")
+        # SELECT TOP 0 ... INTO copies the target's column types onto the staging table
+        cursor.execute(f"SELECT TOP 0 {column_list} INTO {stage} FROM [{table_name}]")
+        return stage
+
+    def drop_stage(self, cursor, stage):
+        cursor.execute(f"DROP TABLE {stage}")
+
+    def merge_from_stage(self, cursor, table_name, stage, columns, keys):
+        column_list = ', '.join(f"[{h}]" for h in columns)
+        on_clause = ' AND '.join(f"t.[{k}] = s.[{k}]" for k in keys)
+        update_columns = [h for h in columns if h not in keys]
+        update_clause = ''
+        if update_columns:
+            update_clause = f"WHEN MATCHED THEN UPDATE SET {', '.join(f't.[{h}] = s.[{h}]' for h in update_columns)} "
+        cursor.execute(
+            f"MERGE [{table_name}] AS t USING {stage} AS s ON {on_clause} "
+            f"{update_clause}"
+            f"WHEN NOT MATCHED BY TARGET THEN INSERT ({column_list}) "
+            f"VALUES ({', '.join(f's.[{h}]' for h in columns)});"
+        )
+
+class SqliteCursor:
+    """Translates the pymssql-style %s placeholders used throughout sql.py to sqlite's ?"""
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=None):
+        query = query.replace('%s', '?')
+        if params is None:
+            return self.cursor.execute(query)
+        return self.cursor.execute(query, tuple(params))
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+class SqliteConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self):
+        return SqliteCursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+class SqliteBackend:
+    """Local file database standing in for Azure SQL in offline runs and benchmarks"""
+    name = 'sqlite'
+    max_rows_per_insert = 500
+    max_params_per_insert = 900  # older sqlite builds cap statements at 999 variables
+    supports_type_migration = False
+
+    def __init__(self, path):
+        self.path = path
+        sqlite3.register_adapter(decimal.Decimal, str)
+        sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+
+    def describe(self):
+        return f"SQLite: {self.path}"
+
+    def is_transient(self, exc):
+        # Another writer holding the file is sqlite's version of throttling
+        message = str(exc).lower()
+        return isinstance(exc, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The pool hands connections between the upload threads, one user at a time
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return SqliteConnection(conn)
+
+    def table_exists(self, cursor, table_name):
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = %s", (table_name,))
+        return cursor.fetchone()[0] > 0
+
+    def column_types(self, cursor, table_name):
+        cursor.execute(f"PRAGMA table_info([{table_name}])")
+        return {row[1]: row[2].split('(')[0].strip().lower() for row in cursor.fetchall()}
+
+    def add_columns(self, cursor, table_name, column_defs):
+        # sqlite's ALTER TABLE takes one column per statement
+        for column_def in column_defs:
+            cursor.execute(f"ALTER TABLE [{table_name}] ADD COLUMN {column_def}")
+
+    def index_exists(self, cursor, table_name, index_name):
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = %s AND tbl_name = %s",
+                       (index_name, table_name))
+        return cursor.fetchone()[0] > 0
+
+    def drop_index(self, cursor, table_name, index_name):
+        cursor.execute(f"DROP INDEX IF EXISTS [{index_name}]")
+
+    def create_stage(self, cursor, table_name, column_list):
+        stage = f"stage_{table_name}"
+        cursor.execute(f"DROP TABLE IF EXISTS temp.[{stage}]")
+        cursor.execute(f"CREATE TEMP TABLE [{stage}] AS SELECT {column_list} FROM [{table_name}] WHERE 0")
+        return f"temp.[{stage}]"
+
+    def drop_stage(self, cursor, stage):
+        cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+
+    def merge_from_stage(self, cursor, table_name, stage, columns, keys):
+        # UPDATE ... FROM then INSERT ... WHERE NOT EXISTS: same effect as MERGE
+        # without requiring the unique index ON CONFLICT would need
+        column_list = ', '.join(f"[{h}]" for h in columns)
+        match = ' AND '.join(f"[{table_name}].[{k}] = s.[{k}]" for k in keys)
+        update_columns = [h for h in columns if h not in keys]
+        if update_columns:
+            cursor.execute(
+                f"UPDATE [{table_name}] SET {', '.join(f'[{h}] = s.[{h}]' for h in update_columns)} "
+                f"FROM {stage} AS s WHERE {match}"
+            )
+        cursor.execute(
+            f"INSERT INTO [{table_name}] ({column_list}) SELECT {column_list} FROM {stage} AS s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM [{table_name}] WHERE {match})"
+        )
+
+def get_backend(sql_config):
+    """Backend chosen by DB_BACKEND (sqlserver by default, sqlite for offline work)"""
+    backend = os.getenv('DB_BACKEND', 'sqlserver').lower()
+    if backend == 'sqlite':
+        return SqliteBackend(SQLITE_CONFIG['path'])
+    return SqlServerBackend(sql_config)
@@ -0,0 +1,89 @@
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for Graph's sendMail, for exercising notifications.send_email offline:
+#   python graph_stand_in.py --port 8025 --fail 2 --status 429 --retry-after 1
+#   GRAPH_BASE_URL=http://127.0.0.1:8025/v1.0 GRAPH_ACCESS_TOKEN=test python notifications.py
+
+STAND_IN_CONFIG = {
+    'port': 8025,
+    'fail': 0,           # first N sendMail calls get `status` instead of 202
+    'status': 503,
+    'retry_after': None,  # Retry-After header (seconds) sent with the failures
+    'delay': 0.0         # seconds to stall before every response (read-timeout testing)
+}
+
+STATE = {'requests': 0, 'messages': []}
+STATE_LOCK = threading.Lock()
+
+class GraphStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Graph
+
+    def send_json(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.endswith("/sendMail"):
+            self.send_json(404, {"error": {"code": "ResourceNotFound", "message": self.path}})
+            return
+        if not self.headers.get('Authorization', '').startswith("Bearer "):
+            self.send_json(401, {"error": {"code": "InvalidAuthenticationToken"}})
+            return
+
+        with STATE_LOCK:
+            STATE['requests'] += 1
+            attempt = STATE['requests']
+        if STAND_IN_CONFIG['delay']:
+            time.sleep(STAND_IN_CONFIG['delay'])
+
+        if attempt <= STAND_IN_CONFIG['fail']:
+            headers = {}
+            if STAND_IN_CONFIG['retry_after'] is not None:
+                headers['Retry-After'] = str(STAND_IN_CONFIG['retry_after'])
+            print(f"#{attempt} {self.path} -> {STAND_IN_CONFIG['status']}")
+            self.send_json(STAND_IN_CONFIG['status'],
+                           {"error": {"code": "TooManyRequests" if STAND_IN_CONFIG['status'] == 429 else "ServiceUnavailable"}},
+                           headers)
+            return
+
+        message = json.loads(body or b'{}').get('message', {})
+        with STATE_LOCK:
+            STATE['messages'].append(message)
+        recipients = [r['emailAddress']['address'] for r in message.get('toRecipients', [])]
+        print(f"#{attempt} {self.path} -> 202  {message.get('subject')!r} to {', '.join(recipients)}")
+        self.send_json(202)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in(port=None):
+    """Serve on a background thread; returns the server (port 0 picks a free one)"""
+    server = ThreadingHTTPServer(("127.0.0.1", STAND_IN_CONFIG['port'] if port is None else port), GraphStandInHandler)
+    threading.Thread(target=server.serve_forever, name="graph-stand-in", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    for flag, name, cast in (("--port", 'port', int), ("--fail", 'fail', int), ("--status", 'status', int),
+                             ("--retry-after", 'retry_after', float), ("--delay", 'delay', float)):
+        if flag in args:
+            STAND_IN_CONFIG[name] = cast(args[args.index(flag) + 1])
+
+    server = ThreadingHTTPServer(("127.0.0.1", STAND_IN_CONFIG['port']), GraphStandInHandler)
+    print(f"Graph stand-in on http://127.0.0.1:{STAND_IN_CONFIG['port']}/v1.0 "
+          f"(fail first {STAND_IN_CONFIG['fail']} with {STAND_IN_CONFIG['status']}, delay {STAND_IN_CONFIG['delay']}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{len(STATE['messages'])} messages received")
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import signal
+import multiprocessing
+
+ISOLATION_CONFIG = {
+    # Run each hourly main() in a fresh child process (0 = in the scheduler process, as before)
+    'enabled': os.getenv('RUN_ISOLATED', '1') == '1',
+    # Wall-clock limit from trigger to result; the run must end well before the next warm-up
+    'timeout_minutes': float(os.getenv('RUN_TIMEOUT_MINUTES', '40')),
+    # PSS of the child and everything it started (Playwright driver, Chromium); the container has 2G.
+    # PSS splits shared pages between their processes, so Chromium's shared memory counts once
+    'max_pss_mb': int(os.getenv('RUN_MAX_PSS_MB', '1536')),
+    'poll_seconds': float(os.getenv('RUN_POLL_SECONDS', '2')),
+    # How long a cancelled or finished child gets to close its browser before it is killed
+    'exit_grace_seconds': float(os.getenv('RUN_EXIT_GRACE_SECONDS', '30'))
+}
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def read_proc_stat(pid):
+    """(ppid, start_time, rss_bytes) from /proc/<pid>/stat, or None if the process is gone"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as file:
+            stat = file.read()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name (which may itself contain spaces)
+    fields = stat[stat.rindex(')') + 2:].split()
+    return int(fields[1]), fields[19], int(fields[21]) * PAGE_SIZE
+
+def read_pss(pid):
+    """Proportional set size in bytes from /proc/<pid>/smaps_rollup, or None if unavailable"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as file:
+            for line in file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def process_tree(root_pid):
+    """{pid: (start_time, rss_bytes)} for root_pid and all its descendants (Linux /proc only)"""
+    children = {}
+    stats = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            stat = read_proc_stat(int(entry))
+            if stat:
+                stats[int(entry)] = stat
+                children.setdefault(stat[0], []).append(int(entry))
+
+    tree = {}
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in stats and pid not in tree:
+            tree[pid] = stats[pid][1:]
+            stack.extend(children.get(pid, []))
+    return tree
+
+def json_safe(value):
+    """Round-trip through JSON so only plain data crosses back to the scheduler"""
+    return json.loads(json.dumps(value, default=str))
+
+def child_main(conn, warm_first):
+    """Body of the run process: optional warm-up, wait for the trigger, run main(), report back"""
+    if hasattr(os, 'setsid'):
+        # Own process group, so the parent can kill the run with everything it started
+        os.setsid()
+
+    import app
+    import notifications
+    notifications.NOTIFY_WORKER['deliver'] = False
+
+    # No Graph token here: the scheduler process sends this run's notification
+    warm = app.warm_up(graph_token=False) if warm_first else None
+    conn.send({'event': 'ready', 'warm': warm is not None})
+    if conn.recv() != 'go':
+        app.close_warm_session(warm)
+        return
+
+    success = app.main(warm, time.perf_counter())
+    conn.send({'event': 'done', 'success': bool(success), 'run_result': json_safe(app.LAST_RUN['result'])})
+    # Stay alive until the parent has seen anything we leave running (it kills those)
+    conn.recv()
+
+class IsolatedRun:
+    """One hourly run in a child process, watched for hangs and memory growth.
+
+    start() spawns the child (warming up right away if asked), trigger() lets
+    it run main() and watches it until it reports back, times out or exceeds
+    the memory (PSS) cap; cancel() discards a warmed-up child whose slot was skipped.
+    """
+    def __init__(self, warm_up=False):
+        self.warm_up = warm_up
+        self.process = None
+        self.conn = None
+        self.tree = {}
+        self.peak_pss = 0
+
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=child_main, args=(child_conn, self.warm_up), name="hourly-run")
+        self.process.start()
+        child_conn.close()
+        return self
+
+    def sample(self):
+        """Refresh the process tree snapshot; returns its total PSS in MB (RSS where PSS is unreadable)"""
+        if not os.path.isdir('/proc'):
+            return 0.0
+        tree = process_tree(self.process.pid)
+        if tree:
+            self.tree.update(tree)
+        pss = 0
+        for pid, (_, rss) in tree.items():
+            process_pss = read_pss(pid)
+            pss += rss if process_pss is None else process_pss
+        self.peak_pss = max(self.peak_pss, pss)
+        return pss / (1024 * 1024)
+
+    def kill(self):
+        """SIGKILL the child's process group and every process it was seen to start"""
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        else:
+            self.process.kill()
+        self.reap_leftovers()
+        self.process.join(10)
+
+    def reap_leftovers(self):
+        """Kill descendants still alive after the child (e.g. a detached Chromium); returns how many"""
+        killed = 0
+        own_group = os.getpgrp() if hasattr(os, 'getpgrp') else None
+        for pid, (start_time, _) in self.tree.items():
+            stat = read_proc_stat(pid)
+            # Same pid and start time: still the process we saw, not a reused pid
+            if pid == os.getpid() or not stat or stat[1] != start_time:
+                continue
+            try:
+                if hasattr(os, 'killpg') and os.getpgid(pid) not in (own_group, self.process.pid):
+                    os.killpg(os.getpgid(pid), signal.SIGKILL)
+                else:
+                    os.kill(pid, signal.SIGKILL)
+                killed += 1
+            except OSError:
+                pass
+        return killed
+
+    def cancel(self):
+        """Discard the run without triggering it"""
+        try:
+            self.conn.send('cancel')
+        except OSError:
+            pass
+        self.process.join(ISOLATION_CONFIG['exit_grace_seconds'])
+        if self.process.is_alive():
+            self.kill()
+        self.reap_leftovers()
+
+    def trigger(self):
+        """Run main() in the child and watch it; returns the structured result"""
+        started = time.monotonic()
+        deadline = started + ISOLATION_CONFIG['timeout_minutes'] * 60
+        result = {'success': False, 'outcome': None, 'error': None, 'run_result': None}
+        try:
+            self.conn.send('go')
+        except (EOFError, OSError):
+            # The child died during warm-up; still report it, and kill its process group
+            # (a browser it launched outlives it there)
+            self.kill()
+            result.update(outcome='crashed', error=f"run process exited with code {self.process.exitcode} "
+                                                   f"before it was triggered")
+
+        while result['outcome'] is None:
+            try:
+                if self.conn.poll(ISOLATION_CONFIG['poll_seconds']):
+                    message = self.conn.recv()
+                    if message.get('event') == 'done':
+                        result.update(outcome='completed', success=message['success'],
+                                      run_result=message['run_result'])
+                        self.sample()
+                        self.conn.send('exit')
+                    continue
+            except (EOFError, OSError):
+                self.process.join(5)
+                result.update(outcome='crashed', error=f"run process exited with code {self.process.exitcode}")
+                break
+
+            pss_mb = self.sample()
+            if not self.process.is_alive():
+                result.update(outcome='crashed', error=f"run process exited with code {self.process.exitcode}")
+            elif pss_mb > ISOLATION_CONFIG['max_pss_mb']:
+                result.update(outcome='memory', error=f"run killed at {pss_mb:.0f} MB PSS "
+                                                      f"(limit {ISOLATION_CONFIG['max_pss_mb']} MB)")
+                self.kill()
+            elif time.monotonic() > deadline:
+                result.update(outcome='timeout', error=f"run killed after {ISOLATION_CONFIG['timeout_minutes']:g} "
+                                                       f"minutes without finishing")
+                self.kill()
+
+        if result['outcome'] == 'completed':
+            self.process.join(ISOLATION_CONFIG['exit_grace_seconds'])
+            if self.process.is_alive():
+                self.kill()
+        leftovers = self.reap_leftovers()
+
+        result.update(seconds=round(time.monotonic() - started, 1), peak_pss_mb=round(self.peak_pss / (1024 * 1024), 1),
+                      exit_code=self.process.exitcode, leftovers_killed=leftovers)
+        return result
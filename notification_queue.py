@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import datetime
+import pytz
+
+NOTIFY_CONFIG = {
+    'db_path': os.getenv('NOTIFY_QUEUE_DB', os.path.join(os.getcwd(), "Artifact Store", "notification_queue.db")),
+    'enabled': os.getenv('NOTIFY_QUEUE_ENABLED', '1') == '1',
+    # A result identical to the previous one is held if the same result was emailed
+    # within this window; held results go out together as one digest when it ends
+    'digest_window_minutes': int(os.getenv('NOTIFY_DIGEST_MINUTES', '180')),
+    'poll_seconds': int(os.getenv('NOTIFY_POLL_SECONDS', '30')),
+    # Failed sends back off exponentially (base, doubling, capped) and are given up on
+    # once the notification is older than give_up_hours
+    'retry_base_seconds': int(os.getenv('NOTIFY_RETRY_BASE_SECONDS', '60')),
+    'retry_max_seconds': int(os.getenv('NOTIFY_RETRY_MAX_SECONDS', '3600')),
+    'give_up_hours': float(os.getenv('NOTIFY_GIVE_UP_HOURS', '24')),
+    'retention_days': int(os.getenv('NOTIFY_RETENTION_DAYS', '7'))
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    signature TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    hour_label TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    enqueued_at TEXT NOT NULL,
+    next_attempt_at TEXT,
+    sent_at TEXT,
+    sent_with INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_notifications_status ON notifications (status, id);
+CREATE INDEX IF NOT EXISTS ix_notifications_signature ON notifications (signature, sent_at);
+"""
+
+def get_arizona_time():
+    return datetime.datetime.now(pytz.timezone('US/Arizona'))
+
+def timestamp(moment=None):
+    return (moment or get_arizona_time()).strftime('%Y-%m-%dT%H:%M:%S')
+
+def parse_timestamp(value):
+    return pytz.timezone('US/Arizona').localize(datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S'))
+
+def connect():
+    os.makedirs(os.path.dirname(NOTIFY_CONFIG['db_path']), exist_ok=True)
+    conn = sqlite3.connect(NOTIFY_CONFIG['db_path'], timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def enqueue(signature, success, subject, body, report_date, hour_label):
+    """Durably append one run's notification; returns its queue id"""
+    conn = connect()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO notifications (signature, success, subject, body, report_date, hour_label, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (signature, int(bool(success)), subject, body, report_date, hour_label, timestamp())
+            )
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def entries(status):
+    conn = connect()
+    try:
+        rows = conn.execute("SELECT * FROM notifications WHERE status = ? ORDER BY id", (status,)).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+def outstanding_count():
+    """Notifications not yet delivered (pending or held for a digest)"""
+    conn = connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM notifications WHERE status IN ('pending', 'held')").fetchone()[0]
+    finally:
+        conn.close()
+
+def previous_signature(entry_id):
+    """Signature of the run notified just before this one, or None for the first"""
+    conn = connect()
+    try:
+        row = conn.execute("SELECT signature FROM notifications WHERE id < ? ORDER BY id DESC LIMIT 1",
+                           (entry_id,)).fetchone()
+        return row['signature'] if row else None
+    finally:
+        conn.close()
+
+def last_sent_at(signature):
+    """When an email for this signature last went out (as itself or inside another email), or None"""
+    conn = connect()
+    try:
+        row = conn.execute("SELECT MAX(sent_at) FROM notifications WHERE signature = ? AND status IN ('sent', 'digested')",
+                           (signature,)).fetchone()
+        return parse_timestamp(row[0]) if row[0] else None
+    finally:
+        conn.close()
+
+def is_due(entry, now=None):
+    """False while a failed entry waits out its retry backoff"""
+    return not entry['next_attempt_at'] or parse_timestamp(entry['next_attempt_at']) <= (now or get_arizona_time())
+
+def hold(entry_id):
+    conn = connect()
+    try:
+        with conn:
+            conn.execute("UPDATE notifications SET status = 'held' WHERE id = ?", (entry_id,))
+    finally:
+        conn.close()
+
+def mark_sent(entry_id, digested_ids=()):
+    """Mark a delivered email sent and the held repeats it summarized digested, atomically"""
+    conn = connect()
+    try:
+        with conn:
+            now = timestamp()
+            conn.execute("UPDATE notifications SET status = 'sent', sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                         (now, entry_id))
+            conn.executemany("UPDATE notifications SET status = 'digested', sent_at = ?, sent_with = ? WHERE id = ?",
+                             [(now, entry_id, digested_id) for digested_id in digested_ids])
+    finally:
+        conn.close()
+
+def mark_attempt_failed(entry_id, error, now=None):
+    """Record a failed delivery and schedule the retry with exponential backoff.
+
+    Gives up (status failed) once the notification is older than give_up_hours.
+    Returns the entry's new status and when it will be retried (None if given up).
+    """
+    now = now or get_arizona_time()
+    conn = connect()
+    try:
+        with conn:
+            row = conn.execute("SELECT attempts, enqueued_at, status FROM notifications WHERE id = ?",
+                               (entry_id,)).fetchone()
+            if not row:
+                return None, None
+            attempts = row['attempts'] + 1
+            delay = min(NOTIFY_CONFIG['retry_base_seconds'] * 2 ** (attempts - 1), NOTIFY_CONFIG['retry_max_seconds'])
+            retry_at = now + datetime.timedelta(seconds=delay)
+            status = row['status']
+            if now - parse_timestamp(row['enqueued_at']) >= datetime.timedelta(hours=NOTIFY_CONFIG['give_up_hours']):
+                status, retry_at = 'failed', None
+            conn.execute(
+                "UPDATE notifications SET attempts = ?, last_error = ?, status = ?, next_attempt_at = ? WHERE id = ?",
+                (attempts, str(error)[:500], status, timestamp(retry_at) if retry_at else None, entry_id)
+            )
+        return status, retry_at
+    finally:
+        conn.close()
+
+def prune_finished(now=None):
+    """Delete delivered (or abandoned) notifications past the retention window"""
+    cutoff = timestamp((now or get_arizona_time()) - datetime.timedelta(days=NOTIFY_CONFIG['retention_days']))
+    conn = connect()
+    try:
+        with conn:
+            cursor = conn.execute("DELETE FROM notifications WHERE status IN ('sent', 'digested', 'failed') "
+                                  "AND enqueued_at < ?", (cutoff,))
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    for status in ('pending', 'held'):
+        for entry in entries(status):
+            print(f"#{entry['id']:<6} {status:<8} {entry['enqueued_at']}  {entry['subject']}  "
+                  f"attempts {entry['attempts']}{'  next ' + entry['next_attempt_at'] if entry['next_attempt_at'] else ''}"
+                  f"{'  ' + entry['last_error'] if entry['last_error'] else ''}")
+    print(f"{outstanding_count()} outstanding")
@@ -1,10 +1,20 @@
 import os
-import csv
 import datetime
 import pytz
 import json
+import time
+import random
+import tempfile
+import threading
+import email.utils
 import requests
 import msal
+from requests.adapters import HTTPAdapter
+
+from reports import reconcile_reports
+from artifact_manifest import find_artifact_path, latest_run_hour
+import notification_queue
+from notification_queue import NOTIFY_CONFIG
 
 EMAIL_CONFIG = {
     'tenant_id': os.getenv('TENANT_ID', '55e7e814-58a0-4b3e-9915-66cd8d4adbd4'),
@@ -19,6 +29,22 @@ EMAIL_CONFIG = {
     'authority': os.getenv('AUTHORITY', 'https://login.microsoftonline.com/xvantech.com')
 }
 
+GRAPH_CONFIG = {
+    # Point at graph_stand_in.py (e.g. http://127.0.0.1:8025/v1.0) to test sends offline
+    'base_url': os.getenv('GRAPH_BASE_URL', 'https://graph.microsoft.com/v1.0').rstrip('/'),
+    # Pre-issued bearer token that skips MSAL (the stand-in accepts any)
+    'static_token': os.getenv('GRAPH_ACCESS_TOKEN'),
+    'connect_timeout': float(os.getenv('GRAPH_CONNECT_TIMEOUT', '5')),
+    'read_timeout': float(os.getenv('GRAPH_READ_TIMEOUT', '30')),
+    'max_retries': int(os.getenv('GRAPH_MAX_RETRIES', '3')),
+    'base_delay': float(os.getenv('GRAPH_RETRY_BASE_SECONDS', '1')),
+    # Longest Retry-After honoured; a bigger ask is treated as a failed send
+    'max_delay': float(os.getenv('GRAPH_RETRY_MAX_SECONDS', '60'))
+}
+
+# Throttling and transient server errors worth retrying; anything else is final
+GRAPH_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 def get_arizona_time():
     """Get current Arizona time"""
     return datetime.datetime.now(pytz.timezone('US/Arizona'))
@@ -31,9 +57,9 @@ def format_date_short(dt):
     """Format date as MM.DD.YY"""
     return f"{dt.month:02d}.{dt.day:02d}.{dt.year-2000:02d}"
 
-def get_current_hour_info():
-    """Get current hour information for file paths and display"""
-    az_now = get_arizona_time()
+def get_current_hour_info(az_now=None):
+    """Get current (or the given) hour information for file paths and display"""
+    az_now = az_now or get_arizona_time()
     return {
         'hour_24': az_now.hour,
         'hour_12': az_now.strftime("%I %p").lstrip('0'),
@@ -41,36 +67,23 @@ def get_current_hour_info():
         'timestamp': az_now.strftime('%Y-%m-%d %I:%M:%S %p') + ' AZ'
     }
 
-def read_csv_safe(filepath):
-    """Safely read CSV file and return data"""
-    try:
-        if not os.path.exists(filepath):
-            return None, f"File not found: {filepath}"
-        
-        if os.path.getsize(filepath) == 0:
-            return None, f"File is empty: {filepath}"
-        
-        with open(filepath, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            rows = list(reader)
-        
-        if len(rows) <= 1:
-            return None, f"No data rows in file: {filepath}"
-        
-        return rows, None
-    except Exception as e:
-        return None, f"Error reading {filepath}: {str(e)}"
-
-def check_hourly_file_existence():
-    """Check if required hourly files exist and get basic info"""
-    today = get_arizona_time()
+def check_hourly_file_existence(run_at=None):
+    """Check if a run's hourly files exist and get basic info (default: today's latest recorded run)"""
+    today = run_at
+    if today is None:
+        today = get_arizona_time()
+        run_hour = latest_run_hour(today.date())
+        if run_hour is not None:
+            today = today.replace(hour=run_hour, minute=0, second=0, microsecond=0)
     today_file = format_date(today)
     today_short = format_date_short(today)
-    hour_info = get_current_hour_info()
+    hour_info = get_current_hour_info(today)
     
     base_path = os.getcwd()
-    financial_path = os.path.join(base_path, "Financial Reports", f"{today_file}_{hour_info['hour_padded']}.csv")
-    ro_path = os.path.join(base_path, "RO Reports", f"TekmetricGemba_RO_{today_short}_{hour_info['hour_padded']}.csv")
+    financial_path = find_artifact_path("financial", "ALL", today.date(), today.hour,
+                                        os.path.join(base_path, "Financial Reports", f"{today_file}_{hour_info['hour_padded']}.csv"))
+    ro_path = find_artifact_path("ro_combined", "ALL", today.date(), today.hour,
+                                 os.path.join(base_path, "RO Reports", f"TekmetricGemba_RO_{today_short}_{hour_info['hour_padded']}.csv"))
     
     file_status = {
         'financial_exists': os.path.exists(financial_path),
@@ -90,180 +103,55 @@ def check_hourly_file_existence():
     
     return file_status
 
-def analyze_financial_data_hourly(filepath):
-    """Analyze financial report data for hourly runs"""
-    rows, error = read_csv_safe(filepath)
-    if error:
-        return {
-            'success': False,
-            'error': error,
-            'car_count': 0,
-            'locations': 0,
-            'total_sales': 0
-        }
-    
-    try:
-        headers = rows[0]
-        data_rows = rows[1:]
-        
-        car_count = 0
-        total_sales = 0
-        
-        # Find the Car Count column index
-        car_count_col_idx = None
-        for i, header in enumerate(headers):
-            if 'Car Count' in str(header) or 'Car_Count' in str(header):
-                car_count_col_idx = i
-                break
-        
-        if car_count_col_idx is not None:
-            # Look for TOTAL row (first row should be TOTAL)
-            for row in data_rows:
-                if len(row) > car_count_col_idx:
-                    first_col = str(row[0]).strip()
-                    if first_col == 'TOTAL':
-                        try:
-                            car_count = int(float(row[car_count_col_idx]))
-                            break
-                        except:
-                            continue
-        
-        # Count locations (excluding TOTAL row)
-        locations = len([row for row in data_rows if not str(row[0]).strip() == 'TOTAL'])
-        
-        print(f"✅ Financial analysis: {car_count} car count, {locations} locations")
-        
-        return {
-            'success': True,
-            'car_count': car_count,
-            'locations': locations,
-            'total_sales': total_sales,
-            'record_count': len(data_rows)
-        }
+def summarize_reconciliation(recon, file_status):
+    """Split a reports.reconcile_reports result into financial and RO analysis dicts"""
+    financial_analysis = None
+    ro_analysis = None
     
-    except Exception as e:
-        print(f"❌ Financial analysis error: {e}")
-        return {
-            'success': False,
-            'error': f"Analysis error: {str(e)}",
-            'car_count': 0,
-            'locations': 0,
-            'total_sales': 0
-        }
-
-def analyze_ro_data_hourly(filepath):
-    """Analyze RO marketing report data for hourly runs"""
-    rows, error = read_csv_safe(filepath)
-    if error:
-        return {
-            'success': False,
-            'error': error,
-            'total_ro_count': 0,
-            'locations': 0,
-            'marketing_sources': 0
+    if file_status['financial_exists'] and not recon['financial_found']:
+        financial_analysis = {'success': False, 'error': recon['financial_error'],
+                              'car_count': 0, 'locations': 0, 'total_sales': 0}
+    elif recon['financial_found']:
+        financial_analysis = {
+            'success': recon['financial_error'] is None,
+            'error': recon['financial_error'],
+            'car_count': recon['financial_car_count'],
+            'locations': len(recon['financial_locations']),
+            'total_sales': recon['financial_sales'],
+            'record_count': recon['financial_records']
         }
+        print(f"✅ Financial analysis: {recon['financial_car_count']} car count, "
+              f"{len(recon['financial_locations'])} locations")
     
-    try:
-        headers = rows[0]
-        data_rows = rows[1:]
-        
-        # Find the main RO Count column
-        ro_count_idx = None
-        location_idx = None
-        
-        for i, header in enumerate(headers):
-            header_str = str(header).strip()
-            # Look for exact "RO Count" column (not "New RO Count" or "Repeat RO Count")
-            if header_str == 'RO Count':
-                ro_count_idx = i
-                break
-        
-        for i, header in enumerate(headers):
-            header_str = str(header).strip()
-            if 'Location' in header_str:
-                location_idx = i
-                break
-        
-        if ro_count_idx is None:
-            return {
-                'success': False,
-                'error': "Main RO Count column not found",
-                'total_ro_count': 0,
-                'locations': 0,
-                'marketing_sources': 0
-            }
-        
-        total_ro_count = 0
-        locations = set()
-        marketing_sources = set()
-        
-        # Process ALL RO data rows
-        for row in data_rows:
-            if len(row) > ro_count_idx:
-                try:
-                    ro_value = str(row[ro_count_idx]).strip()
-                    if ro_value and ro_value != '0' and ro_value != '':
-                        count = int(float(ro_value))
-                        total_ro_count += count
-                except:
-                    continue
-            
-            # Track locations
-            if location_idx is not None and len(row) > location_idx:
-                if row[location_idx] and str(row[location_idx]).strip():
-                    locations.add(str(row[location_idx]).strip())
-            
-            # Track marketing sources
-            if len(row) > 0 and row[0] and str(row[0]).strip():
-                marketing_sources.add(str(row[0]).strip())
-        
-        print(f"✅ RO analysis: {total_ro_count} RO count, {len(locations)} locations")
-        
-        return {
-            'success': True,
-            'total_ro_count': total_ro_count,
-            'locations': len(locations),
-            'location_names': list(locations),
-            'marketing_sources': len(marketing_sources),
-            'record_count': len(data_rows)
+    if file_status['ro_exists'] and not recon['ro_found']:
+        ro_analysis = {'success': False, 'error': recon['ro_error'],
+                       'total_ro_count': 0, 'locations': 0, 'marketing_sources': 0}
+    elif recon['ro_found']:
+        ro_analysis = {
+            'success': recon['ro_error'] is None,
+            'error': recon['ro_error'],
+            'total_ro_count': recon['ro_total_count'],
+            'locations': len(recon['ro_locations']),
+            'location_names': recon['ro_locations'],
+            'marketing_sources': recon['marketing_sources'],
+            'record_count': recon['ro_records']
         }
+        print(f"✅ RO analysis: {recon['ro_total_count']} RO count, {len(recon['ro_locations'])} locations")
     
-    except Exception as e:
-        print(f"❌ RO analysis error: {e}")
-        return {
-            'success': False,
-            'error': f"Analysis error: {str(e)}",
-            'total_ro_count': 0,
-            'locations': 0,
-            'marketing_sources': 0
-        }
+    return financial_analysis, ro_analysis
 
 def check_database_connectivity():
     """Check if database connection is possible"""
+    conn = None
     try:
-        import pymssql
-        
-        SQL_CONFIG = {
-            'server': os.getenv('SQL_SERVER', 'gembadb.database.windows.net'),
-            'database': os.getenv('SQL_DATABASE', 'gemba'),
-            'username': os.getenv('SQL_USERNAME', 'gembauser'),
-            'password': os.getenv('SQL_PASSWORD', 'Karachi%007'),
-            'port': int(os.getenv('SQL_PORT', '1433'))
-        }
+        from sql import SQL_POOL, BACKEND
         
-        conn = pymssql.connect(
-            server=SQL_CONFIG['server'],
-            user=SQL_CONFIG['username'],
-            password=SQL_CONFIG['password'],
-            database=SQL_CONFIG['database'],
-            port=SQL_CONFIG['port'],
-            timeout=10
-        )
+        # Shares the run's pooled (already warm) connection instead of opening a new one
+        conn = SQL_POOL.acquire()
         
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME IN ('custom_financials_2', 'ro_marketing_2')")
-        table_count = cursor.fetchone()[0]
-        conn.close()
+        table_count = sum(1 for table in ('custom_financials_2', 'ro_marketing_2')
+                          if BACKEND.table_exists(cursor, table))
         
         return {
             'success': True,
@@ -281,54 +169,100 @@ def check_database_connectivity():
             'success': False,
             'message': f"Database connection failed: {str(e)}"
         }
+    finally:
+        if conn is not None:
+            SQL_POOL.release(conn)
 
 def generate_hourly_report_summary():
-    """Generate comprehensive hourly automation report - SIMPLIFIED VERSION"""
+    """Standalone mode: re-derive the last run's outcome from the files on disk and a DB probe"""
     current_time = get_arizona_time()
-    hour_info = get_current_hour_info()
     
-    # Check files
+    # Check files of the last recorded run (the clock may already be past its hour)
     file_status = check_hourly_file_existence()
+    hour_info = file_status['hour_info']
     
-    # Analyze data
-    financial_analysis = None
-    ro_analysis = None
-    
-    if file_status['financial_exists']:
-        financial_analysis = analyze_financial_data_hourly(file_status['financial_path'])
-    
-    if file_status['ro_exists']:
-        ro_analysis = analyze_ro_data_hourly(file_status['ro_path'])
+    # Analyze data in a single reconciliation pass
+    recon = reconcile_reports(file_status['financial_path'], file_status['ro_path'], hour_info['hour_12'])
+    financial_analysis, ro_analysis = summarize_reconciliation(recon, file_status)
     
     # Check database
     db_status = check_database_connectivity()
     
-    # Determine overall status and capture ONLY REAL CRITICAL errors
+    # Without a run result, no files at all is the only sign that login failed
+    login_issue = None
+    if not file_status['financial_exists'] and not file_status['ro_exists']:
+        login_issue = "Login failed: Cannot access Tekmetric system"
+    
+    return assess_report(current_time.strftime('%m/%d/%Y'), hour_info, file_status, recon,
+                         financial_analysis, ro_analysis, db_status, login_issue)
+
+def summarize_run_result(run_result):
+    """report_data for the email built from main()'s run result, without touching files or SQL"""
+    hour_info = get_current_hour_info(run_result['started_at'])
+    files = run_result['files']
+    file_status = {
+        'financial_exists': files['financial'],
+        'ro_exists': files['ro'],
+        'financial_downloaded': files['financial_downloaded'],
+        'ro_downloaded': files['ro_downloaded'],
+        'hour_info': hour_info
+    }
+    
+    recon = run_result['reconciliation']
+    financial_analysis, ro_analysis = summarize_reconciliation(recon, file_status) if recon else (None, None)
+    
+    failed_uploads = [table for table, upload in run_result['uploads'].items()
+                      if not upload['success'] and not upload.get('queued')]
+    queued_uploads = [table for table, upload in run_result['uploads'].items()
+                      if not upload['success'] and upload.get('queued')]
+    if failed_uploads:
+        db_status = {'success': False, 'message': f"upload failed for {', '.join(failed_uploads)}"}
+    elif queued_uploads:
+        db_status = {'success': True, 'message': f"{len(run_result['uploads']) - len(queued_uploads)} tables uploaded, "
+                                                 f"{', '.join(queued_uploads)} queued for the background drainer"}
+    else:
+        db_status = {'success': True, 'message': f"{len(run_result['uploads'])} tables uploaded"}
+    
+    login_issue = None
+    if run_result['login'] == 'missing_credentials':
+        login_issue = "Login failed: Tekmetric credentials not loaded"
+    elif run_result['login'] not in ('ok', 'unknown'):
+        login_issue = "Login failed: Cannot access Tekmetric system"
+    
+    extra_issues = [f"Stage {name} failed: {stage['error']}"
+                    for name, stage in run_result['stages'].items() if stage['error']]
+    if run_result['error']:
+        extra_issues.append(f"Run aborted: {run_result['error']}")
+    
+    report_data = assess_report(run_result['report_date'], hour_info, file_status, recon,
+                                financial_analysis, ro_analysis, db_status, login_issue, extra_issues)
+    report_data['run_result'] = run_result
+    return report_data
+
+def assess_report(report_date, hour_info, file_status, recon, financial_analysis, ro_analysis, db_status,
+                  login_issue=None, extra_issues=()):
+    """Decide overall success and collect ONLY REAL CRITICAL issues"""
     overall_success = True
     issues = []
-    login_status = "Unknown"
     
-    # 1. PRIMARY CHECK: Login failure (NO files exist)
-    if not file_status['financial_exists'] and not file_status['ro_exists']:
-        login_status = "❌ Failed - Login timeout"
-        overall_success = False
-        issues.append("Login failed: Cannot access Tekmetric system")
-        
+    # 1. PRIMARY CHECK: Login failure
+    if login_issue:
         return {
-            'overall_success': overall_success,
-            'report_date': current_time.strftime('%m/%d/%Y'),
+            'overall_success': False,
+            'report_date': report_date,
             'execution_time': hour_info['timestamp'],
             'hour_info': hour_info,
             'file_status': file_status,
             'financial_analysis': financial_analysis,
             'ro_analysis': ro_analysis,
+            'reconciliation': recon,
             'database_status': db_status,
             'data_validation': False,
-            'issues': issues,
-            'login_status': login_status
+            'issues': [login_issue],
+            'login_status': "❌ Failed - Login timeout"
         }
     
-    # 2. Login was successful if we have files
+    # 2. Login was successful
     login_status = "✅ Successful"
     
     # 3. CRITICAL: Database connectivity is REQUIRED for success
@@ -356,30 +290,63 @@ def generate_hourly_report_summary():
         if not data_match:
             overall_success = False
             issues.append(f"Data mismatch: Financial car count ({financial_analysis['car_count']}) != RO count ({ro_analysis['total_ro_count']})")
-    
+        elif recon['mismatched_locations']:
+            overall_success = False
+            issues.append(f"Data mismatch: totals agree but {len(recon['mismatched_locations'])} location(s) differ")
+
     # 6. Check ONLY for missing locations (indicates real download failures)
-    if financial_analysis and financial_analysis['success'] and financial_analysis['locations'] < 6:
+    if financial_analysis and financial_analysis['success'] and recon['missing_financial']:
+        overall_success = False
+        issues.append(f"Financial download failure: only {financial_analysis['locations']}/6 locations found "
+                      f"(missing {', '.join(recon['missing_financial'])})")
+    
+    if ro_analysis and ro_analysis['success'] and recon['missing_ro']:
         overall_success = False
-        issues.append(f"Financial download failure: only {financial_analysis['locations']}/6 locations found")
+        issues.append(f"RO download failure: only {ro_analysis['locations']}/6 locations found "
+                      f"(missing {', '.join(recon['missing_ro'])})")
     
-    if ro_analysis and ro_analysis['success'] and ro_analysis['locations'] < 6:
+    # 7. Failures the run itself reported (stage exceptions, aborted runs)
+    if extra_issues:
         overall_success = False
-        issues.append(f"RO download failure: only {ro_analysis['locations']}/6 locations found")
+        issues.extend(extra_issues)
     
     return {
         'overall_success': overall_success,
-        'report_date': current_time.strftime('%m/%d/%Y'),
+        'report_date': report_date,
         'execution_time': hour_info['timestamp'],
         'hour_info': hour_info,
         'file_status': file_status,
         'financial_analysis': financial_analysis,
         'ro_analysis': ro_analysis,
+        'reconciliation': recon,
         'database_status': db_status,
         'data_validation': data_validation_performed,
         'issues': issues,
         'login_status': login_status
     }
 
+def issue_category(issue):
+    """Kind of failure an issue line reports; the email section and digest signature key off it"""
+    if "Login failed" in issue:
+        return 'login'
+    if "Database connection failed" in issue:
+        return 'database'
+    if "Data mismatch" in issue:
+        return 'mismatch'
+    if "download failure" in issue.lower():
+        return 'download'
+    if "analysis failed" in issue.lower():
+        return 'analysis'
+    if issue.startswith("Stage "):
+        return f"stage {issue.split()[1]}"
+    return 'run_error'
+
+def notification_signature(report_data):
+    """Runs with the same signature produce the same alert and are digested together"""
+    if report_data['overall_success']:
+        return "success"
+    return "failure: " + ", ".join(sorted({issue_category(issue) for issue in report_data['issues']}))
+
 def create_hourly_email(report_data):
     """Create simple success or critical failure alert email for hourly runs - SIMPLIFIED"""
     try:
@@ -394,30 +361,39 @@ def create_hourly_email(report_data):
             
             # Only show REAL critical issues
             for issue in report_data['issues']:
-                if "Login failed" in issue:
+                category = issue_category(issue)
+                if category == 'login':
                     alert_message += "❌ LOGIN SYSTEM FAILURE\n"
                     alert_message += "   • Cannot access Tekmetric website\n"
                     alert_message += "   • Check internet connection and website status\n\n"
                 
-                elif "Database connection failed" in issue:
+                elif category == 'database':
                     alert_message += "❌ SQL DATABASE UNREACHABLE\n"
                     alert_message += "   • Cannot upload data to database\n"
                     alert_message += "   • Contact Azure admin to whitelist IP\n\n"
                 
-                elif "Data mismatch" in issue:
+                elif category == 'mismatch':
                     alert_message += "❌ DATA VALIDATION FAILED\n"
                     alert_message += f"   • {issue}\n"
+                    recon = report_data.get('reconciliation') or {}
+                    for name in recon.get('mismatched_locations', []):
+                        entry = recon['locations'][name]
+                        alert_message += f"   • {name}: {entry['car_count']} cars vs {entry['ro_count']} ROs\n"
                     alert_message += "   • Check Excel files for accuracy\n\n"
                 
-                elif "download failure" in issue.lower():
+                elif category == 'download':
                     alert_message += "❌ DOWNLOAD FAILURES\n"
                     alert_message += f"   • {issue}\n"
                     alert_message += "   • Some locations did not download properly\n\n"
                 
-                elif "analysis failed" in issue.lower():
+                elif category == 'analysis':
                     alert_message += "❌ FILE PROCESSING ERROR\n"
                     alert_message += f"   • {issue}\n"
                     alert_message += "   • Check file format and content\n\n"
+                
+                else:
+                    alert_message += "❌ RUN ERROR\n"
+                    alert_message += f"   • {issue}\n\n"
             
             return alert_message.strip()
             
@@ -425,31 +401,241 @@ def create_hourly_email(report_data):
         # Fallback error message
         return f"🚨 HOURLY AUTOMATION FAILED at {hour_display}\n\n❌ SYSTEM ERROR\n   • {str(e)}"
 
+TOKEN_CONFIG = {
+    # Persisted next to the other run state so a restarted scheduler reuses a still-valid token
+    'cache_path': os.getenv('GRAPH_TOKEN_CACHE', os.path.join(os.getcwd(), "Artifact Store", "graph_token_cache.json")),
+    # A token this close to expiry is replaced (in the background) instead of handed out
+    'refresh_margin_seconds': int(os.getenv('GRAPH_TOKEN_REFRESH_MARGIN_SECONDS', '600')),
+    'retry_seconds': int(os.getenv('GRAPH_TOKEN_RETRY_SECONDS', '60'))
+}
+
+GRAPH_SCOPES = ["https://graph.microsoft.com/.default"]
+
+GRAPH_APP = None
+GRAPH_APP_LOCK = threading.Lock()
+TOKEN_CACHE = None
+TOKEN_LOCK = threading.Lock()
+TOKEN_CHANGED = threading.Event()
+TOKEN_STATE = {'token': None, 'expires_at': 0.0, 'lifetime': 0, 'refresher': None}
+TOKEN_STATS = {'requests': 0, 'hits': 0, 'network': 0, 'refreshes': 0, 'failures': 0, 'seconds': 0.0}
+
+def load_token_cache():
+    cache = msal.SerializableTokenCache()
+    try:
+        if os.path.exists(TOKEN_CONFIG['cache_path']):
+            with open(TOKEN_CONFIG['cache_path'], 'r', encoding='utf-8') as file:
+                cache.deserialize(file.read())
+    except Exception as e:
+        print(f"⚠️ Graph token cache unreadable, starting empty: {e}")
+    return cache
+
+def save_token_cache():
+    """Write the cache atomically (owner-only) when MSAL changed it"""
+    if TOKEN_CACHE is None or not TOKEN_CACHE.has_state_changed:
+        return
+    try:
+        path = TOKEN_CONFIG['cache_path']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique temp name (created 0600): the scheduler and a run process may save at the same time
+        fd, tmp_path = tempfile.mkstemp(prefix=".graph_token_cache.", suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with open(fd, 'w', encoding='utf-8') as file:
+                file.write(TOKEN_CACHE.serialize())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        TOKEN_CACHE.has_state_changed = False
+    except Exception as e:
+        print(f"⚠️ Could not persist Graph token cache: {e}")
+
+def get_graph_app():
+    """One MSAL app per process, backed by the on-disk token cache"""
+    global GRAPH_APP, TOKEN_CACHE
+    with GRAPH_APP_LOCK:
+        if GRAPH_APP is None:
+            TOKEN_CACHE = load_token_cache()
+            GRAPH_APP = msal.ConfidentialClientApplication(
+                EMAIL_CONFIG['client_id'],
+                authority=EMAIL_CONFIG['authority'],
+                client_credential=EMAIL_CONFIG['client_secret'],
+                token_cache=TOKEN_CACHE
+            )
+        return GRAPH_APP
+
+def refresh_margin(expires_in=0):
+    """Configured refresh margin, clamped to half the token lifetime so a fresh token never counts as expiring"""
+    lifetime = max(TOKEN_STATE['lifetime'], int(expires_in))
+    return min(TOKEN_CONFIG['refresh_margin_seconds'], lifetime // 2)
+
+def fetch_token(force=False):
+    """Token from MSAL's cache, or from Azure AD when missing/expiring (or force); caller holds TOKEN_LOCK.
+
+    Returns (token, source) with source 'cache' or 'network', or (None, None).
+    """
+    app = get_graph_app()
+    # acquire_token_for_client looks in the cache first (MSAL >= 1.23)
+    result = None if force else app.acquire_token_for_client(scopes=GRAPH_SCOPES)
+    if not result or result.get('expires_in', 0) <= refresh_margin(result.get('expires_in', 0)):
+        # Drop the cached token first: MSAL would otherwise hand it back until its own last-minute window
+        for item in TOKEN_CACHE.find(msal.TokenCache.CredentialType.ACCESS_TOKEN):
+            TOKEN_CACHE.remove_at(item)
+        result = app.acquire_token_for_client(scopes=GRAPH_SCOPES)
+    source = 'cache' if result.get('token_source') == 'cache' else 'network'
+    save_token_cache()
+    
+    if "access_token" not in result:
+        print(f"Token acquisition failed: {result}")
+        return None, None
+    
+    TOKEN_STATE['token'] = result["access_token"]
+    TOKEN_STATE['expires_at'] = time.time() + int(result.get('expires_in', 0))
+    TOKEN_CHANGED.set()
+    if source == 'network':
+        TOKEN_STATE['lifetime'] = int(result.get('expires_in', 0))
+        TOKEN_STATS['network'] += 1
+    return result["access_token"], source
+
+def token_refresher():
+    """Background loop replacing the token shortly before it expires, so sends never wait on a refresh"""
+    while True:
+        with TOKEN_LOCK:
+            wait = TOKEN_STATE['expires_at'] - refresh_margin() - time.time()
+        if wait > 0:
+            # Woken early whenever a new token (and so a new expiry) comes in
+            TOKEN_CHANGED.wait(wait)
+            TOKEN_CHANGED.clear()
+            continue
+        
+        started = time.perf_counter()
+        try:
+            with TOKEN_LOCK:
+                token, _ = fetch_token(force=True)
+                TOKEN_STATS['refreshes'] += 1
+            if token:
+                TOKEN_CHANGED.clear()
+                print(f"🔑 Graph token refreshed in background ({(time.perf_counter() - started) * 1000:.0f}ms)")
+        except Exception as e:
+            print(f"⚠️ Graph token background refresh failed: {e}")
+        # Also after a success: a token that comes back already inside the margin must not busy-loop
+        time.sleep(TOKEN_CONFIG['retry_seconds'])
+
+def start_token_refresher():
+    """Start the refresher once per process (daemon, so it never holds the process open)"""
+    with TOKEN_LOCK:
+        if TOKEN_STATE['refresher'] is None:
+            TOKEN_STATE['refresher'] = threading.Thread(target=token_refresher, name="graph-token-refresher", daemon=True)
+            TOKEN_STATE['refresher'].start()
+
+def get_token_stats():
+    with TOKEN_LOCK:
+        return dict(TOKEN_STATS)
+
 def get_access_token():
-    """Get Microsoft Graph access token"""
+    """Get Microsoft Graph access token (in-memory, then persisted cache, then Azure AD)"""
+    if GRAPH_CONFIG['static_token']:
+        return GRAPH_CONFIG['static_token']
+    
+    started = time.perf_counter()
     try:
-        app = msal.ConfidentialClientApplication(
-            EMAIL_CONFIG['client_id'],
-            authority=EMAIL_CONFIG['authority'],
-            client_credential=EMAIL_CONFIG['client_secret']
-        )
-        
-        scopes = ["https://graph.microsoft.com/.default"]
-        result = app.acquire_token_silent(scopes, account=None)
-        
-        if not result:
-            result = app.acquire_token_for_client(scopes=scopes)
-        
-        if "access_token" in result:
-            return result["access_token"]
-        else:
-            print(f"Token acquisition failed: {result}")
-            return None
+        with TOKEN_LOCK:
+            TOKEN_STATS['requests'] += 1
+            if TOKEN_STATE['token'] and TOKEN_STATE['expires_at'] - time.time() > refresh_margin():
+                token, source = TOKEN_STATE['token'], 'memory'
+            else:
+                token, source = fetch_token()
+            elapsed = time.perf_counter() - started
+            TOKEN_STATS['seconds'] += elapsed
+            if token is None:
+                TOKEN_STATS['failures'] += 1
+                return None
+            if source != 'network':
+                TOKEN_STATS['hits'] += 1
+            hits, requests_made = TOKEN_STATS['hits'], TOKEN_STATS['requests']
+            expires_in = TOKEN_STATE['expires_at'] - time.time()
+        
+        print(f"🔑 Graph token from {source} in {elapsed * 1000:.0f}ms, valid {expires_in / 60:.0f} more min "
+              f"(cache hit rate {hits}/{requests_made})")
+        start_token_refresher()
+        return token
     
     except Exception as e:
+        with TOKEN_LOCK:
+            TOKEN_STATS['failures'] += 1
         print(f"Error getting access token: {e}")
         return None
 
+HTTP_SESSION = None
+HTTP_SESSION_LOCK = threading.Lock()
+SEND_STATS = {'sends': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'seconds': 0.0, 'last_status': None}
+
+def get_http_session():
+    """One keep-alive session per process, so hourly sends reuse the TLS connection to Graph"""
+    global HTTP_SESSION
+    with HTTP_SESSION_LOCK:
+        if HTTP_SESSION is None:
+            HTTP_SESSION = requests.Session()
+            # Retries are handled in post_with_retries, where Retry-After and the counts are visible
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+            HTTP_SESSION.mount("https://", adapter)
+            HTTP_SESSION.mount("http://", adapter)
+        return HTTP_SESSION
+
+def retry_after_seconds(response, attempt):
+    """Delay the server asked for (seconds or HTTP date), else capped exponential backoff with jitter"""
+    header = response.headers.get('Retry-After') if response is not None else None
+    if header:
+        try:
+            return max(float(header), 0.0)
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(header)
+                return max((when - datetime.datetime.now(when.tzinfo)).total_seconds(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    return min(GRAPH_CONFIG['max_delay'], GRAPH_CONFIG['base_delay'] * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def post_with_retries(url, headers, payload):
+    """POST with connect/read timeouts, retrying 429/5xx and failed connects a bounded number of times.
+
+    Read timeouts are not retried: Graph may already have accepted the
+    message, and a duplicate alert is worse than a logged failure.
+    Returns (response or None, error or None, retries).
+    """
+    session = get_http_session()
+    timeout = (GRAPH_CONFIG['connect_timeout'], GRAPH_CONFIG['read_timeout'])
+    retries = 0
+    
+    for attempt in range(GRAPH_CONFIG['max_retries'] + 1):
+        response, error = None, None
+        with HTTP_SESSION_LOCK:
+            SEND_STATS['attempts'] += 1
+        try:
+            response = session.post(url, headers=headers, json=payload, timeout=timeout)
+            if response.status_code not in GRAPH_RETRY_STATUSES:
+                return response, None, retries
+        except requests.exceptions.ReadTimeout as e:
+            return None, f"no response within {GRAPH_CONFIG['read_timeout']:.0f}s: {e}", retries
+        except requests.exceptions.ConnectionError as e:
+            error = str(e)
+        
+        if attempt == GRAPH_CONFIG['max_retries']:
+            break
+        delay = retry_after_seconds(response, attempt)
+        if delay > GRAPH_CONFIG['max_delay']:
+            error = f"server asked to retry after {delay:.0f}s"
+            break
+        reason = f"HTTP {response.status_code}" if response is not None else "connection failed"
+        print(f"⚠️ Graph sendMail {reason}, retry {attempt + 1}/{GRAPH_CONFIG['max_retries']} in {delay:.1f}s")
+        time.sleep(delay)
+        retries += 1
+    
+    return response, error, retries
+
+def get_send_stats():
+    with HTTP_SESSION_LOCK:
+        return dict(SEND_STATS)
+
 def send_email(subject, body):
     """Send email using Microsoft Graph API with multi-recipient support"""
     try:
@@ -458,7 +644,7 @@ def send_email(subject, body):
             return False, "Failed to get access token"
         
         # Use users endpoint instead of /me for application authentication
-        url = f"https://graph.microsoft.com/v1.0/users/{EMAIL_CONFIG['sender_email']}/sendMail"
+        url = f"{GRAPH_CONFIG['base_url']}/users/{EMAIL_CONFIG['sender_email']}/sendMail"
         
         headers = {
             'Authorization': f'Bearer {access_token}',
@@ -467,10 +653,10 @@ def send_email(subject, body):
         
         # Create recipient list
         recipients = []
-        for email in EMAIL_CONFIG['recipient_emails']:
+        for email_address in EMAIL_CONFIG['recipient_emails']:
             recipients.append({
                 "emailAddress": {
-                    "address": email
+                    "address": email_address
                 }
             })
         
@@ -485,44 +671,67 @@ def send_email(subject, body):
             }
         }
         
-        response = requests.post(url, headers=headers, json=email_data)
-        
-        if response.status_code == 202:
+        started = time.perf_counter()
+        response, error, retries = post_with_retries(url, headers, email_data)
+        elapsed = time.perf_counter() - started
+        
+        status = response.status_code if response is not None else None
+        with HTTP_SESSION_LOCK:
+            SEND_STATS['sends'] += 1
+            SEND_STATS['retries'] += retries
+            SEND_STATS['seconds'] += elapsed
+            SEND_STATS['last_status'] = status
+            if status != 202:
+                SEND_STATS['failures'] += 1
+        print(f"📨 Graph sendMail: {status or 'no response'} in {elapsed * 1000:.0f}ms, {retries} retries")
+        
+        if status == 202:
             recipient_list = ", ".join(EMAIL_CONFIG['recipient_emails'])
             return True, f"Email sent successfully to: {recipient_list}"
-        else:
+        elif response is not None:
             return False, f"Email failed: {response.status_code} - {response.text}"
+        else:
+            return False, f"Email failed: {error}"
     
     except Exception as e:
         return False, f"Email error: {str(e)}"
 
-def send_hourly_automation_report():
-    """Main function to send hourly automation report"""
+def build_hourly_notification(run_result=None):
+    """Subject, body and digest signature of the hourly email.
+
+    main() passes its run result; without one (python notifications.py) the
+    outcome is re-derived from the files on disk and a database probe.
+    """
+    if run_result is not None:
+        report_data = summarize_run_result(run_result)
+    else:
+        report_data = generate_hourly_report_summary()
+    
+    hour_display = report_data['hour_info']['hour_12']
+    status = "SUCCESS" if report_data['overall_success'] else "FAILED"
+    return {
+        'subject': f"gemba-automation {status} {report_data['report_date']} {hour_display}",
+        'body': create_hourly_email(report_data),
+        'signature': notification_signature(report_data),
+        'success': report_data['overall_success'],
+        'report_date': report_data['report_date'],
+        'hour_label': hour_display
+    }
+
+def send_hourly_automation_report(run_result=None):
+    """Build and send the hourly report right away (bypasses the notification queue)"""
     try:
         print("\n📧 GENERATING HOURLY AUTOMATION REPORT EMAIL")
         print("=" * 50)
         
-        # Generate report
-        report_data = generate_hourly_report_summary()
-        
-        # Create email content
-        email_body = create_hourly_email(report_data)
-        
-        # Create subject with time
-        hour_display = report_data['hour_info']['hour_12']
-        if report_data['overall_success']:
-            subject = f"gemba-automation SUCCESS {report_data['report_date']} {hour_display}"
-        else:
-            subject = f"gemba-automation FAILED {report_data['report_date']} {hour_display}"
-        
-        # Send email
-        success, message = send_email(subject, email_body)
+        notification = build_hourly_notification(run_result)
+        success, message = send_email(notification['subject'], notification['body'])
         
         if success:
             print("✅ Hourly automation report email sent successfully")
             print(f"   Recipients: {', '.join(EMAIL_CONFIG['recipient_emails'])}")
-            print(f"   Subject: {subject}")
-            if report_data['overall_success']:
+            print(f"   Subject: {notification['subject']}")
+            if notification['success']:
                 print("   Status: SUCCESS - Simple notification sent")
             else:
                 print("   Status: FAILURE - Detailed error report sent")
@@ -535,6 +744,152 @@ def send_hourly_automation_report():
         print(f"❌ Report generation failed: {e}")
         return False
 
+NOTIFY_WAKE = threading.Event()
+NOTIFY_LOCK = threading.Lock()
+# 'deliver' is switched off in isolated run processes, whose scheduler parent delivers instead
+NOTIFY_WORKER = {'thread': None, 'passes': 0, 'deliver': True}
+NOTIFY_WORKER_LOCK = threading.Lock()
+
+def queue_hourly_report(run_result=None):
+    """Queue the hourly report for the background worker and return without waiting on Graph.
+
+    Falls back to sending inline when the queue is disabled or cannot be written.
+    """
+    if not NOTIFY_CONFIG['enabled']:
+        return send_hourly_automation_report(run_result)
+    
+    try:
+        notification = build_hourly_notification(run_result)
+        entry_id = notification_queue.enqueue(notification['signature'], notification['success'],
+                                              notification['subject'], notification['body'],
+                                              notification['report_date'], notification['hour_label'])
+    except Exception as e:
+        print(f"⚠️ Could not queue notification ({e}), sending it now")
+        return send_hourly_automation_report(run_result)
+    
+    print(f"📬 Notification #{entry_id} queued: {notification['subject']}")
+    start_notification_worker()
+    NOTIFY_WAKE.set()
+    return True
+
+def digest_body(entry, covered):
+    """Entry's email with the held repeats it stands in for listed underneath"""
+    if not covered:
+        return entry['subject'], entry['body']
+    lines = [entry['body'], "", f"Also since the last email ({len(covered)} more runs held as repeats):"]
+    for held in covered:
+        lines.append(f"   • {held['subject']}")
+    return f"{entry['subject']} (+{len(covered)} earlier)", "\n".join(lines)
+
+def deliver(entry, covered=(), now=None):
+    """Email one queued notification, summarizing the held entries in covered"""
+    subject, body = digest_body(entry, covered)
+    success, message = send_email(subject, body)
+    if success:
+        notification_queue.mark_sent(entry['id'], [held['id'] for held in covered])
+        print(f"✅ Notification #{entry['id']} sent: {subject}")
+    else:
+        status, retry_at = notification_queue.mark_attempt_failed(entry['id'], message, now)
+        if status == 'failed':
+            print(f"❌ Notification #{entry['id']} not sent, giving up after {entry['attempts'] + 1} attempts "
+                  f"over {NOTIFY_CONFIG['give_up_hours']:g}h: {message}")
+        else:
+            print(f"❌ Notification #{entry['id']} not sent (attempt {entry['attempts'] + 1}, "
+                  f"retry at {retry_at.strftime('%I:%M:%S %p')}): {message}")
+    return success
+
+def deliver_notifications(now=None):
+    """One pass of the digest policy over the queue.
+
+    A pending notification goes out at once when its result differs from the
+    run before it (a new failure type, or a recovery) or when that result has
+    not been emailed within the digest window; otherwise it is held. Held
+    repeats ride along with the next email of the same result, or go out as
+    a digest once their window has passed, so a digest only ever covers one
+    signature. Entries whose last send failed wait out their backoff.
+    Returns the number of emails sent, or None if another pass is already running.
+    """
+    if not NOTIFY_LOCK.acquire(blocking=False):
+        return None
+    
+    try:
+        now = now or get_arizona_time()
+        window = datetime.timedelta(minutes=NOTIFY_CONFIG['digest_window_minutes'])
+        sent = 0
+        
+        for entry in notification_queue.entries('pending'):
+            if not notification_queue.is_due(entry, now):
+                continue
+            last_sent = notification_queue.last_sent_at(entry['signature'])
+            repeat = notification_queue.previous_signature(entry['id']) == entry['signature']
+            if repeat and last_sent and now - last_sent < window:
+                notification_queue.hold(entry['id'])
+                print(f"🗂️ Notification #{entry['id']} held as a repeat of {entry['signature']} "
+                      f"(digest after {(last_sent + window).strftime('%I:%M %p')})")
+                continue
+            covered = [held for held in notification_queue.entries('held') if held['signature'] == entry['signature']]
+            if deliver(entry, covered, now):
+                sent += 1
+        
+        held_by_signature = {}
+        for entry in notification_queue.entries('held'):
+            held_by_signature.setdefault(entry['signature'], []).append(entry)
+        for signature, held in held_by_signature.items():
+            last_sent = notification_queue.last_sent_at(signature)
+            if (not last_sent or now - last_sent >= window) and notification_queue.is_due(held[-1], now):
+                # The newest repeat carries the digest of the older ones
+                if deliver(held[-1], held[:-1], now):
+                    sent += 1
+        return sent
+    finally:
+        NOTIFY_LOCK.release()
+
+def start_notification_worker():
+    """Daemon thread delivering queued notifications (woken on enqueue, else every poll_seconds)"""
+    with NOTIFY_WORKER_LOCK:
+        if not NOTIFY_WORKER['deliver']:
+            return None
+        if NOTIFY_WORKER['thread'] and NOTIFY_WORKER['thread'].is_alive():
+            return NOTIFY_WORKER['thread']
+        
+        def deliver_forever():
+            while True:
+                NOTIFY_WAKE.wait(NOTIFY_CONFIG['poll_seconds'])
+                NOTIFY_WAKE.clear()
+                try:
+                    if notification_queue.outstanding_count():
+                        deliver_notifications()
+                except Exception as e:
+                    print(f"⚠️ Notification worker error: {e}")
+                NOTIFY_WORKER['passes'] += 1
+        
+        thread = threading.Thread(target=deliver_forever, name="notification-worker", daemon=True)
+        thread.start()
+        NOTIFY_WORKER['thread'] = thread
+        # Pick up anything a previous process queued but never delivered
+        NOTIFY_WAKE.set()
+        return thread
+
+def flush_notifications(timeout=60):
+    """Give the worker one delivery pass (up to timeout seconds) over the pending notifications.
+
+    For one-shot runs that exit right after main(). Anything still pending
+    (Graph unreachable) or held for a digest stays queued for the next
+    process's worker.
+    """
+    if not NOTIFY_CONFIG['enabled'] or not notification_queue.entries('pending'):
+        return True
+    start_notification_worker()
+    passes = NOTIFY_WORKER['passes']
+    NOTIFY_WAKE.set()
+    deadline = time.monotonic() + timeout
+    while NOTIFY_WORKER['passes'] == passes and time.monotonic() < deadline:
+        time.sleep(0.2)
+    if notification_queue.entries('pending'):
+        print("⚠️ Notifications still pending, they will be delivered on the next start")
+        return False
+    return True
+
 # Test function for manual testing
 def test_hourly_notification():
     """Test the hourly notification system"""
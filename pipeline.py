@@ -0,0 +1,141 @@
+import os
+import time
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+PIPELINE_CONFIG = {
+    'max_workers': int(os.getenv('PIPELINE_WORKERS', '4'))
+}
+
+class Stage:
+    """One step of a run: func(results) is called once every stage in deps has finished.
+
+    main_thread stages run on the thread that called run_pipeline (Playwright's
+    sync API only works there); all others run on the worker pool.
+    """
+    def __init__(self, name, func, deps=(), main_thread=False):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.main_thread = main_thread
+
+def check_graph(stages):
+    """Reject unknown dependencies and cycles before anything runs"""
+    names = {stage.name for stage in stages}
+    if len(names) != len(stages):
+        raise ValueError("Duplicate stage names")
+    for stage in stages:
+        unknown = [dep for dep in stage.deps if dep not in names]
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {unknown}")
+
+    resolved = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(dep in resolved for dep in stage.deps)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages {[stage.name for stage in remaining]}")
+        resolved.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage.name not in resolved]
+
+def run_pipeline(stages, max_workers=None):
+    """Run stages as soon as their inputs are ready; returns ({name: result}, {name: timing}).
+
+    A stage that raises records None as its result (and the error in its
+    timing); its dependents still run and decide for themselves what to do
+    with a missing input, like the sequential code did.
+    """
+    check_graph(stages)
+    started = time.perf_counter()
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    timings = {}
+    pending = dict(by_name)
+    lock = threading.Lock()
+    main_queue = queue.Queue()
+
+    def execute(stage):
+        stage_started = time.perf_counter()
+        print(f"\n▶️  {stage.name}")
+        try:
+            value, error = stage.func(results), None
+        except Exception as e:
+            value, error = None, str(e)
+            print(f"❌ Stage {stage.name} failed: {e}")
+            traceback.print_exc()
+        return value, {'start': stage_started - started, 'end': time.perf_counter() - started,
+                       'thread': 'main' if stage.main_thread else 'worker', 'error': error}
+
+    def take_ready():
+        """Pop every pending stage whose deps are done (caller holds the lock)"""
+        ready = [stage for stage in pending.values() if all(dep in timings for dep in stage.deps)]
+        for stage in ready:
+            del pending[stage.name]
+        return ready
+
+    def complete(stage, value, timing):
+        with lock:
+            results[stage.name] = value
+            timings[stage.name] = timing
+            ready = take_ready()
+            finished = len(timings) == len(by_name)
+        for next_stage in ready:
+            dispatch(next_stage)
+        if finished:
+            main_queue.put(None)
+
+    def run_on_worker(stage):
+        value, timing = execute(stage)
+        complete(stage, value, timing)
+
+    def dispatch(stage):
+        if stage.main_thread:
+            main_queue.put(stage)
+        else:
+            pool.submit(run_on_worker, stage)
+
+    with ThreadPoolExecutor(max_workers=max_workers or PIPELINE_CONFIG['max_workers'],
+                            thread_name_prefix="stage") as pool:
+        with lock:
+            initial = take_ready()
+        for stage in initial:
+            dispatch(stage)
+
+        # Main-thread stages are handed back here; worker stages chain on from their own threads
+        while True:
+            stage = main_queue.get()
+            if stage is None:
+                break
+            value, timing = execute(stage)
+            complete(stage, value, timing)
+
+    print_stage_timings(stages, timings)
+    return results, timings
+
+def critical_path(stages, timings):
+    """Chain of stages ending last, each preceded by the dependency that finished latest"""
+    by_name = {stage.name: stage for stage in stages}
+    current = max(timings, key=lambda name: timings[name]['end'])
+    path = [current]
+    while by_name[current].deps:
+        current = max(by_name[current].deps, key=lambda name: timings[name]['end'])
+        path.append(current)
+    return list(reversed(path))
+
+def print_stage_timings(stages, timings):
+    path = critical_path(stages, timings)
+    total = max(timing['end'] for timing in timings.values())
+    busy = sum(timings[name]['end'] - timings[name]['start'] for name in path)
+
+    print(f"\n⏱️  STAGE TIMINGS ({total:.1f}s wall clock, ★ = critical path)")
+    print("=" * 60)
+    for name in sorted(timings, key=lambda name: (timings[name]['start'], timings[name]['end'])):
+        timing = timings[name]
+        marker = "★" if name in path else " "
+        status = " ❌" if timing['error'] else ""
+        print(f"{marker} {name:<20} {timing['start']:>7.1f}s → {timing['end']:>7.1f}s "
+              f"{timing['end'] - timing['start']:>7.1f}s  {timing['thread']}{status}")
+    print(f"Critical path: {' → '.join(path)} ({busy:.1f}s running, {total - busy:.1f}s waiting)")
+    print("=" * 60)
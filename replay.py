@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import zipfile
+import datetime
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytz
+
+import app
+import sql
+import reports
+import artifact_manifest
+from pipeline import run_pipeline
+from sql import upload_table_report
+
+REPLAY_CONFIG = {
+    # Recorded hours reprocessed at once; each runs in its own process with its own clock
+    'workers': int(os.getenv('REPLAY_WORKERS', '4')),
+    'log_dir': os.getenv('REPLAY_LOG_DIR', os.path.join(os.getcwd(), "Replay Logs"))
+}
+
+# Everything main() does between the downloads and the uploads
+PROCESS_STAGES = {'financial_download', 'ro_download', 'financial_process', 'ro_process', 'combine', 'verify'}
+
+# Raw export names as download_financial_report / download_ro_reports save them, plus the
+# _retry1 / _HHMMSS suffixes download_csv_safe falls back to
+FINANCIAL_NAME = re.compile(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})_H(\d{2})(?:_[^.]*)?\.csv$')
+RO_NAME = re.compile(r'^([A-Za-z-]+)-(\d{2})\.(\d{2})\.(\d{2})_H(\d{2})(?:_[^.]*)?\.csv$')
+
+def parse_export_name(name):
+    """(report, shop, 'YYYY-MM-DD', hour) for a raw export file name, or None"""
+    name = os.path.basename(name)
+    match = FINANCIAL_NAME.match(name)
+    if match:
+        month, day, year, hour = (int(group) for group in match.groups())
+        return "financial", "ALL", f"{year:04d}-{month:02d}-{day:02d}", hour
+    match = RO_NAME.match(name)
+    if match:
+        location = match.group(1).replace('-', ' ')
+        month, day, year, hour = (int(group) for group in match.groups()[1:])
+        if location in reports.EXPECTED_LOCATIONS:
+            return "ro", location, f"{2000 + year:04d}-{month:02d}-{day:02d}", hour
+    return None
+
+def add_export(recordings, report, shop, report_date, hour, payload):
+    if report in ("financial", "ro"):
+        recordings.setdefault((report_date, int(hour)), {})[(report, shop)] = payload
+
+def load_store_archive(archive, recordings):
+    """Artifact store day archive: manifest.json keyed report|shop|date|hour plus gzipped blobs"""
+    for key, entry in json.loads(archive.read("manifest.json")).items():
+        report, shop, report_date, hour = key.split('|')
+        add_export(recordings, report, shop, report_date, hour,
+                   gzip.decompress(archive.read(f"objects/{entry['hash']}.csv.gz")))
+
+def load_recordings(source):
+    """{(date, hour): {(report, shop): raw bytes}} from a directory or zip of recorded exports.
+
+    Accepts the artifact store itself (hot manifest and day archives), one of its
+    day archives, or any directory/zip of raw exports named as they were downloaded.
+    """
+    recordings = {}
+
+    if os.path.isfile(source):
+        with zipfile.ZipFile(source, 'r') as archive:
+            if "manifest.json" in archive.namelist():
+                load_store_archive(archive, recordings)
+            else:
+                for name in archive.namelist():
+                    parsed = parse_export_name(name)
+                    if parsed:
+                        add_export(recordings, *parsed, archive.read(name))
+        return recordings
+
+    manifest_path = os.path.join(source, "manifest.db")
+    if os.path.exists(manifest_path) and os.path.isdir(os.path.join(source, "objects")):
+        archives_dir = os.path.join(source, "archives")
+        if os.path.isdir(archives_dir):
+            for name in sorted(os.listdir(archives_dir)):
+                if name.endswith(".zip"):
+                    with zipfile.ZipFile(os.path.join(archives_dir, name), 'r') as archive:
+                        load_store_archive(archive, recordings)
+        for row in artifact_manifest.stored_artifacts(archived=False, db_path=manifest_path):
+            blob_path = os.path.join(source, "objects", row['blob_hash'][:2], f"{row['blob_hash']}.csv.gz")
+            with gzip.open(blob_path, 'rb') as blob:
+                add_export(recordings, row['report'], row['shop'], row['report_date'], row['hour'], blob.read())
+        return recordings
+
+    for dirpath, _, filenames in os.walk(source):
+        for name in sorted(filenames):
+            parsed = parse_export_name(name)
+            if parsed:
+                with open(os.path.join(dirpath, name), 'rb') as file:
+                    add_export(recordings, *parsed, file.read())
+    return recordings
+
+def recorded_moment(report_date, hour):
+    date = datetime.datetime.strptime(report_date, "%Y-%m-%d").date()
+    return pytz.timezone('US/Arizona').localize(datetime.datetime.combine(date, datetime.time(hour)))
+
+@contextlib.contextmanager
+def recorded_clock(moment):
+    """Make the run code see the recorded hour as "now" (replays run one hour per process)"""
+    modules = (app, reports, sql)
+    originals = [module.get_arizona_time for module in modules]
+    for module in modules:
+        module.get_arizona_time = lambda: moment
+    try:
+        yield
+    finally:
+        for module, original in zip(modules, originals):
+            module.get_arizona_time = original
+
+class ReplayPage:
+    """No-op stand-in for the Playwright page the download functions navigate"""
+    def goto(self, url, timeout=None):
+        pass
+
+    def wait_for_timeout(self, timeout):
+        pass
+
+class ReplaySession:
+    """TekmetricSession look-alike whose downloads write the recorded raw export"""
+    store_downloads = False
+
+    def __init__(self, exports):
+        self.exports = exports
+        self.page = ReplayPage()
+        self.first_download_at = None
+
+    def wait_random(self, min_sec=2, max_sec=4):
+        pass
+
+    def download_csv_safe(self, filename, download_dir, report_type="report"):
+        parsed = parse_export_name(filename)
+        payload = self.exports.get(parsed[:2]) if parsed else None
+        if payload is None:
+            print(f"❌ No recorded {report_type} export for {filename}")
+            return False
+        with open(os.path.join(download_dir, filename), 'wb') as file:
+            file.write(payload)
+        print(f"✅ Replayed: {filename} ({len(payload)} bytes)")
+        return filename
+
+def replay_hour(task):
+    """Process, combine and verify one recorded hour; output goes to a per-hour log file"""
+    report_date, hour, exports = task
+    started = time.perf_counter()
+    os.makedirs(REPLAY_CONFIG['log_dir'], exist_ok=True)
+    log_path = os.path.join(REPLAY_CONFIG['log_dir'], f"{report_date}_H{hour:02d}.log")
+    results, error = {}, None
+
+    with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log), \
+            recorded_clock(recorded_moment(report_date, hour)):
+        try:
+            dirs = app.setup_directories()
+            dates = app.get_date_info()
+            stages = [stage for stage in app.build_run_stages(ReplaySession(exports), dirs, dates)
+                      if stage.name in PROCESS_STAGES]
+            results, _ = run_pipeline(stages)
+        except Exception as e:
+            error = str(e)
+            print(f"❌ Replay failed: {e}")
+
+    ro_recorded = sum(1 for report, _ in exports if report == "ro")
+    return {
+        'date': report_date,
+        'hour': hour,
+        # A table only counts as replayed when its export was recorded, so an hour
+        # missing the financial file never uploads the all-zero placeholder
+        'financial': ("financial", "ALL") in exports and bool(results.get('financial_process')),
+        'ro': ro_recorded > 0 and bool(results.get('combine')),
+        'ro_files': ro_recorded,
+        'verified': bool((results.get('verify') or {}).get('verified')),
+        'error': error,
+        'seconds': time.perf_counter() - started,
+        'log': log_path
+    }
+
+def upload_replayed_hour(summary):
+    """Upload one processed hour exactly as main() would, under the recorded clock"""
+    moment = recorded_moment(summary['date'], summary['hour'])
+    created_at_hour = moment.strftime("%I %p").lstrip('0')
+    results = {}
+    with recorded_clock(moment):
+        if summary['financial']:
+            results['custom_financials_2'] = upload_table_report('custom_financials_2', created_at_hour, moment)
+        if summary['ro']:
+            results['ro_marketing_2'] = upload_table_report('ro_marketing_2', created_at_hour, moment)
+    return results
+
+def replay(source, upload=True, workers=None, date_from=None, date_to=None):
+    """Reprocess every recorded hour in source in parallel, then upload them oldest first"""
+    recordings = load_recordings(source)
+    tasks = [(report_date, hour, exports) for (report_date, hour), exports in sorted(recordings.items())
+             if (not date_from or report_date >= date_from) and (not date_to or report_date <= date_to)]
+    if not tasks:
+        print(f"❌ No recorded exports found in {source}")
+        return False
+
+    workers = workers or REPLAY_CONFIG['workers']
+    print(f"\n🔁 REPLAY: {len(tasks)} recorded hours from {source} ({tasks[0][0]} → {tasks[-1][0]})")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    if workers > 1 and len(tasks) > 1:
+        # spawn, not fork: each worker imports a clean copy of the run modules
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            summaries = list(pool.map(replay_hour, tasks))
+    else:
+        summaries = [replay_hour(task) for task in tasks]
+    processing_seconds = time.perf_counter() - started
+
+    for summary in summaries:
+        status = "✅" if summary['financial'] and summary['ro'] and summary['verified'] else "⚠️"
+        print(f"{status} {summary['date']} H{summary['hour']:02d}  financial {'ok' if summary['financial'] else '--'}"
+              f"  RO {'ok' if summary['ro'] else '--'} ({summary['ro_files']}/6)"
+              f"  verify {'ok' if summary['verified'] else 'FAIL'}  {summary['seconds']:.1f}s"
+              f"{'  ' + summary['error'] if summary['error'] else ''}")
+    print(f"Processed {len(summaries)} hours in {processing_seconds:.1f}s with {min(workers, len(tasks))} workers "
+          f"(logs in {REPLAY_CONFIG['log_dir']})")
+
+    if not upload:
+        return all(summary['financial'] and summary['ro'] for summary in summaries)
+
+    # Chronological, one hour at a time, so each day ends on its latest recorded hour
+    print("\n📤 Uploading replayed hours in recorded order...")
+    success = True
+    for summary in summaries:
+        results = upload_replayed_hour(summary)
+        uploaded = bool(results) and all(results.values())
+        success = success and uploaded
+        outcome = ', '.join(f"{table} {'ok' if ok else 'failed'}" for table, ok in results.items())
+        print(f"{'✅' if uploaded else '❌'} {summary['date']} H{summary['hour']:02d}: {outcome or 'nothing to upload'}")
+
+    sql.close_all_connections()
+    return success
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0] == "--help":
+        print("\n📖 REPLAY COMMANDS")
+        print("=" * 40)
+        print("python replay.py <dir|zip>                  - Reprocess and upload recorded exports")
+        print("python replay.py <dir|zip> --no-upload      - Process and verify only")
+        print("python replay.py <dir|zip> --workers N      - Hours processed in parallel")
+        print("python replay.py <dir|zip> --from YYYY-MM-DD --to YYYY-MM-DD")
+        print("=" * 40)
+    else:
+        options = {'upload': "--no-upload" not in args}
+        for flag, name in (("--workers", 'workers'), ("--from", 'date_from'), ("--to", 'date_to')):
+            if flag in args:
+                value = args[args.index(flag) + 1]
+                options[name] = int(value) if name == 'workers' else value
+        sys.exit(0 if replay(args[0], **options) else 1)
@@ -3,6 +3,8 @@ import os
 import datetime
 import pytz
 
+from artifact_manifest import find_artifact_path, record_artifact, mark_stage
+
 def get_arizona_time():
     return datetime.datetime.now(pytz.timezone('US/Arizona'))
 
@@ -121,75 +123,146 @@ def create_empty_ro_record(location_name, today_formatted, created_at_hour):
                 location_name, today_formatted, created_at_hour]
     return [headers, empty_row]
 
-def process_ro_marketing_report(location_name, filename, created_at_hour=None):
-    """Process RO marketing report and add metadata"""
+PARSE_CONFIG = {
+    # 0 or 1 keeps parsing serial (the default); >1 fans per-location files out to a process
+    # pool. Off because pool start-up dominates: on one CPU, benchmark.py parse measures the
+    # pool 10-100x slower than serial at 6 and 60 files and still slower at 600. Only enable
+    # it on a multi-core host where that benchmark shows the pool winning.
+    'pool_size': int(os.getenv('PARSE_POOL_SIZE', '0')),
+    # Below this many files the pool start-up cost outweighs the parallel parse
+    'min_files_for_pool': int(os.getenv('PARSE_POOL_MIN_FILES', '50'))
+}
+
+def normalize_ro_file(task):
+    """Add Location/Report_Date/Created_At to one RO export; picklable for process pools.
+
+    task is (location_name, filepath, today_formatted, created_at_hour). Returns a
+    small summary dict instead of the rows so results stay cheap to send back.
+    """
+    location_name, filepath, today_formatted, created_at_hour = task
+    result = {'location': location_name, 'filepath': filepath, 'success': False,
+              'records': 0, 'ro_count': 0, 'created_empty': False, 'error': None}
     try:
-        today_formatted = get_arizona_time().strftime("%m/%d/%Y")
-        
-        # Set default created_at_hour if not provided
-        if not created_at_hour:
-            created_at_hour = get_arizona_time().strftime("%I %p").lstrip('0')
-        
-        ro_dir = os.path.join(os.getcwd(), "RO Reports")
-        filepath = os.path.join(ro_dir, filename)
-        
-        print(f"Processing RO file: {filepath}")
-        
         rows = read_csv_safe(filepath)
         if not rows:
-            print(f"⚠️ RO file not found or empty, creating with zero values")
             rows = create_empty_ro_record(location_name, today_formatted, created_at_hour)
-            if not write_csv_safe(filepath, rows):
-                return False
+            result['created_empty'] = True
         
         headers = rows[0]
         
         # Ensure required columns exist
-        required_columns = ['Location', 'Report_Date', 'Created_At']
-        for col in required_columns:
+        for col in ['Location', 'Report_Date', 'Created_At']:
             if col not in headers:
                 headers.append(col)
         
-        # Get column indices
         location_idx = headers.index('Location')
         date_idx = headers.index('Report_Date')
         created_at_idx = headers.index('Created_At')
+        ro_count_idx = headers.index('RO Count') if 'RO Count' in headers else None
         
         # If only headers exist, add empty data row
         if len(rows) == 1:
-            empty_row = [''] * len(headers)
-            empty_row[location_idx] = location_name
-            empty_row[date_idx] = today_formatted
-            empty_row[created_at_idx] = created_at_hour
-            rows.append(empty_row)
-        else:
-            # Update existing data rows
-            for i in range(1, len(rows)):
-                # Ensure row has enough columns
-                while len(rows[i]) < len(headers):
-                    rows[i].append('')
-                
-                # Set metadata
-                rows[i][location_idx] = location_name
-                rows[i][date_idx] = today_formatted
-                rows[i][created_at_idx] = created_at_hour
+            rows.append([''] * len(headers))
+        
+        width = len(headers)
+        for i in range(1, len(rows)):
+            row = rows[i]
+            if len(row) < width:
+                row.extend([''] * (width - len(row)))
+            row[location_idx] = location_name
+            row[date_idx] = today_formatted
+            row[created_at_idx] = created_at_hour
+            if ro_count_idx is not None:
+                result['ro_count'] += int(parse_number(row[ro_count_idx]))
         
-        # Update headers
         rows[0] = headers
         
         if write_csv_safe(filepath, rows):
+            result['success'] = True
+            result['records'] = len(rows) - 1
+        else:
+            result['error'] = f"Could not write {filepath}"
+        
+    except Exception as e:
+        result['error'] = str(e)
+    
+    return result
+
+def process_ro_marketing_report(location_name, filename, created_at_hour=None):
+    """Process RO marketing report and add metadata"""
+    try:
+        today_formatted = get_arizona_time().strftime("%m/%d/%Y")
+        
+        # Set default created_at_hour if not provided
+        if not created_at_hour:
+            created_at_hour = get_arizona_time().strftime("%I %p").lstrip('0')
+        
+        filepath = os.path.join(os.getcwd(), "RO Reports", filename)
+        
+        print(f"Processing RO file: {filepath}")
+        
+        result = normalize_ro_file((location_name, filepath, today_formatted, created_at_hour))
+        
+        if result['created_empty']:
+            print(f"⚠️ RO file not found or empty, created with zero values")
+        
+        if result['success']:
             print(f"✅ RO report processed: {location_name}")
-            print(f"   Records: {len(rows)-1}, Created At: {created_at_hour}")
+            print(f"   Records: {result['records']}, Created At: {created_at_hour}")
             return True
         
+        print(f"❌ RO processing error for {location_name}: {result['error']}")
         return False
         
     except Exception as e:
         print(f"❌ RO processing error for {location_name}: {e}")
         return False
 
-def combine_ro_reports(yesterday_short, created_at_hour=None):
-    """Combine all RO reports into single file"""
+def process_ro_reports_batch(downloads, created_at_hour=None, pool_size=None):
+    """Normalize many per-location RO files, serially unless PARSE_POOL_SIZE opts into a process pool.
+
+    downloads is a list of (location_name, filename) pairs. Returns the list of
+    normalize_ro_file summaries in input order.
+    """
+    today_formatted = get_arizona_time().strftime("%m/%d/%Y")
+    if not created_at_hour:
+        created_at_hour = get_arizona_time().strftime("%I %p").lstrip('0')
+    
+    ro_dir = os.path.join(os.getcwd(), "RO Reports")
+    tasks = [(name, os.path.join(ro_dir, filename), today_formatted, created_at_hour)
+             for name, filename in downloads]
+    
+    pool_size = PARSE_CONFIG['pool_size'] if pool_size is None else pool_size
+    results = None
+    
+    if pool_size > 1 and len(tasks) >= PARSE_CONFIG['min_files_for_pool']:
+        try:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            
+            # spawn, not fork: the parent is driving Chromium from a live event loop
+            with ProcessPoolExecutor(max_workers=pool_size,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                results = list(pool.map(normalize_ro_file, tasks, chunksize=max(1, len(tasks) // (pool_size * 4))))
+            print(f"Processed {len(tasks)} RO files with {pool_size} worker processes")
+        except Exception as e:
+            print(f"⚠️ Process pool unavailable ({e}), falling back to serial parsing")
+            results = None
+    
+    if results is None:
+        results = [normalize_ro_file(task) for task in tasks]
+    
+    for result in results:
+        if result['success']:
+            print(f"  ✅ {result['location']}: {result['records']} records"
+                  f"{' (empty placeholder)' if result['created_empty'] else ''}")
+        else:
+            print(f"  ❌ {result['location']}: {result['error']}")
+    
+    return results
+
+def combine_ro_reports(yesterday_short, created_at_hour=None, run_at=None):
+    """Combine all RO reports into single file (run_at: the run's clock reading, keys the manifest)"""
     try:
         # Set default created_at_hour if not provided
         if not created_at_hour:
@@ -207,7 +280,7 @@ def combine_ro_reports(yesterday_short, created_at_hour=None):
         ]
         
         # Generate filenames with hour
-        az_time = get_arizona_time()
+        az_time = run_at or get_arizona_time()
         ro_files = [f"{loc}-{yesterday_short}_H{az_time.hour:02d}.csv" for loc in locations]
         
         combined_filename = f"TekmetricGemba_RO_{yesterday_short}_H{az_time.hour:02d}.csv"
@@ -217,19 +290,24 @@ def combine_ro_reports(yesterday_short, created_at_hour=None):
         headers_set = False
         processed_count = 0
         files_to_delete = []
+        empty_locations = set()
         
         print("Combining RO reports...")
         
         for i, filename in enumerate(ro_files):
-            filepath = os.path.join(ro_dir, filename)
             location_name = locations[i].replace('-', ' ')
+            # Manifest knows the real name when the download fell back to a _retry/timestamp variant
+            filepath = find_artifact_path("ro", location_name, az_time.date(), az_time.hour,
+                                          os.path.join(ro_dir, filename))
             
             rows = read_csv_safe(filepath)
             if not rows:
                 print(f"⚠️ Missing file {filename}, creating empty record")
-                today_formatted = get_arizona_time().strftime("%m/%d/%Y")
+                today_formatted = az_time.strftime("%m/%d/%Y")
                 rows = create_empty_ro_record(location_name, today_formatted, created_at_hour)
                 write_csv_safe(filepath, rows)
+                record_artifact(filepath, "ro", location_name, az_time.date(), az_time.hour, "processed", "empty")
+                empty_locations.add(location_name)
             
             # Add headers only once
             if not headers_set:
@@ -247,6 +325,14 @@ def combine_ro_reports(yesterday_short, created_at_hour=None):
             return None
         
         if write_csv_safe(combined_filepath, combined_data):
+            record_artifact(combined_filepath, "ro_combined", "ALL", az_time.date(), az_time.hour, "combined")
+            
+            # Per-shop entries now live inside the combined file (raw copies stay in the artifact store)
+            for location in locations:
+                location_name = location.replace('-', ' ')
+                mark_stage("ro", location_name, az_time.date(), az_time.hour, "combined",
+                           "empty" if location_name in empty_locations else "ok")
+            
             # Clean up individual files
             for filepath in files_to_delete:
                 try:
@@ -264,8 +350,155 @@ def combine_ro_reports(yesterday_short, created_at_hour=None):
         print(f"❌ Combine error: {e}")
         return None
 
-def verify_data_accuracy(financial_filename, ro_filename, created_at_hour=None):
-    """Verify data accuracy and completeness - FIXED VERSION for Hourly System"""
+EXPECTED_LOCATIONS = ["Mesa Broadway", "Mesa Guadalupe", "Phoenix", "Tempe", "Sun City West", "Surprise"]
+
+def normalize_location_name(name):
+    """Map 'Gemba Automotive - Mesa Broadway (003)' and 'Mesa-Broadway' to 'Mesa Broadway'"""
+    name = str(name).strip()
+    if ' - ' in name:
+        name = name.split(' - ', 1)[1]
+    if name.endswith(')') and '(' in name:
+        name = name[:name.rindex('(')]
+    return name.replace('-', ' ').strip()
+
+def parse_number(value):
+    """Parse a report cell like '$1,234.50', '45%' or '' into a float"""
+    text = str(value).strip().replace('$', '').replace(',', '').replace('%', '')
+    if not text:
+        return 0.0
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+def find_column(headers, *candidates):
+    """Index of the first header matching one of the candidates (spaces or underscores)"""
+    normalized = [str(h).strip().replace('_', ' ').lower() for h in headers]
+    for candidate in candidates:
+        candidate = candidate.replace('_', ' ').lower()
+        if candidate in normalized:
+            return normalized.index(candidate)
+    return None
+
+def reconcile_reports(financial_path, ro_path, created_at_hour=None, expected_locations=None):
+    """Single pass over financial and combined RO files producing per-location reconciliation"""
+    expected_locations = expected_locations or EXPECTED_LOCATIONS
+    locations = {}
+
+    def location_entry(name):
+        if name not in locations:
+            locations[name] = {'car_count': 0, 'ro_count': 0, 'financial_sales': 0.0, 'ro_sales': 0.0,
+                               'in_financial': False, 'in_ro': False}
+        return locations[name]
+
+    result = {
+        'financial_found': False,
+        'ro_found': False,
+        'financial_error': None,
+        'ro_error': None,
+        'financial_car_count': 0,
+        'financial_sales': 0.0,
+        'financial_records': 0,
+        'ro_total_count': 0,
+        'ro_sales': 0.0,
+        'ro_records': 0,
+        'marketing_sources': 0,
+        'created_at_records': 0,
+        'locations': locations
+    }
+
+    financial_rows = read_csv_safe(financial_path)
+    if financial_rows:
+        result['financial_found'] = True
+        headers = financial_rows[0]
+        car_idx = find_column(headers, 'Car Count')
+        sales_idx = find_column(headers, 'Total Written Sales', 'Total Sales', 'Net Sales')
+        created_at_idx = find_column(headers, 'Created_At')
+
+        for row in financial_rows[1:]:
+            if not row:
+                continue
+            result['financial_records'] += 1
+            car_count = int(parse_number(row[car_idx])) if car_idx is not None and car_idx < len(row) else 0
+            sales = parse_number(row[sales_idx]) if sales_idx is not None and sales_idx < len(row) else 0.0
+
+            if created_at_idx is not None and created_at_idx < len(row):
+                if str(row[created_at_idx]).strip() == created_at_hour:
+                    result['created_at_records'] += 1
+
+            if str(row[0]).strip() == 'TOTAL':
+                result['financial_car_count'] = car_count
+                result['financial_sales'] = sales
+                continue
+
+            entry = location_entry(normalize_location_name(row[0]))
+            entry['in_financial'] = True
+            entry['car_count'] += car_count
+            entry['financial_sales'] += sales
+
+        if car_idx is None:
+            result['financial_error'] = "Car Count column not found"
+    else:
+        result['financial_error'] = f"File not found or has no data rows: {financial_path}"
+
+    ro_rows = read_csv_safe(ro_path)
+    if ro_rows:
+        result['ro_found'] = True
+        headers = ro_rows[0]
+        # Exact "RO Count" column (not "New RO Count" or "Repeat RO Count")
+        ro_count_idx = find_column(headers, 'RO Count')
+        sales_idx = find_column(headers, 'Total Sales')
+        location_idx = find_column(headers, 'Location')
+        sources = set()
+
+        for row in ro_rows[1:]:
+            if not row:
+                continue
+            result['ro_records'] += 1
+            if row[0] and str(row[0]).strip():
+                sources.add(str(row[0]).strip())
+
+            ro_count = int(parse_number(row[ro_count_idx])) if ro_count_idx is not None and ro_count_idx < len(row) else 0
+            sales = parse_number(row[sales_idx]) if sales_idx is not None and sales_idx < len(row) else 0.0
+            result['ro_total_count'] += ro_count
+            result['ro_sales'] += sales
+
+            if location_idx is not None and location_idx < len(row) and str(row[location_idx]).strip():
+                entry = location_entry(normalize_location_name(row[location_idx]))
+                entry['in_ro'] = True
+                entry['ro_count'] += ro_count
+                entry['ro_sales'] += sales
+
+        result['marketing_sources'] = len(sources)
+        if ro_count_idx is None:
+            result['ro_error'] = "Main RO Count column not found"
+        elif location_idx is None:
+            result['ro_error'] = "Location column not found"
+    else:
+        result['ro_error'] = f"File not found or has no data rows: {ro_path}"
+
+    for name in expected_locations:
+        location_entry(name)
+
+    result['financial_locations'] = sorted(n for n, e in locations.items() if e['in_financial'])
+    result['ro_locations'] = sorted(n for n, e in locations.items() if e['in_ro'])
+    result['missing_financial'] = [n for n in expected_locations if not locations[n]['in_financial']]
+    result['missing_ro'] = [n for n in expected_locations if not locations[n]['in_ro']]
+    result['mismatched_locations'] = sorted(
+        n for n, e in locations.items()
+        if e['in_financial'] and e['in_ro'] and e['car_count'] != e['ro_count']
+    )
+    result['totals_match'] = result['financial_car_count'] == result['ro_total_count']
+
+    return result
+
+def verify_data_accuracy(financial_filename, ro_filename, created_at_hour=None, run_at=None):
+    """Verify data accuracy and completeness per location using the reconciliation engine"""
+    recon = run_verification(financial_filename, ro_filename, created_at_hour, run_at)
+    return bool(recon and recon['verified'])
+
+def run_verification(financial_filename, ro_filename, created_at_hour=None, run_at=None):
+    """verify_data_accuracy's report, returning the reconciliation (plus verified/warnings) or None on error"""
     try:
         # Set default created_at_hour if not provided
         if not created_at_hour:
@@ -274,99 +507,24 @@ def verify_data_accuracy(financial_filename, ro_filename, created_at_hour=None):
         financial_dir = os.path.join(os.getcwd(), "Financial Reports")
         ro_dir = os.path.join(os.getcwd(), "RO Reports")
         
-        # Generate file paths with hour
-        az_time = get_arizona_time()
-        financial_path = os.path.join(financial_dir, f"{financial_filename}_H{az_time.hour:02d}.csv")
-        ro_path = os.path.join(ro_dir, f"TekmetricGemba_RO_{ro_filename}_H{az_time.hour:02d}.csv")
+        # Generate file paths with the run's hour (not the clock's, which may have moved on)
+        az_time = run_at or get_arizona_time()
+        financial_path = find_artifact_path("financial", "ALL", az_time.date(), az_time.hour,
+                                            os.path.join(financial_dir, f"{financial_filename}_H{az_time.hour:02d}.csv"))
+        ro_path = find_artifact_path("ro_combined", "ALL", az_time.date(), az_time.hour,
+                                     os.path.join(ro_dir, f"TekmetricGemba_RO_{ro_filename}_H{az_time.hour:02d}.csv"))
         
         print("📊 VERIFICATION REPORT")
         print("=" * 40)
         
-        # Initialize counters
-        financial_car_count = 0
-        ro_total_count = 0
-        ro_locations = set()
-        created_at_records = 0
-        
-        # Verify financial data - FIXED LOGIC (same as notifications.py)
-        print("Checking Financial Report...")
-        financial_rows = read_csv_safe(financial_path)
-        if financial_rows:
-            headers = financial_rows[0]
-            data_rows = financial_rows[1:]
-            
-            # Find the Car Count column index
-            car_count_col_idx = None
-            created_at_idx = None
-            
-            for i, header in enumerate(headers):
-                if 'Car Count' in str(header) or 'Car_Count' in str(header):
-                    car_count_col_idx = i
-                if 'Created_At' in str(header):
-                    created_at_idx = i
-            
-            if car_count_col_idx is not None:
-                # Look for TOTAL row (first row should be TOTAL)
-                for row in data_rows:
-                    if len(row) > car_count_col_idx:
-                        first_col = str(row[0]).strip()
-                        if first_col == 'TOTAL':
-                            try:
-                                financial_car_count = int(float(row[car_count_col_idx]))
-                                break
-                            except:
-                                continue
-            
-            # Check Created_At column
-            if created_at_idx is not None:
-                for row in data_rows:
-                    if len(row) > created_at_idx:
-                        if str(row[created_at_idx]).strip() == created_at_hour:
-                            created_at_records += 1
-            
+        recon = reconcile_reports(financial_path, ro_path, created_at_hour)
+        
+        if recon['financial_found']:
             print(f"  ✅ Financial file found and processed")
         else:
             print(f"  ❌ Financial file not found: {financial_path}")
         
-        # Verify RO data - FIXED LOGIC (same as notifications.py)
-        print("Checking RO Report...")
-        ro_rows = read_csv_safe(ro_path)
-        if ro_rows:
-            headers = ro_rows[0]
-            data_rows = ro_rows[1:]
-            
-            # Find the main RO Count column
-            ro_count_idx = None
-            location_idx = None
-            
-            for i, header in enumerate(headers):
-                header_str = str(header).strip()
-                # Look for exact "RO Count" column (not "New RO Count" or "Repeat RO Count")
-                if header_str == 'RO Count':
-                    ro_count_idx = i
-                    break
-            
-            for i, header in enumerate(headers):
-                header_str = str(header).strip()
-                if 'Location' in header_str:
-                    location_idx = i
-                    break
-            
-            if ro_count_idx is not None and location_idx is not None:
-                for row in data_rows:
-                    if len(row) > max(ro_count_idx, location_idx):
-                        try:
-                            ro_value = str(row[ro_count_idx]).strip()
-                            if ro_value and ro_value != '0' and ro_value != '':
-                                count = int(float(ro_value))
-                                ro_total_count += count
-                        except:
-                            continue
-                        
-                        # Track locations
-                        if row[location_idx] and str(row[location_idx]).strip():
-                            ro_locations.add(str(row[location_idx]).strip())
-            
+        if recon['ro_found']:
             print(f"  ✅ RO file found and processed")
         else:
             print(f"  ❌ RO file not found: {ro_path}")
@@ -374,35 +532,46 @@ def verify_data_accuracy(financial_filename, ro_filename, created_at_hour=None):
         # Print verification results
         print("\n📈 VERIFICATION RESULTS")
         print("-" * 40)
-        print(f"Financial Car Count: {financial_car_count}")
-        print(f"RO Total Count: {ro_total_count}")
-        print(f"RO Locations Found: {len(ro_locations)}/6")
+        print(f"Financial Car Count: {recon['financial_car_count']}")
+        print(f"RO Total Count: {recon['ro_total_count']}")
+        print(f"RO Locations Found: {len(recon['ro_locations'])}/{len(EXPECTED_LOCATIONS)}")
         print(f"Created_At Hour: {created_at_hour}")
-        print(f"Records with correct Created_At: {created_at_records}")
+        print(f"Records with correct Created_At: {recon['created_at_records']}")
         
-        # Location details
-        if ro_locations:
-            print(f"Locations: {', '.join(sorted(ro_locations))}")
+        print(f"\n{'Location':<18}{'Cars':>6}{'ROs':>6}{'Fin Sales':>13}{'RO Sales':>13}")
+        for name in sorted(recon['locations']):
+            entry = recon['locations'][name]
+            flag = "  ⚠️" if name in recon['mismatched_locations'] else ""
+            print(f"{name:<18}{entry['car_count']:>6}{entry['ro_count']:>6}"
+                  f"{entry['financial_sales']:>13,.2f}{entry['ro_sales']:>13,.2f}{flag}")
         
         # Determine success
         success = True
         warnings = []
         
-        if len(ro_locations) < 6:
-            warnings.append(f"Missing {6 - len(ro_locations)} locations")
+        if recon['missing_ro']:
+            warnings.append(f"Missing {len(recon['missing_ro'])} RO locations: {', '.join(recon['missing_ro'])}")
             success = False
         
-        if financial_car_count == 0:
+        if recon['financial_found'] and recon['missing_financial']:
+            warnings.append(f"Missing {len(recon['missing_financial'])} financial locations: "
+                            f"{', '.join(recon['missing_financial'])}")
+        
+        if recon['financial_car_count'] == 0:
             warnings.append("Financial car count is 0")
         
-        if ro_total_count == 0:
+        if recon['ro_total_count'] == 0:
             warnings.append("RO count is 0")
         
         # CRITICAL: Check if car count matches RO count
-        if financial_car_count != ro_total_count:
-            warnings.append(f"Data mismatch: Financial ({financial_car_count}) != RO ({ro_total_count})")
+        if not recon['totals_match']:
+            warnings.append(f"Data mismatch: Financial ({recon['financial_car_count']}) != RO ({recon['ro_total_count']})")
             success = False
         
+        for name in recon['mismatched_locations']:
+            entry = recon['locations'][name]
+            warnings.append(f"{name}: car count {entry['car_count']} != RO count {entry['ro_count']}")
+        
         if warnings:
             print("\n⚠️  WARNINGS:")
             for warning in warnings:
@@ -411,8 +580,12 @@ def verify_data_accuracy(financial_filename, ro_filename, created_at_hour=None):
             print("\n✅ All verifications passed!")
         
         print("=" * 40)
-        return success
+        
+        status = "ok" if success else "failed"
+        mark_stage("financial", "ALL", az_time.date(), az_time.hour, "verified", status)
+        mark_stage("ro_combined", "ALL", az_time.date(), az_time.hour, "verified", status)
+        return dict(recon, verified=success, warnings=warnings)
         
     except Exception as e:
         print(f"❌ Verification error: {e}")
-        return False
+        return None
@@ -1,23 +1,82 @@
+import os
+import csv
 import time
 import datetime
 import pytz
-from app import main
+from app import (main, warm_up, close_warm_session, get_date_info, build_run_result, send_run_notification,
+                 WARMUP_CONFIG)
+from sql import close_all_connections, start_queue_drainer
+from upload_queue import QUEUE_CONFIG
+from notification_queue import NOTIFY_CONFIG
+from notifications import start_notification_worker, flush_notifications, NOTIFY_WAKE
+from isolated_run import IsolatedRun, ISOLATION_CONFIG
 
-TARGET_MINUTE = 50  # Run at the top of each hour (XX:00)
+TARGET_MINUTE = 50  # Run at XX:50 every hour
+
+SCHEDULE_CONFIG = {
+    # Missed slots (overrun, suspend, clock jump): 'coalesce' runs once right away for
+    # all of them, 'skip' waits for the next slot
+    'catch_up': os.getenv('SCHEDULE_CATCH_UP', 'coalesce').lower(),
+    # A trigger this late still counts as on time
+    'on_time_seconds': int(os.getenv('SCHEDULE_ON_TIME_SECONDS', '120')),
+    # Coalesced catch-up only while the missed slot is this recent; later, wait for the next one
+    'catch_up_limit_minutes': int(os.getenv('SCHEDULE_CATCH_UP_LIMIT_MINUTES', '30')),
+    # Longest single sleep; the wall clock is re-read after each, so jumps are noticed
+    'max_sleep_seconds': int(os.getenv('SCHEDULE_MAX_SLEEP_SECONDS', '60')),
+    'trigger_log': os.getenv('SCHEDULE_TRIGGER_LOG', os.path.join(os.getcwd(), "Artifact Store", "scheduler_triggers.csv"))
+}
+
+TRIGGER_LOG_HEADERS = ['slot', 'triggered_at', 'lateness_seconds', 'action', 'missed_slots', 'duration_seconds', 'success']
 
 def get_arizona_time():
     """Get current Arizona time"""
     return datetime.datetime.now(pytz.timezone('US/Arizona'))
 
-def run_automation():
-    """Execute the automation and return success status"""
+def prepare_run():
+    """Warm-up for the next run: a run process warming itself up, or a warm session in this process"""
+    if ISOLATION_CONFIG['enabled']:
+        return IsolatedRun(warm_up=True).start()
+    return warm_up()
+
+def discard_run(warm):
+    """Throw away a prepared run whose slot was skipped"""
+    if isinstance(warm, IsolatedRun):
+        warm.cancel()
+    elif warm:
+        close_warm_session(warm)
+
+def run_isolated(runner, started_at):
+    """Run main() in a child process under the watchdog and report how it ended"""
+    runner = runner or IsolatedRun().start()
+    result = runner.trigger()
+    
+    leftovers = f", {result['leftovers_killed']} leftover processes killed" if result['leftovers_killed'] else ""
+    print(f"🧱 Run process {result['outcome']} in {result['seconds']:.1f}s, "
+          f"peak PSS {result['peak_pss_mb']:.0f} MB{leftovers}")
+    if result['outcome'] != 'completed':
+        print(f"❌ {result['error']}")
+        # The run never got as far as queueing its own notification; date it by the run's
+        # start, not the kill, which can be most of an hour (and a day boundary) later
+        send_run_notification(build_run_result(get_date_info(started_at), started_at, 'unknown', error=result['error']))
+    # The child only queues its notification; delivery is this process's worker's job
+    NOTIFY_WAKE.set()
+    return result['success']
+
+def run_automation(warm=None, triggered_at=None):
+    """Execute the automation and return success status.
+
+    warm is whatever prepare_run() returned for this slot (or None for a cold run).
+    """
     arizona_time = get_arizona_time()
     print(f"\n🚀 AUTOMATION STARTED")
     print(f"Time: {arizona_time.strftime('%Y-%m-%d %I:%M:%S %p')} AZ")
     print("=" * 60)
     
     try:
-        success = main()
+        if ISOLATION_CONFIG['enabled']:
+            success = run_isolated(warm, arizona_time)
+        else:
+            success = main(warm, triggered_at)
         
         finish_time = get_arizona_time()
         duration = finish_time - arizona_time
@@ -51,77 +110,159 @@ def calculate_next_run(current_time):
         next_run += datetime.timedelta(hours=1)
     return next_run
 
+def latest_slot(current_time):
+    """Most recent scheduled run time at or before current_time"""
+    return calculate_next_run(current_time) - datetime.timedelta(hours=1)
+
+def sleep_until(target):
+    """Sleep until the wall clock reaches target.
+
+    Sleeps in chunks of at most max_sleep_seconds and re-reads the clock after
+    each, so a clock step or a suspend/resume is noticed within one chunk; the
+    final chunk ends exactly on target.
+    """
+    while True:
+        remaining = (target - get_arizona_time()).total_seconds()
+        if remaining <= 0:
+            return
+        chunk = min(remaining, SCHEDULE_CONFIG['max_sleep_seconds'])
+        wall_before, mono_before = get_arizona_time(), time.monotonic()
+        time.sleep(chunk)
+        drift = (get_arizona_time() - wall_before).total_seconds() - (time.monotonic() - mono_before)
+        if abs(drift) > 5:
+            print(f"⚠️ Clock jumped {drift:+.0f}s while waiting for {target.strftime('%I:%M %p')}")
+
+def decide_trigger(due, current_time):
+    """(action, slot, missed_slots, lateness_seconds) for the slot due at `due` now that it has come.
+
+    action is 'on_time', 'catch_up' (one run standing in for every missed slot)
+    or 'skipped'.
+    """
+    slot = latest_slot(current_time)
+    missed = max(int((slot - due).total_seconds() // 3600), 0)
+    lateness = (current_time - slot).total_seconds()
+    if missed == 0 and lateness <= SCHEDULE_CONFIG['on_time_seconds']:
+        return 'on_time', slot, missed, lateness
+    if (SCHEDULE_CONFIG['catch_up'] == 'coalesce' and
+            lateness <= SCHEDULE_CONFIG['catch_up_limit_minutes'] * 60):
+        return 'catch_up', slot, missed, lateness
+    return 'skipped', slot, missed, lateness
+
+def record_trigger(slot, triggered_at, lateness, action, missed, duration=None, success=None):
+    """Append one trigger to the lateness log"""
+    try:
+        path = SCHEDULE_CONFIG['trigger_log']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(TRIGGER_LOG_HEADERS)
+            writer.writerow([slot.strftime('%Y-%m-%d %H:%M'), triggered_at.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+                             f"{lateness:.3f}", action, missed,
+                             '' if duration is None else f"{duration:.1f}", '' if success is None else int(success)])
+    except Exception as e:
+        print(f"⚠️ Could not record trigger: {e}")
+
+def load_triggers(limit=None):
+    try:
+        with open(SCHEDULE_CONFIG['trigger_log'], 'r', newline='', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        return rows[-limit:] if limit else rows
+    except FileNotFoundError:
+        return []
+
 def main_scheduler():
-    """Main scheduler loop - runs automation every hour at :00"""
+    """Main scheduler loop: sleep until each XX:50 slot, run, repeat.
+
+    Runs happen on this thread one after another, so they never overlap; a
+    slot that passes during a run (or a suspend or clock jump) is handled by
+    the catch-up policy instead of being silently dropped.
+    """
     print("\n" + "="*60)
     print("🕐 TEKMETRIC HOURLY AUTOMATION SCHEDULER")
     print("="*60)
     print(f"Schedule: Every hour at :{TARGET_MINUTE:02d} Arizona Time")
+    print(f"Missed slots: {SCHEDULE_CONFIG['catch_up']} "
+          f"(catch up within {SCHEDULE_CONFIG['catch_up_limit_minutes']} minutes)")
+    if WARMUP_CONFIG['minutes'] > 0:
+        print(f"Warm-up: {WARMUP_CONFIG['minutes']} minutes before each run")
+    if ISOLATION_CONFIG['enabled']:
+        print(f"Runs: isolated process, killed after {ISOLATION_CONFIG['timeout_minutes']:g} minutes "
+              f"or {ISOLATION_CONFIG['max_pss_mb']} MB PSS")
     
     current_time = get_arizona_time()
-    next_run = calculate_next_run(current_time)
+    next_due = calculate_next_run(current_time)
     
     print(f"Current time: {current_time.strftime('%Y-%m-%d %I:%M:%S %p')} AZ")
-    print(f"Next run: {next_run.strftime('%Y-%m-%d %I:%M:%S %p')} AZ")
+    print(f"Next run: {next_due.strftime('%Y-%m-%d %I:%M:%S %p')} AZ")
     print("="*60)
-    print("Monitoring... (Press Ctrl+C to stop)")
     
-    last_run_hour = None
-    last_run_date = None
+    if QUEUE_CONFIG['enabled']:
+        # Replays queued uploads between runs as soon as SQL is reachable again
+        start_queue_drainer()
+        print(f"Upload queue drainer: every {QUEUE_CONFIG['drain_interval_seconds']}s while a backlog exists")
+    
+    if NOTIFY_CONFIG['enabled']:
+        # Delivers queued notifications (and any left over from a previous process)
+        start_notification_worker()
+        print(f"Notification digests: repeats held for {NOTIFY_CONFIG['digest_window_minutes']} minutes")
+    
+    print("Monitoring... (Press Ctrl+C to stop)")
     
+    warm = None
     while True:
         try:
             current_time = get_arizona_time()
-            current_date = current_time.date()
-            current_hour = current_time.hour
+            if next_due > current_time:
+                minutes_until = int((next_due - current_time).total_seconds() / 60)
+                print(f"⏳ Waiting for next run: {next_due.strftime('%I:%M %p')} ({minutes_until} minutes)")
+                warmup_at = next_due - datetime.timedelta(minutes=WARMUP_CONFIG['minutes'])
+                if WARMUP_CONFIG['minutes'] > 0 and warmup_at > current_time:
+                    sleep_until(warmup_at)
+                    warm = prepare_run()
+                sleep_until(next_due)
             
-            # Check if it's time to run
-            should_run = (
-                current_time.minute == TARGET_MINUTE and 
-                current_time.second < 30 and  # Run only in first 30 seconds of the minute
-                (last_run_hour != current_hour or last_run_date != current_date)
-            )
+            triggered_at = time.perf_counter()
+            current_time = get_arizona_time()
+            action, slot, missed, lateness = decide_trigger(next_due, current_time)
+            next_due = slot + datetime.timedelta(hours=1)
+            
+            if action == 'skipped':
+                print(f"⏭️  Skipping {slot.strftime('%I:%M %p')} run: {lateness / 60:.0f} minutes late "
+                      f"({missed + 1} slots missed, catch-up policy {SCHEDULE_CONFIG['catch_up']})")
+                discard_run(warm)
+                warm = None
+                record_trigger(slot, current_time, lateness, action, missed)
+                continue
             
-            if should_run:
-                print(f"\n⏰ Scheduled run triggered at {current_time.strftime('%I:%M:%S %p')}")
-                
-                success = run_automation()
-                last_run_hour = current_hour
-                last_run_date = current_date
-                
-                # Calculate next run
-                next_run = calculate_next_run(current_time)
-                
-                if success:
-                    print(f"✅ Next scheduled run: {next_run.strftime('%I:%M %p')}")
-                else:
-                    print(f"⚠️  Automation had errors. Next retry: {next_run.strftime('%I:%M %p')}")
+            if action == 'catch_up':
+                print(f"\n⏰ Catch-up run for {slot.strftime('%I:%M %p')} at {current_time.strftime('%I:%M:%S %p')} "
+                      f"({lateness:.0f}s late, {missed} earlier slots coalesced)")
+            else:
+                print(f"\n⏰ Scheduled run triggered at {current_time.strftime('%I:%M:%S %p')} ({lateness:.3f}s late)")
             
-            # Status update every 10 minutes (but not during run minute)
-            elif (current_time.minute % 10 == 0 and 
-                  current_time.minute != TARGET_MINUTE and 
-                  current_time.second < 30):
-                
-                next_run = calculate_next_run(current_time)
-                
-                if last_run_hour == current_hour and last_run_date == current_date:
-                    print(f"✅ Completed this hour. Next run: {next_run.strftime('%I:%M %p')} "
-                          f"({current_time.strftime('%I:%M %p')} now)")
-                else:
-                    minutes_until = int((next_run - current_time).total_seconds() / 60)
-                    print(f"⏳ Waiting for next run: {next_run.strftime('%I:%M %p')} "
-                          f"({minutes_until} minutes)")
+            success = run_automation(warm, triggered_at)
+            warm = None
+            record_trigger(slot, current_time, lateness, action, missed, time.perf_counter() - triggered_at, success)
             
-            # Check every 30 seconds
-            time.sleep(30)
+            if success:
+                print(f"✅ Next scheduled run: {next_due.strftime('%I:%M %p')}")
+            else:
+                print(f"⚠️  Automation had errors. Next retry: {next_due.strftime('%I:%M %p')}")
             
         except KeyboardInterrupt:
             print(f"\n\n🛑 Scheduler stopped by user at {get_arizona_time().strftime('%I:%M:%S %p')} AZ")
+            discard_run(warm)
+            flush_notifications(timeout=15)
+            close_all_connections()
             break
         except Exception as e:
+            # The slot stays due; the next pass runs or skips it by the catch-up policy
             print(f"\n❌ Scheduler error: {e}")
-            print("Continuing in 60 seconds...")
-            time.sleep(60)
+            discard_run(warm)
+            warm = None
+            time.sleep(5)
 
 def test_immediate_run():
     """Test function to run automation immediately"""
@@ -131,6 +272,7 @@ def test_immediate_run():
     print("Running automation immediately for testing...")
     
     success = run_automation()
+    flush_notifications()
     
     if success:
         print("\n✅ Test completed successfully!")
@@ -156,6 +298,16 @@ def show_status():
     
     print(f"Time until next run: {int(hours)}h {int(minutes)}m")
     print(f"Schedule: Every hour at :{TARGET_MINUTE:02d}")
+    
+    triggers = load_triggers(limit=24)
+    if triggers:
+        late = sorted(float(row['lateness_seconds']) for row in triggers if row['action'] != 'skipped')
+        counts = {action: sum(1 for row in triggers if row['action'] == action)
+                  for action in ('on_time', 'catch_up', 'skipped')}
+        print(f"Last {len(triggers)} triggers: {counts['on_time']} on time, {counts['catch_up']} caught up, "
+              f"{counts['skipped']} skipped")
+        if late:
+            print(f"Lateness: median {late[len(late) // 2]:.3f}s, max {late[-1]:.3f}s")
     print("=" * 40)
 
 if __name__ == "__main__":
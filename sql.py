@@ -1,8 +1,21 @@
 import csv
 import os
+import json
+import hashlib
+import decimal
 import datetime
+import time
+import random
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import pytz
 
+from artifact_manifest import find_artifact_path, mark_stage
+from db_backends import get_backend
+from reports import normalize_location_name
+import upload_queue
+
 SQL_CONFIG = {
     'server': os.getenv('SQL_SERVER', 'gembadb.database.windows.net'),
     'database': os.getenv('SQL_DATABASE', 'gemba'),
@@ -11,6 +24,109 @@ SQL_CONFIG = {
     'port': int(os.getenv('SQL_PORT', '1433'))
 }
 
+UPLOAD_CONFIG = {
+    # 'merge' stages the batch and applies one MERGE; 'row' is the legacy per-row path
+    'mode': os.getenv('SQL_UPLOAD_MODE', 'merge').lower(),
+    # Financial and RO uploads touch different tables, so they run side by side
+    'parallel': os.getenv('SQL_PARALLEL_UPLOADS', '1') == '1'
+}
+
+# SQL Server in production; DB_BACKEND=sqlite runs everything against a local file
+BACKEND = get_backend(SQL_CONFIG)
+
+POOL_CONFIG = {
+    'max_idle': int(os.getenv('SQL_POOL_MAX_IDLE', '4')),
+    # Slightly over an hour so the scheduler's next run reuses the warm connection
+    'max_idle_seconds': int(os.getenv('SQL_POOL_MAX_IDLE_SECONDS', '3900'))
+}
+
+MONEY = "DECIMAL(18,2)"
+PERCENT = "DECIMAL(9,4)"
+
+# Explicit column -> SQL type per typed table (sanitized column names); any column not
+# listed, in any table, stays NVARCHAR(255). The rollup and history tables are added
+# below from their source columns.
+COLUMN_TYPES = {
+    'custom_financials_2': {
+        'Report_Date': "DATE", 'Car_Count': "INT", 'Hours_Presented': MONEY, 'Hours_Sold': MONEY,
+        'AWRO': MONEY, 'Close_Ratio': PERCENT, 'Effective_Labor_Rate': MONEY, 'ARO_Sales': MONEY,
+        'ARO_Profit': MONEY, 'ARO_Profit_Margin': PERCENT, 'Gross_Sales_Hr': MONEY, 'Gross_Profit_Hr': MONEY,
+        'Total_Written_Sales': MONEY, 'Net_Sales': MONEY, 'Total_Fees': MONEY, 'Total_Discounts': MONEY,
+        'Total_Cost': MONEY, 'Total_GP_Dollar': MONEY, 'Total_GP_Percent': PERCENT
+    },
+    'ro_marketing_2': {
+        'Report_Date': "DATE", 'Total_Sales': MONEY, 'RO_Count': "INT", 'New_Sales': MONEY,
+        'New_RO_Count': "INT", 'Repeat_Sales': MONEY, 'Repeat_RO_Count': "INT", 'Average_RO': MONEY,
+        'GP_Dollar': MONEY, 'GP_Percent': PERCENT, 'Close_Ratio': PERCENT
+    }
+}
+
+# Natural keys the upserts match on; each gets a unique index
+TABLE_KEYS = {
+    'custom_financials_2': ['Location', 'Report_Date'],
+    'ro_marketing_2': ['Marketing_Source', 'Location', 'Report_Date'],
+    'daily_location_rollup': ['Report_Date', 'Location'],
+    # Report_Date leads so the table can later move onto a partition scheme by date
+    'hourly_location_history': ['Report_Date', 'Snapshot_Hour', 'Location']
+}
+
+# One typed row per (Report_Date, Location) for dashboards: rollup column -> source column.
+# Each source table owns its own rollup columns, so either upload can refresh its half.
+ROLLUP_TABLE = 'daily_location_rollup'
+ROLLUP_SOURCES = {
+    'custom_financials_2': {'Car_Count': 'Car_Count', 'Sales': 'Total_Written_Sales',
+                            'GP_Dollar': 'Total_GP_Dollar'},
+    'ro_marketing_2': {'RO_Count': 'RO_Count', 'RO_Sales': 'Total_Sales', 'RO_GP_Dollar': 'GP_Dollar',
+                       'New_RO_Count': 'New_RO_Count', 'New_Sales': 'New_Sales',
+                       'Repeat_RO_Count': 'Repeat_RO_Count', 'Repeat_Sales': 'Repeat_Sales'}
+}
+
+# The two table uploads run in parallel and both write rollup rows with the same keys
+ROLLUP_LOCK = threading.Lock()
+
+# Per-hour snapshots of the rollup columns, one row per (date, hour, location); earlier hours are never rewritten
+HISTORY_TABLE = 'hourly_location_history'
+
+COLUMN_TYPES[ROLLUP_TABLE] = {'Report_Date': "DATE"}
+for source_table, rollup_columns in ROLLUP_SOURCES.items():
+    COLUMN_TYPES[ROLLUP_TABLE].update((target, COLUMN_TYPES[source_table][source])
+                                      for target, source in rollup_columns.items())
+COLUMN_TYPES[HISTORY_TABLE] = dict(COLUMN_TYPES[ROLLUP_TABLE], Snapshot_Hour="INT")
+
+# One drain at a time per process; across processes (the isolated run's drain and the
+# scheduler's drainer) each drain only uploads entries it claimed in the queue itself
+QUEUE_DRAIN_LOCK = threading.Lock()
+QUEUE_DRAIN_STATS_LOCK = threading.Lock()
+
+RETRY_CONFIG = {
+    # Rows per independently committed MERGE batch; a retry resumes at the failed batch
+    'batch_rows': int(os.getenv('SQL_UPLOAD_BATCH_ROWS', '2000')),
+    'max_retries': int(os.getenv('SQL_RETRY_ATTEMPTS', '5')),
+    'base_delay': float(os.getenv('SQL_RETRY_BASE_SECONDS', '1')),
+    'max_delay': float(os.getenv('SQL_RETRY_MAX_SECONDS', '30'))
+}
+
+MIGRATION_CONFIG = {
+    'batch_size': int(os.getenv('SQL_MIGRATION_BATCH_SIZE', '5000'))
+}
+
+SCHEMA_CACHE_CONFIG = {
+    'path': os.getenv('SQL_SCHEMA_CACHE', os.path.join(os.getcwd(), "Artifact Store", "schema_cache.json"))
+}
+
+# {table: {'columns': [...], 'types': {...}, 'signatures': [...], 'indexed': bool}}, loaded from disk on first use
+SCHEMA_CACHE = None
+SCHEMA_CACHE_LOCK = threading.Lock()
+# Tables whose indexes this process has already tried to create (a failure is retried on the next start)
+INDEX_ATTEMPTED = set()
+
+# Per-table round trips and timings for the current run, printed by upload_all_reports
+UPLOAD_STATS = {}
+
+# Compiled UploadPlans by (table, header signature, schema), reused across hourly runs
+UPLOAD_PLANS = {}
+UPLOAD_PLANS_LOCK = threading.Lock()
+
 def get_arizona_time():
     return datetime.datetime.now(pytz.timezone('US/Arizona'))
 
@@ -23,22 +139,95 @@ def format_date(dt):
 def format_date_short(dt):
     return f"{dt.month:02d}.{dt.day:02d}.{dt.year-2000:02d}"
 
-def create_connection():
-    try:
-        import pymssql
-        
-        conn = pymssql.connect(
-            server=SQL_CONFIG['server'],
-            user=SQL_CONFIG['username'],
-            password=SQL_CONFIG['password'],
-            database=SQL_CONFIG['database'],
-            port=SQL_CONFIG['port'],
-            timeout=30
-        )
-        
-        print(f"Connected to SQL Server: {SQL_CONFIG['server']}")
+def open_connection():
+    """Open a new connection on the configured backend, raising on failure"""
+    return BACKEND.connect()
+
+class ConnectionPool:
+    """Thread-safe pool of idle connections, pinged before reuse and reopened when dead"""
+    def __init__(self, connect, max_idle, max_idle_seconds):
+        self.connect = connect
+        self.max_idle = max_idle
+        self.max_idle_seconds = max_idle_seconds
+        self.idle = []
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+    
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'opened': 0, 'reused': 0, 'reconnects': 0, 'connect_seconds': 0.0}
+    
+    def ping(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception:
+            return False
+    
+    def discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def acquire(self):
+        """Return a healthy connection, reusing an idle one when possible"""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                conn, last_used = self.idle.pop()
+            
+            if time.monotonic() - last_used > self.max_idle_seconds or not self.ping(conn):
+                self.discard(conn)
+                with self.lock:
+                    self.stats['reconnects'] += 1
+                continue
+            
+            with self.lock:
+                self.stats['reused'] += 1
+            return conn
+        
+        started = time.perf_counter()
+        conn = self.connect()
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.stats['opened'] += 1
+            self.stats['connect_seconds'] += elapsed
+        print(f"Connected to {BACKEND.describe()} ({elapsed:.2f}s)")
         return conn
+    
+    def release(self, conn):
+        """Hand a connection back; anything left uncommitted is rolled back first"""
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            self.discard(conn)
+            return
         
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append((conn, time.monotonic()))
+                return
+        self.discard(conn)
+    
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            self.discard(conn)
+
+SQL_POOL = ConnectionPool(open_connection, POOL_CONFIG['max_idle'], POOL_CONFIG['max_idle_seconds'])
+
+def create_connection():
+    """Check out a pooled connection; pair every call with release_connection()"""
+    try:
+        return SQL_POOL.acquire()
     except ImportError:
         print("pymssql not installed")
         return None
@@ -46,6 +235,19 @@ def create_connection():
         print(f"SQL connection failed: {e}")
         return None
 
+def release_connection(conn):
+    SQL_POOL.release(conn)
+
+def get_connection_stats():
+    with SQL_POOL.lock:
+        return dict(SQL_POOL.stats, idle=len(SQL_POOL.idle))
+
+def reset_connection_stats():
+    SQL_POOL.reset_stats()
+
+def close_all_connections():
+    SQL_POOL.close_all()
+
 def read_csv_data(filepath):
     try:
         if not os.path.exists(filepath) or os.path.getsize(filepath) == 0:
@@ -106,12 +308,38 @@ def sanitize_headers(headers):
 
 def table_exists(conn, table_name):
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = %s", (table_name,))
-        return cursor.fetchone()[0] > 0
+        return BACKEND.table_exists(conn.cursor(), table_name)
     except:
         return False
 
+def column_sql_type(table_name, column):
+    """SQL type for a sanitized column name from COLUMN_TYPES; anything unmapped is NVARCHAR(255)"""
+    return COLUMN_TYPES.get(table_name, {}).get(column, "NVARCHAR(255)")
+
+def clean_numeric_text(value):
+    return str(value).strip().replace('$', '').replace(',', '').replace('%', '')
+
+def coerce_value(value, data_type):
+    """Convert a CSV cell into a parameter matching the column's INFORMATION_SCHEMA data type.
+
+    Blank cells become NULL; a non-blank value that doesn't parse raises ValueError.
+    """
+    if data_type in (None, 'nvarchar', 'varchar', 'nchar', 'char'):
+        return value
+    text = clean_numeric_text(value)
+    if not text:
+        return None
+    try:
+        if data_type == 'date':
+            return datetime.datetime.strptime(str(value).strip(), "%m/%d/%Y").date()
+        if data_type in ('int', 'bigint', 'smallint'):
+            return int(decimal.Decimal(text).to_integral_value(rounding=decimal.ROUND_HALF_UP))
+        if data_type in ('decimal', 'numeric', 'float', 'real', 'money'):
+            return decimal.Decimal(text)
+    except (ValueError, decimal.InvalidOperation):
+        raise ValueError(f"{value!r} is not a valid {data_type}")
+    return value
+
 def create_table(conn, table_name, headers):
     try:
         if table_exists(conn, table_name):
@@ -119,7 +347,7 @@ def create_table(conn, table_name, headers):
             return True
         
         cursor = conn.cursor()
-        columns = [f"[{h}] NVARCHAR(255)" for h in headers]
+        columns = [f"[{h}] {column_sql_type(table_name, h)}" for h in headers]
         query = f"CREATE TABLE [{table_name}] ({', '.join(columns)})"
         
         cursor.execute(query)
@@ -133,33 +361,48 @@ def create_table(conn, table_name, headers):
 
 def get_table_columns(conn, table_name):
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = %s", (table_name,))
-        columns = [row[0] for row in cursor.fetchall()]
-        return columns
+        return list(BACKEND.column_types(conn.cursor(), table_name))
     except:
         return []
 
-def add_missing_columns(conn, table_name, headers):
-    """Fixed version that handles column name conflicts properly"""
+def get_table_column_types(conn, table_name):
+    """Ordered {column: data_type} for a table, e.g. {'Report_Date': 'date'}"""
+    try:
+        return BACKEND.column_types(conn.cursor(), table_name)
+    except:
+        return {}
+
+def add_missing_columns(conn, table_name, headers, existing_columns=None):
+    """Add every missing column in one ALTER TABLE, one at a time only if that fails"""
     try:
-        existing_columns = get_table_columns(conn, table_name)
+        if existing_columns is None:
+            existing_columns = get_table_columns(conn, table_name)
+        missing = [h for h in dict.fromkeys(headers) if h not in existing_columns]
+        if not missing:
+            return True
+        
         cursor = conn.cursor()
+        try:
+            BACKEND.add_columns(cursor, table_name, [f"[{h}] {column_sql_type(table_name, h)}" for h in missing])
+            conn.commit()
+            print(f"Successfully added {len(missing)} new columns to {table_name}: {', '.join(missing)}")
+            return True
+        except Exception as e:
+            print(f"⚠️ Batched ALTER TABLE failed ({e}), adding columns individually")
+            conn.rollback()
         
         added_count = 0
-        for header in headers:
-            if header not in existing_columns:
-                try:
-                    alter_query = f"ALTER TABLE [{table_name}] ADD [{header}] NVARCHAR(255)"
-                    cursor.execute(alter_query)
-                    added_count += 1
-                    print(f"Added column [{header}] to table {table_name}")
-                except Exception as e:
-                    # Skip columns that cause conflicts
-                    if "duplicate" in str(e).lower() or "unique" in str(e).lower():
-                        print(f"Skipped duplicate column [{header}]")
-                    else:
-                        print(f"Could not add column [{header}]: {e}")
+        for header in missing:
+            try:
+                BACKEND.add_columns(cursor, table_name, [f"[{header}] {column_sql_type(table_name, header)}"])
+                added_count += 1
+                print(f"Added column [{header}] to table {table_name}")
+            except Exception as e:
+                # Skip columns that cause conflicts
+                if "duplicate" in str(e).lower() or "unique" in str(e).lower():
+                    print(f"Skipped duplicate column [{header}]")
+                else:
+                    print(f"Could not add column [{header}]: {e}")
         
         conn.commit()
         
@@ -171,87 +414,480 @@ def add_missing_columns(conn, table_name, headers):
         print(f"Error adding columns: {e}")
         return False
 
-def upsert_data_with_created_at(conn, table_name, headers, data, key_columns):
-    """Fixed version that handles column conflicts properly"""
+def header_signature(headers):
+    return hashlib.sha1('\x1f'.join(headers).encode('utf-8')).hexdigest()[:16]
+
+def load_schema_cache():
+    global SCHEMA_CACHE
+    if SCHEMA_CACHE is None:
+        try:
+            with open(SCHEMA_CACHE_CONFIG['path'], 'r', encoding='utf-8') as file:
+                SCHEMA_CACHE = json.load(file)
+        except Exception:
+            SCHEMA_CACHE = {}
+    return SCHEMA_CACHE
+
+def save_schema_cache():
     try:
-        if not add_missing_columns(conn, table_name, headers):
+        path = SCHEMA_CACHE_CONFIG['path']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump(SCHEMA_CACHE, file, indent=1, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+    except Exception as e:
+        print(f"⚠️ Could not persist schema cache: {e}")
+
+def invalidate_schema_cache(table_name=None):
+    """Forget cached columns for one table (or all) so the next upload re-reads the schema"""
+    with SCHEMA_CACHE_LOCK:
+        cache = load_schema_cache()
+        if table_name is None:
+            cache.clear()
+            INDEX_ATTEMPTED.clear()
+        else:
+            cache.pop(table_name, None)
+            INDEX_ATTEMPTED.discard(table_name)
+        save_schema_cache()
+
+def ensure_table_schema(conn, table_name, headers):
+    """Columns of table_name, creating/extending it as needed.
+
+    A header signature seen before is served from the local cache with zero
+    metadata queries; a new signature re-reads INFORMATION_SCHEMA once.
+    Index state is cached separately: indexes that could not be created are
+    retried once per process (and after --migrate-types), not on every upload.
+    """
+    signature = header_signature(headers)
+    with SCHEMA_CACHE_LOCK:
+        cached = load_schema_cache().get(table_name)
+        hit = cached and 'types' in cached and signature in cached['signatures']
+        retry_indexes = (hit and table_name in TABLE_KEYS and not cached.get('indexed') and
+                         table_name not in INDEX_ATTEMPTED)
+        if hit and not retry_indexes:
+            return cached['columns']
+        INDEX_ATTEMPTED.add(table_name)
+    
+    if retry_indexes:
+        indexed = ensure_indexes(conn, table_name, TABLE_KEYS[table_name], cached['types'])
+        with SCHEMA_CACHE_LOCK:
+            cached['indexed'] = indexed
+            save_schema_cache()
+        return cached['columns']
+    
+    print(f"Schema cache miss for {table_name}, checking table metadata")
+    if not create_table(conn, table_name, headers):
+        return None
+    
+    column_types = get_table_column_types(conn, table_name)
+    missing = [h for h in dict.fromkeys(headers) if h not in column_types]
+    if missing:
+        if not add_missing_columns(conn, table_name, headers, list(column_types)):
             print("Warning: Could not add all missing columns")
+        column_types = get_table_column_types(conn, table_name)
+    existing_columns = list(column_types)
+    indexed = table_name in TABLE_KEYS and ensure_indexes(conn, table_name, TABLE_KEYS[table_name], column_types)
+    
+    with SCHEMA_CACHE_LOCK:
+        cache = load_schema_cache()
+        entry = cache.get(table_name)
+        if not entry or entry.get('types') != column_types:
+            entry = {'columns': existing_columns, 'types': column_types, 'signatures': []}
+        entry['signatures'] = (entry['signatures'] + [signature])[-20:]
+        entry['indexed'] = indexed
+        cache[table_name] = entry
+        save_schema_cache()
+    
+    return existing_columns
+
+def index_names(table_name):
+    return {'natural_key': f"UX_{table_name}_natural_key",
+            'natural_key_fallback': f"IX_{table_name}_natural_key",
+            'report_date': f"IX_{table_name}_report_date_created_at"}
+
+def index_exists(cursor, table_name, index_name):
+    return BACKEND.index_exists(cursor, table_name, index_name)
+
+def ensure_indexes(conn, table_name, key_columns, column_types):
+    """Unique index on the natural key plus (Report_Date, Created_At) for the summary queries.
+
+    Text key columns are normalized from NULL to '' first, so lookups can use
+    plain equality instead of ISNULL() wrappers and still seek.
+    """
+    names = index_names(table_name)
+    cursor = conn.cursor()
+    try:
+        if not all(k in column_types for k in key_columns):
+            return False
         
-        existing_columns = get_table_columns(conn, table_name)
-        valid_headers = [h for h in headers if h in existing_columns]
+        if not (index_exists(cursor, table_name, names['natural_key']) or
+                index_exists(cursor, table_name, names['natural_key_fallback'])):
+            for key in key_columns:
+                if column_types[key] == 'nvarchar':
+                    cursor.execute(f"UPDATE [{table_name}] SET [{key}] = '' WHERE [{key}] IS NULL")
+            conn.commit()
+            
+            key_list = ', '.join(f"[{k}]" for k in key_columns)
+            try:
+                cursor.execute(f"CREATE UNIQUE INDEX [{names['natural_key']}] ON [{table_name}] ({key_list})")
+                conn.commit()
+                print(f"Created unique index {names['natural_key']} ({key_list})")
+            except Exception as e:
+                # Historical duplicates block uniqueness; a plain index still lets lookups seek
+                conn.rollback()
+                print(f"⚠️ Duplicate keys in {table_name}, creating non-unique key index instead: {e}")
+                cursor.execute(f"CREATE INDEX [{names['natural_key_fallback']}] ON [{table_name}] ({key_list})")
+                conn.commit()
         
-        if not valid_headers:
-            print(f"No valid columns found for table {table_name}")
-            return False
+        if 'Created_At' in column_types and not index_exists(cursor, table_name, names['report_date']):
+            cursor.execute(f"CREATE INDEX [{names['report_date']}] ON [{table_name}] ([Report_Date], [Created_At])")
+            conn.commit()
+            print(f"Created index {names['report_date']}")
         
-        # Remove duplicates from valid_headers while preserving order
-        seen = set()
-        unique_valid_headers = []
-        for h in valid_headers:
-            if h not in seen:
-                seen.add(h)
-                unique_valid_headers.append(h)
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not ensure indexes on {table_name}: {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return False
+
+def drop_managed_indexes(conn, table_name):
+    cursor = conn.cursor()
+    for index_name in index_names(table_name).values():
+        if index_exists(cursor, table_name, index_name):
+            BACKEND.drop_index(cursor, table_name, index_name)
+    conn.commit()
+
+def get_cached_column_types(table_name):
+    with SCHEMA_CACHE_LOCK:
+        return dict((load_schema_cache().get(table_name) or {}).get('types') or {})
+
+def report_date_param(table_name, dt):
+    """Report_Date filter value: a date for migrated DATE columns, 'MM/DD/YYYY' otherwise"""
+    if get_cached_column_types(table_name).get('Report_Date') == 'date':
+        return dt.date() if isinstance(dt, datetime.datetime) else dt
+    return dt.strftime("%m/%d/%Y")
+
+class CountingCursor:
+    """Cursor wrapper that counts statements sent to the server"""
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.round_trips = 0
+    
+    def execute(self, query, params=None):
+        self.round_trips += 1
+        if params is None:
+            return self.cursor.execute(query)
+        return self.cursor.execute(query, params)
+    
+    def fetchone(self):
+        return self.cursor.fetchone()
+    
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+def record_upload_stats(table_name, mode, rows, round_trips, started, retry_stats=None):
+    elapsed = time.perf_counter() - started
+    retry_stats = retry_stats or {}
+    UPLOAD_STATS[table_name] = {
+        'mode': mode,
+        'rows': rows,
+        'round_trips': round_trips,
+        'seconds': round(elapsed, 3),
+        'batches': retry_stats.get('batches', 1),
+        'retries': retry_stats.get('retries', 0),
+        'backoff_seconds': round(retry_stats.get('backoff_seconds', 0.0), 3)
+    }
+    print(f"📊 {table_name}: {rows} rows via {mode} in {elapsed:.2f}s, {round_trips} round trips"
+          + (f", {retry_stats['retries']} retries ({retry_stats['backoff_seconds']:.1f}s backoff)"
+             if retry_stats.get('retries') else ""))
+
+def reset_upload_stats():
+    UPLOAD_STATS.clear()
+
+def get_upload_stats():
+    """Per-table rows, round trips, batches, retries and backoff for the current run"""
+    return {table: dict(stats) for table, stats in UPLOAD_STATS.items()}
+
+def backoff_delay(attempt):
+    """Exponential backoff capped at max_delay, with jitter so parallel uploads don't retry in lockstep"""
+    ceiling = min(RETRY_CONFIG['max_delay'], RETRY_CONFIG['base_delay'] * (2 ** attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
+class RetryingUpload:
+    """Runs each batch of one table upload in its own transaction, retrying transient errors.
+
+    Batches that already committed are never re-sent; a failed batch is rolled
+    back and retried alone. If the connection itself died it is swapped for a
+    fresh pooled one, which this object releases in close().
+    """
+    def __init__(self, conn, table_name):
+        self.conn = conn
+        self.table_name = table_name
+        self.replacement = None
+        self.stats = {'batches': 0, 'retries': 0, 'backoff_seconds': 0.0}
+    
+    def run(self, label, operation):
+        attempt = 0
+        while True:
+            try:
+                if self.conn is None:
+                    self.conn = self.replacement = SQL_POOL.acquire()
+                result = operation(self.conn)
+                self.conn.commit()
+                self.stats['batches'] += 1
+                return result
+            except Exception as e:
+                self.recover()
+                if not BACKEND.is_transient(e) or attempt >= RETRY_CONFIG['max_retries']:
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                self.stats['retries'] += 1
+                self.stats['backoff_seconds'] += delay
+                print(f"⏳ {self.table_name} {label}: transient error ({e}), "
+                      f"retry {attempt}/{RETRY_CONFIG['max_retries']} in {delay:.1f}s")
+                time.sleep(delay)
+    
+    def recover(self):
+        """Roll back the failed batch; drop the connection if it no longer answers"""
+        if self.conn is None:
+            return
+        try:
+            self.conn.rollback()
+            if SQL_POOL.ping(self.conn):
+                return
+        except Exception:
+            pass
+        if self.conn is self.replacement:
+            SQL_POOL.discard(self.conn)
+            self.replacement = None
+        self.conn = None
+    
+    def close(self):
+        release_connection(self.replacement)
+        self.replacement = None
+
+def value_converter(data_type):
+    """Per-column coercion function, or None when the CSV text is passed through as-is"""
+    if data_type in (None, 'nvarchar', 'varchar', 'nchar', 'char'):
+        return None
+    convert = functools.partial(coerce_value, data_type=data_type)
+    if data_type == 'date':
+        # Every row of a snapshot carries the same Report_Date; parse it once
+        return functools.lru_cache(maxsize=64)(convert)
+    return convert
+
+class UploadPlan:
+    """Everything about upserting one header layout into one table that doesn't depend on row values.
+
+    Column positions, key positions, converters and SQL text are worked out
+    once, so the per-row work is only gathering parameter tuples.
+    """
+    def __init__(self, table_name, headers, existing_columns, key_columns, column_types):
+        existing = set(existing_columns)
+        self.table_name = table_name
+        self.width = len(headers)
+        self.valid_headers = list(dict.fromkeys(h for h in headers if h in existing))
+        self.indexes = [headers.index(h) for h in self.valid_headers]
+        self.converters = [value_converter(column_types.get(h)) for h in self.valid_headers]
+        self.data_types = [column_types.get(h) for h in self.valid_headers]
+        self.keys = [k for k in key_columns if k in self.valid_headers]
+        self.key_positions = [self.valid_headers.index(k) for k in self.keys]
+        self.update_positions = [i for i, h in enumerate(self.valid_headers) if h not in self.keys]
         
-        valid_headers = unique_valid_headers
-        print(f"Using {len(valid_headers)} valid unique columns for {table_name}")
+        where_clause = ' AND '.join(f"[{k}] = %s" for k in self.keys)
+        self.check_sql = f"SELECT COUNT(*) FROM [{table_name}] WHERE {where_clause}" if self.keys else None
+        self.update_sql = None
+        if self.keys and self.update_positions:
+            set_clause = ', '.join(f"[{self.valid_headers[i]}] = %s" for i in self.update_positions)
+            self.update_sql = f"UPDATE [{table_name}] SET {set_clause} WHERE {where_clause}"
+        self.insert_sql = (f"INSERT INTO [{table_name}] ({', '.join(f'[{h}]' for h in self.valid_headers)}) "
+                           f"VALUES ({', '.join(['%s'] * len(self.valid_headers))})")
+    
+    def project(self, row, problems=None):
+        """Pad a CSV row, pick the table's columns and coerce them, as one parameter tuple.
+
+        A value that doesn't parse is recorded in problems ({column: [count, example]});
+        it is stored as NULL, unless it is a key value, in which case the row is
+        rejected (None) since a NULL key would break the natural key.
+        """
+        if len(row) < self.width:
+            row = list(row) + [''] * (self.width - len(row))
+        try:
+            return tuple(row[i] if convert is None else convert(row[i])
+                         for i, convert in zip(self.indexes, self.converters))
+        except ValueError:
+            pass
         
-        cursor = conn.cursor()
+        problems = {} if problems is None else problems
+        values = []
+        for position, (i, convert) in enumerate(zip(self.indexes, self.converters)):
+            try:
+                values.append(row[i] if convert is None else convert(row[i]))
+            except ValueError:
+                problem = problems.setdefault(self.valid_headers[position], [0, row[i]])
+                problem[0] += 1
+                if position in self.key_positions:
+                    return None
+                values.append(None)
+        return tuple(values)
+    
+    def project_rows(self, data):
+        """Parameter tuples for data, logging every column that had unparsable values"""
+        problems = {}
+        rows = [values for values in (self.project(row, problems) for row in data) if values is not None]
+        for column, (count, example) in problems.items():
+            outcome = "rows rejected" if column in self.keys else "stored as NULL"
+            print(f"⚠️ {self.table_name}.{column}: {count} values are not a valid "
+                  f"{self.data_types[self.valid_headers.index(column)]} (e.g. {example!r}), {outcome}")
+        return rows
+    
+    def key_of(self, values):
+        return tuple(values[i] for i in self.key_positions)
+    
+    def update_params(self, values):
+        return tuple(values[i] for i in self.update_positions)
+
+def get_upload_plan(table_name, headers, existing_columns, key_columns):
+    """Compiled plan for this table and header layout, built once per schema version"""
+    column_types = get_cached_column_types(table_name)
+    cache_key = (table_name, header_signature(headers), tuple(existing_columns), tuple(key_columns),
+                 tuple(sorted(column_types.items())))
+    with UPLOAD_PLANS_LOCK:
+        plan = UPLOAD_PLANS.get(cache_key)
+        if plan is None:
+            plan = UploadPlan(table_name, headers, existing_columns, key_columns, column_types)
+            UPLOAD_PLANS[cache_key] = plan
+            print(f"Compiled upload plan for {table_name}: {len(plan.valid_headers)} columns, "
+                  f"keys {plan.keys}")
+        return plan
+
+@functools.lru_cache(maxsize=256)
+def values_insert_sql(target, columns, row_count):
+    """INSERT ... VALUES text for row_count rows; full-size chunks hit the cache every time"""
+    row_placeholder = f"({', '.join(['%s'] * len(columns))})"
+    return (f"INSERT INTO {target} ({', '.join(f'[{h}]' for h in columns)}) "
+            f"VALUES {', '.join([row_placeholder] * row_count)}")
+
+def insert_rows(cursor, target, columns, rows):
+    """Multi-row INSERT ... VALUES in the largest chunks the backend's parameter limit allows"""
+    columns = tuple(columns)
+    rows_per_insert = max(1, min(BACKEND.max_rows_per_insert, BACKEND.max_params_per_insert // len(columns)))
+    for start in range(0, len(rows), rows_per_insert):
+        chunk = rows[start:start + rows_per_insert]
+        params = tuple(value for row in chunk for value in row)
+        cursor.execute(values_insert_sql(target, columns, len(chunk)), params)
+
+def merge_batch(conn, table_name, valid_headers, keys, rows):
+    """Stage one batch of rows and MERGE it on the natural key, returns round trips used.
+
+    Re-running a batch after a rollback applies the same keyed upsert again, so
+    batches are idempotent and safe to retry.
+    """
+    cursor = CountingCursor(conn.cursor())
+    column_list = ', '.join(f"[{h}]" for h in valid_headers)
+    stage = BACKEND.create_stage(cursor, table_name, column_list)
+    insert_rows(cursor, stage, valid_headers, rows)
+    
+    if keys:
+        BACKEND.merge_from_stage(cursor, table_name, stage, valid_headers, keys)
+    else:
+        cursor.execute(f"INSERT INTO [{table_name}] ({column_list}) SELECT {column_list} FROM {stage}")
+    
+    BACKEND.drop_stage(cursor, stage)
+    return cursor.round_trips
+
+def merge_upsert_data(conn, table_name, headers, data, key_columns):
+    """Set-based upsert: load the rows into a temp table and MERGE, in retryable batches"""
+    started = time.perf_counter()
+    existing_columns = ensure_table_schema(conn, table_name, headers) or []
+    plan = get_upload_plan(table_name, headers, existing_columns, key_columns)
+    valid_headers, keys = plan.valid_headers, plan.keys
+    if not valid_headers:
+        print(f"No valid columns found for table {table_name}")
+        return False
+    
+    rows = plan.project_rows(data)
+    
+    # MERGE rejects a source that matches one target row twice, so the last row per key wins.
+    # This also keeps batches key-disjoint, so they can commit independently.
+    if keys:
+        rows = list({plan.key_of(row): row for row in rows}.values())
+    
+    batch_rows = max(1, RETRY_CONFIG['batch_rows'])
+    batches = [rows[start:start + batch_rows] for start in range(0, len(rows), batch_rows)]
+    
+    upload = RetryingUpload(conn, table_name)
+    round_trips = 0
+    try:
+        for index, batch in enumerate(batches):
+            round_trips += upload.run(f"batch {index + 1}/{len(batches)}",
+                                      lambda c, batch=batch: merge_batch(c, table_name, valid_headers, keys, batch))
+    except Exception:
+        if upload.stats['batches']:
+            print(f"⚠️ {table_name}: {upload.stats['batches']}/{len(batches)} batches committed before the failure")
+        raise
+    finally:
+        upload.close()
+    
+    print(f"Data merged into {table_name}: {len(rows)} records in {len(batches)} batches")
+    record_upload_stats(table_name, 'merge', len(rows), round_trips, started, upload.stats)
+    return True
+
+def upsert_data_with_created_at(conn, table_name, headers, data, key_columns):
+    """Upsert a batch, preferring the staged MERGE and falling back to row-by-row"""
+    if UPLOAD_CONFIG['mode'] == 'merge':
+        try:
+            return merge_upsert_data(conn, table_name, headers, data, key_columns)
+        except Exception as e:
+            if BACKEND.is_transient(e):
+                # Retries are exhausted; hammering a throttled server row by row won't help
+                print(f"❌ {table_name} upload gave up after retries: {e}")
+                return False
+            print(f"⚠️ Bulk MERGE failed for {table_name} ({e}), falling back to row-by-row upsert")
+            try:
+                conn.rollback()
+            except:
+                pass
+            # The failure may be schema drift (e.g. a column dropped by hand), so re-verify
+            invalidate_schema_cache(table_name)
+    
+    success = upsert_rows_individually(conn, table_name, headers, data, key_columns)
+    if not success:
+        invalidate_schema_cache(table_name)
+    return success
+
+def upsert_rows_individually(conn, table_name, headers, data, key_columns):
+    """Row-at-a-time upsert (check, then UPDATE or INSERT), driven by a compiled UploadPlan"""
+    started = time.perf_counter()
+    try:
+        existing_columns = ensure_table_schema(conn, table_name, headers) or []
+        plan = get_upload_plan(table_name, headers, existing_columns, key_columns)
         
-        for row in data:
-            # Ensure row has enough values
-            while len(row) < len(headers):
-                row.append('')
-            row = row[:len(headers)]
-            
-            # Create valid row data matching valid headers
-            valid_row = []
-            for header in valid_headers:
-                if header in headers:
-                    header_index = headers.index(header)
-                    valid_row.append(row[header_index] if header_index < len(row) else '')
-                else:
-                    valid_row.append('')
-            
-            # Check if record exists based on key columns
-            if key_columns:
-                where_parts = []
-                where_values = []
-                for key_col in key_columns:
-                    if key_col in valid_headers:
-                        col_index = headers.index(key_col) if key_col in headers else -1
-                        if col_index >= 0:
-                            where_parts.append(f"ISNULL([{key_col}], '') = ISNULL(%s, '')")
-                            where_values.append(row[col_index] if col_index < len(row) else '')
-                
-                if where_parts:
-                    check_query = f"SELECT COUNT(*) FROM [{table_name}] WHERE {' AND '.join(where_parts)}"
-                    cursor.execute(check_query, where_values)
-                    exists = cursor.fetchone()[0] > 0
-                    
-                    if exists:
-                        # Update existing record
-                        set_parts = []
-                        update_values = []
-                        for header in valid_headers:
-                            if header not in key_columns:
-                                header_index = headers.index(header) if header in headers else -1
-                                if header_index >= 0:
-                                    set_parts.append(f"[{header}] = %s")
-                                    update_values.append(row[header_index] if header_index < len(row) else '')
-                        
-                        if set_parts:
-                            update_query = f"UPDATE [{table_name}] SET {', '.join(set_parts)} WHERE {' AND '.join(where_parts)}"
-                            cursor.execute(update_query, update_values + where_values)
-                            print(f"Updated existing record for: {', '.join([str(v) for v in where_values])}")
-                        continue
+        if not plan.valid_headers:
+            print(f"No valid columns found for table {table_name}")
+            return False
+        
+        print(f"Using {len(plan.valid_headers)} valid unique columns for {table_name}")
+        
+        cursor = CountingCursor(conn.cursor())
+        for values in plan.project_rows(data):
+            if plan.check_sql:
+                key_params = plan.key_of(values)
+                cursor.execute(plan.check_sql, key_params)
+                if cursor.fetchone()[0] > 0:
+                    if plan.update_sql:
+                        cursor.execute(plan.update_sql, plan.update_params(values) + key_params)
+                        print(f"Updated existing record for: {', '.join([str(v) for v in key_params])}")
+                    continue
             
-            # Insert new record
-            placeholders = ', '.join(['%s'] * len(valid_headers))
-            insert_query = f"INSERT INTO [{table_name}] ([{'], ['.join(valid_headers)}]) VALUES ({placeholders})"
-            cursor.execute(insert_query, valid_row)
+            cursor.execute(plan.insert_sql, values)
         
         conn.commit()
         print(f"Data uploaded to {table_name}: {len(data)} records")
+        record_upload_stats(table_name, 'row', len(data), cursor.round_trips, started)
         return True
         
     except Exception as e:
@@ -262,143 +898,705 @@ def upsert_data_with_created_at(conn, table_name, headers, data, key_columns):
             pass
         return False
 
-def upload_financial_report(created_at_hour=None):
+def typed_conversion_sql(column, sql_type):
+    """T-SQL expression converting an NVARCHAR report value to sql_type (NULL if it can't)"""
+    if sql_type == "DATE":
+        return f"TRY_CONVERT(DATE, LTRIM(RTRIM([{column}])), 101)"
+    cleaned = f"REPLACE(REPLACE(REPLACE(LTRIM(RTRIM([{column}])), '$', ''), ',', ''), '%', '')"
+    if sql_type == "INT":
+        return f"TRY_CONVERT(INT, ROUND(TRY_CONVERT(DECIMAL(18,4), {cleaned}), 0))"
+    return f"TRY_CONVERT({sql_type}, {cleaned})"
+
+def migrate_column_types(table_name, batch_size=None):
+    """Convert a table's NVARCHAR columns to their mapped types in place, in batches.
+
+    Each column is copied into a typed shadow column batch by batch (one commit
+    per batch keeps the log small), then swapped in with sp_rename.
+    """
+    batch_size = batch_size or MIGRATION_CONFIG['batch_size']
+    if not BACKEND.supports_type_migration:
+        print(f"Type migration is only supported on SQL Server (backend: {BACKEND.name})")
+        return False
+    
+    conn = create_connection()
+    if not conn:
+        return False
+    
     try:
-        print("Uploading Financial Report to custom_financials_2...")
+        cursor = conn.cursor()
+        column_types = get_table_column_types(conn, table_name)
+        if not column_types:
+            print(f"Table {table_name} not found")
+            return False
         
-        today = get_yesterday()
-        today_file = format_date(today)
+        targets = [(column, column_sql_type(table_name, column)) for column, data_type in column_types.items()
+                   if data_type == 'nvarchar' and column_sql_type(table_name, column) != "NVARCHAR(255)"]
+        print(f"\n🔧 Migrating {len(targets)} columns of {table_name} to typed storage")
         
-        az_time = get_arizona_time()
-        if not created_at_hour:
-            created_at_hour = az_time.strftime("%I %p").lstrip('0')
+        # Indexes on Report_Date would block the column swap; uploads recreate them afterwards
+        if targets:
+            drop_managed_indexes(conn, table_name)
+        
+        incomplete = False
+        for column, sql_type in targets:
+            shadow = f"{column}__typed"
+            conversion = typed_conversion_sql(column, sql_type)
+            started = time.perf_counter()
+            
+            if shadow not in column_types:
+                cursor.execute(f"ALTER TABLE [{table_name}] ADD [{shadow}] {sql_type} NULL")
+                conn.commit()
             
-        filepath = os.path.join(os.getcwd(), "Financial Reports", f"{today_file}_H{az_time.hour:02d}.csv")
+            converted = 0
+            while True:
+                # Rows that cannot convert stay NULL in the shadow and drop out of the filter
+                cursor.execute(f"UPDATE TOP ({int(batch_size)}) [{table_name}] SET [{shadow}] = {conversion} "
+                               f"WHERE [{shadow}] IS NULL AND {conversion} IS NOT NULL")
+                affected = cursor.rowcount
+                conn.commit()
+                converted += max(affected, 0)
+                if affected <= 0:
+                    break
+            
+            cursor.execute(f"SELECT COUNT(*) FROM [{table_name}] WHERE [{shadow}] IS NULL "
+                           f"AND NULLIF(LTRIM(RTRIM([{column}])), '') IS NOT NULL")
+            unconvertible = cursor.fetchone()[0]
+            if unconvertible and column in TABLE_KEYS.get(table_name, []):
+                # A NULL key would break the natural key; leave the text column in place
+                print(f"❌ {column}: {unconvertible} key values could not convert to {sql_type}, not migrated "
+                      f"(fix those rows and re-run --migrate-types)")
+                incomplete = True
+                continue
+            if unconvertible:
+                print(f"⚠️  {column}: {unconvertible} non-empty values could not convert to {sql_type} and become NULL")
+            
+            cursor.execute(f"EXEC sp_rename '{table_name}.{column}', '{column}__text', 'COLUMN'")
+            cursor.execute(f"EXEC sp_rename '{table_name}.{shadow}', '{column}', 'COLUMN'")
+            cursor.execute(f"ALTER TABLE [{table_name}] DROP COLUMN [{column}__text]")
+            conn.commit()
+            print(f"  ✅ {column} -> {sql_type}: {converted} values in {time.perf_counter() - started:.1f}s")
         
-        headers, data = read_csv_data(filepath)
-        if not headers:
+        invalidate_schema_cache(table_name)
+        if incomplete:
+            print(f"⚠️ {table_name} migration incomplete")
+            return False
+        print(f"✅ {table_name} migration complete")
+        return True
+    
+    except Exception as e:
+        print(f"❌ Migration error for {table_name}: {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return False
+    finally:
+        release_connection(conn)
+
+def rollup_date_text(value):
+    """Report_Date as read back (date, 'YYYY-MM-DD' or 'MM/DD/YYYY') in upload format"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%m/%d/%Y")
+    text = str(value).strip()
+    try:
+        return datetime.datetime.strptime(text[:10], "%Y-%m-%d").strftime("%m/%d/%Y")
+    except ValueError:
+        return text
+
+def fetch_rollup_totals(conn, source_table, report_dates=None):
+    """Sum a source table's rollup columns per (date, normalized location).
+
+    With report_dates only those days are read (a Report_Date index seek);
+    without, the whole table is scanned for a rebuild. Values are summed in
+    Python so legacy NVARCHAR columns need no casting.
+    """
+    column_types = get_cached_column_types(source_table) or get_table_column_types(conn, source_table)
+    mapping = {target: source for target, source in ROLLUP_SOURCES[source_table].items() if source in column_types}
+    if not mapping or 'Location' not in column_types or 'Report_Date' not in column_types:
+        return [], {}
+    
+    cursor = conn.cursor()
+    query = (f"SELECT [Report_Date], [Location], {', '.join(f'[{c}]' for c in mapping.values())} "
+             f"FROM [{source_table}]")
+    rows = []
+    if report_dates is None:
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    else:
+        for report_date in report_dates:
+            cursor.execute(f"{query} WHERE [Report_Date] = %s", (report_date_param(source_table, report_date),))
+            rows.extend(cursor.fetchall())
+    
+    return list(mapping), sum_rollup_rows(rows, len(mapping))
+
+def sum_rollup_rows(rows, width):
+    """{(MM/DD/YYYY, normalized location): [sums]} from (Report_Date, Location, *values) rows"""
+    totals = {}
+    for row in rows:
+        location = normalize_location_name(row[1] or '')
+        if not location or location.upper() == 'TOTAL':
+            continue
+        sums = totals.setdefault((rollup_date_text(row[0]), location), [decimal.Decimal(0)] * width)
+        for i, value in enumerate(row[2:2 + width]):
+            text = clean_numeric_text(value) if value is not None else ''
+            try:
+                sums[i] += decimal.Decimal(text) if text else 0
+            except decimal.InvalidOperation:
+                pass
+    return totals
+
+def write_rollup_rows(conn, rollup_columns, totals):
+    # Create the table with every rollup column up front rather than growing it per source
+    ensure_table_schema(conn, ROLLUP_TABLE, ['Report_Date', 'Location'] +
+                        [column for columns in ROLLUP_SOURCES.values() for column in columns])
+    headers = ['Report_Date', 'Location'] + rollup_columns
+    data = [[report_date, location] + [str(value) for value in sums]
+            for (report_date, location), sums in sorted(totals.items())]
+    return upsert_data_with_created_at(conn, ROLLUP_TABLE, headers, data, TABLE_KEYS[ROLLUP_TABLE])
+
+def update_daily_rollup(conn, source_table, report_dates):
+    """Refresh source_table's rollup columns for the report dates an upload just touched"""
+    try:
+        with ROLLUP_LOCK:
+            rollup_columns, totals = fetch_rollup_totals(conn, source_table, report_dates)
+            if not totals:
+                return True
+            success = write_rollup_rows(conn, rollup_columns, totals)
+        if success:
+            print(f"📈 {ROLLUP_TABLE}: refreshed {len(totals)} location-days from {source_table}")
+        return success
+    except Exception as e:
+        # The uploaded data is already committed; a stale rollup is fixed by the next run or a rebuild
+        print(f"⚠️ Could not update {ROLLUP_TABLE} from {source_table}: {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return False
+
+def rebuild_daily_rollup():
+    """Drop the rollup table and recompute it from every row of both source tables"""
+    conn = create_connection()
+    if not conn:
+        return False
+    
+    try:
+        with ROLLUP_LOCK:
+            if table_exists(conn, ROLLUP_TABLE):
+                conn.cursor().execute(f"DROP TABLE [{ROLLUP_TABLE}]")
+                conn.commit()
+            invalidate_schema_cache(ROLLUP_TABLE)
+            
+            for source_table in ROLLUP_SOURCES:
+                if not table_exists(conn, source_table):
+                    print(f"Table {source_table} not found, skipping")
+                    continue
+                rollup_columns, totals = fetch_rollup_totals(conn, source_table)
+                if totals and not write_rollup_rows(conn, rollup_columns, totals):
+                    return False
+                print(f"📈 {ROLLUP_TABLE}: rebuilt {len(totals)} location-days from {source_table}")
+        return True
+    except Exception as e:
+        print(f"Rollup rebuild error: {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return False
+    finally:
+        release_connection(conn)
+
+def snapshot_hour(created_at_hour):
+    """Hour of day (0-23) for a Created_At label like '1 PM'"""
+    return datetime.datetime.strptime(created_at_hour.strip(), "%I %p").hour
+
+def history_columns():
+    return ['Report_Date', 'Snapshot_Hour', 'Location', 'Created_At'] + \
+        [column for columns in ROLLUP_SOURCES.values() for column in columns]
+
+def record_hourly_history(conn, created_at_hour, report_dates, snapshots=None, sources=None):
+    """Upsert this hour's per-location snapshot for the given report dates.
+
+    Earlier hours are never touched. Rows are merged on (date, hour, location)
+    and only the columns present in the snapshot are written, so the financial
+    and RO halves land in separate calls and a retried hour overwrites rather
+    than duplicates. Not atomic: the merge commits per batch, so a failure
+    part-way leaves some of the hour's locations written until the retry.
+    Queue replays pass snapshots ({(date, location): {column: value}}) built
+    from the queued data instead of reading the source tables; sources limits
+    the tables read otherwise.
+    """
+    try:
+        hour = snapshot_hour(created_at_hour)
+        columns = history_columns()
+        existing_columns = ensure_table_schema(conn, HISTORY_TABLE, columns) or []
+        if not all(column in existing_columns for column in columns):
+            print(f"⚠️ {HISTORY_TABLE} schema unavailable, skipping history")
             return False
         
-        headers = sanitize_headers(headers)
+        if snapshots is None:
+            snapshots = {}
+            for source_table in sources or ROLLUP_SOURCES:
+                rollup_columns, totals = fetch_rollup_totals(conn, source_table, report_dates)
+                for key, sums in totals.items():
+                    snapshots.setdefault(key, {}).update(zip(rollup_columns, sums))
+        if not snapshots:
+            return True
         
-        conn = create_connection()
-        if not conn:
+        present = set()
+        for values in snapshots.values():
+            present.update(values)
+        headers = columns[:4] + [c for c in columns[4:] if c in present]
+        data = []
+        for (report_date, location), values in sorted(snapshots.items()):
+            values = dict(values, Report_Date=report_date, Snapshot_Hour=str(hour), Location=location,
+                          Created_At=created_at_hour)
+            data.append(['' if values.get(c) is None else str(values[c]) for c in headers])
+        
+        if not merge_upsert_data(conn, HISTORY_TABLE, headers, data, TABLE_KEYS[HISTORY_TABLE]):
             return False
         
+        print(f"🕒 {HISTORY_TABLE}: {len(data)} location snapshots for {created_at_hour}")
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not record hourly history: {e}")
         try:
-            if not create_table(conn, 'custom_financials_2', headers):
-                return False
-            
-            key_columns = ['Location', 'Report_Date']
-            success = upsert_data_with_created_at(conn, 'custom_financials_2', headers, data, key_columns)
-            
-            if success:
-                cursor = conn.cursor()
-                cursor.execute("SELECT DISTINCT Created_At FROM [custom_financials_2] WHERE Report_Date = %s", 
-                             (today.strftime("%m/%d/%Y"),))
-                created_at_values = [row[0] for row in cursor.fetchall()]
-                print(f"Financial data uploaded with Created_At: {created_at_values}")
-            
-            return success
-        finally:
-            conn.close()
+            conn.rollback()
+        except:
+            pass
+        return False
+
+def get_intraday_curve(location=None, report_date=None):
+    """Hour-by-hour snapshots for a shop and/or report date, oldest first, as dicts.
+
+    Reads only the history table (seeking on Report_Date when a date is
+    given), never the current-state tables.
+    """
+    conn = create_connection()
+    if not conn:
+        return []
+    
+    try:
+        columns = history_columns()
+        column_types = get_cached_column_types(HISTORY_TABLE) or get_table_column_types(conn, HISTORY_TABLE)
+        columns = [c for c in columns if c in column_types]
+        if not columns:
+            return []
+        
+        where_parts = []
+        params = []
+        if report_date is not None:
+            if isinstance(report_date, str):
+                report_date = datetime.datetime.strptime(report_date, "%Y-%m-%d")
+            where_parts.append("[Report_Date] = %s")
+            params.append(report_date.date() if isinstance(report_date, datetime.datetime) else report_date)
+        if location:
+            where_parts.append("[Location] = %s")
+            params.append(normalize_location_name(location))
         
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(f'[{c}]' for c in columns)} FROM [{HISTORY_TABLE}]"
+                       + (f" WHERE {' AND '.join(where_parts)}" if where_parts else "")
+                       + " ORDER BY [Report_Date], [Snapshot_Hour], [Location]", tuple(params))
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
     except Exception as e:
-        print(f"Financial upload error: {e}")
-        return False
+        print(f"Intraday curve query error: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+UPLOAD_SOURCES = {
+    # table: (manifest report, working directory, label)
+    'custom_financials_2': ("financial", "Financial Reports", "Financial Report"),
+    'ro_marketing_2': ("ro_combined", "RO Reports", "RO Marketing Reports")
+}
+
+def load_upload_source(table_name, az_time):
+    """Sanitized (headers, data) of the processed file az_time's run produced for a table, or (None, None)"""
+    report, directory, _ = UPLOAD_SOURCES[table_name]
+    if table_name == 'custom_financials_2':
+        default_name = f"{format_date(az_time)}_H{az_time.hour:02d}.csv"
+    else:
+        default_name = f"TekmetricGemba_RO_{format_date_short(az_time)}_H{az_time.hour:02d}.csv"
+    
+    filepath = find_artifact_path(report, "ALL", az_time.date(), az_time.hour,
+                                  os.path.join(os.getcwd(), directory, default_name))
+    headers, data = read_csv_data(filepath)
+    if not headers:
+        return None, None
+    return sanitize_headers(headers), data
+
+def print_upload_summary(conn, table_name, report_date):
+    cursor = conn.cursor()
+    if table_name == 'custom_financials_2':
+        cursor.execute("SELECT DISTINCT Created_At FROM [custom_financials_2] WHERE Report_Date = %s", 
+                     (report_date_param('custom_financials_2', report_date),))
+        created_at_values = [row[0] for row in cursor.fetchall()]
+        print(f"Financial data uploaded with Created_At: {created_at_values}")
+    else:
+        cursor.execute("""
+            SELECT Location, COUNT(*) as RecordCount, MAX(Created_At) as LatestCreatedAt
+            FROM [ro_marketing_2] 
+            WHERE Report_Date = %s 
+            GROUP BY Location
+            ORDER BY Location
+        """, (report_date_param('ro_marketing_2', report_date),))
+        
+        location_info = cursor.fetchall()
+        print(f"RO data uploaded for {len(location_info)} locations:")
+        for location, count, latest_created_at in location_info:
+            print(f"  {location}: {count} records, Latest Created_At: {latest_created_at}")
 
-def upload_ro_reports(created_at_hour=None):
+def upload_table_snapshot(table_name, headers, data, report_date, run_date, hour):
+    """Upsert one table snapshot, then refresh its rollup; run_date/hour locate the manifest entry"""
+    conn = create_connection()
+    if not conn:
+        return False
+    
     try:
-        print("Uploading RO Marketing Reports to ro_marketing_2...")
+        success = upsert_data_with_created_at(conn, table_name, headers, [list(row) for row in data],
+                                              TABLE_KEYS[table_name])
+        mark_stage(UPLOAD_SOURCES[table_name][0], "ALL", run_date, hour, "uploaded", "ok" if success else "failed")
         
-        today = get_yesterday()
-        today_short = format_date_short(today)
+        if success:
+            try:
+                print_upload_summary(conn, table_name, report_date)
+            except Exception as e:
+                # The data is committed; a connection lost mid-upload only costs the printout
+                print(f"{UPLOAD_SOURCES[table_name][2]} summary unavailable: {e}")
+            update_daily_rollup(conn, table_name, [report_date])
         
-        az_time = get_arizona_time()
-        if not created_at_hour:
-            created_at_hour = az_time.strftime("%I %p").lstrip('0')
-            
-        filepath = os.path.join(os.getcwd(), "RO Reports", f"TekmetricGemba_RO_{today_short}_H{az_time.hour:02d}.csv")
+        return success
+    finally:
+        release_connection(conn)
+
+def upload_financial_report(created_at_hour=None, run_at=None):
+    try:
+        print("Uploading Financial Report to custom_financials_2...")
+        # run_at: the run's clock reading, so a slow run still finds its own hour
+        az_time = run_at or get_arizona_time()
+        headers, data = load_upload_source('custom_financials_2', az_time)
+        if not headers:
+            return False
+        return upload_table_snapshot('custom_financials_2', headers, data, az_time, az_time.date(), az_time.hour)
         
-        headers, data = read_csv_data(filepath)
+    except Exception as e:
+        print(f"Financial upload error: {e}")
+        return False
+
+def upload_ro_reports(created_at_hour=None, run_at=None):
+    try:
+        print("Uploading RO Marketing Reports to ro_marketing_2...")
+        az_time = run_at or get_arizona_time()
+        headers, data = load_upload_source('ro_marketing_2', az_time)
         if not headers:
             return False
+        return upload_table_snapshot('ro_marketing_2', headers, data, az_time, az_time.date(), az_time.hour)
         
-        headers = sanitize_headers(headers)
+    except Exception as e:
+        print(f"RO upload error: {e}")
+        return False
+
+def snapshot_rollup_totals(table_name, headers, data):
+    """Rollup sums for a snapshot that is still in memory (no database reads)"""
+    mapping = {target: source for target, source in ROLLUP_SOURCES[table_name].items() if source in headers}
+    if not mapping or 'Location' not in headers or 'Report_Date' not in headers:
+        return [], {}
+    indexes = [headers.index(c) for c in ['Report_Date', 'Location'] + list(mapping.values())]
+    rows = [[row[i] if i < len(row) else '' for i in indexes] for row in data]
+    return list(mapping), sum_rollup_rows(rows, len(mapping))
+
+def enqueue_current_uploads(created_at_hour, tables=None, run_at=None):
+    """Write the run's table snapshots to the durable queue, returns {table: queue id}"""
+    az_time = run_at or get_arizona_time()
+    queued = {}
+    for table_name, (_, _, label) in UPLOAD_SOURCES.items():
+        if tables is not None and table_name not in tables:
+            continue
+        try:
+            headers, data = load_upload_source(table_name, az_time)
+            if not headers:
+                print(f"❌ {label}: nothing to queue for {created_at_hour}")
+                continue
+            queued[table_name] = upload_queue.enqueue(table_name, headers, data, az_time,
+                                                      az_time.date(), az_time.hour, created_at_hour)
+            print(f"📥 Queued {label}: {len(data)} rows (#{queued[table_name]})")
+        except Exception as e:
+            print(f"❌ Could not queue {label}: {e}")
+    return queued
+
+def upload_table_report(table_name, created_at_hour, run_at=None):
+    """Get one table's snapshot for a run into SQL (through the queue when enabled).
+
+    Lets the pipeline upload each table as soon as its own file is ready;
+    run_at is the run's clock reading, so a slow run still finds its own hour.
+    """
+    run_at = run_at or get_arizona_time()
+    if not upload_queue.QUEUE_CONFIG['enabled']:
+        upload = upload_financial_report if table_name == 'custom_financials_2' else upload_ro_reports
+        success = bool(upload(created_at_hour, run_at))
+        if success:
+            conn = create_connection()
+            if conn:
+                try:
+                    record_hourly_history(conn, created_at_hour, [run_at], sources=[table_name])
+                finally:
+                    release_connection(conn)
+        return success
+    
+    queued = enqueue_current_uploads(created_at_hour, [table_name], run_at)
+    if table_name not in queued:
+        return False
+    drain_upload_queue()
+    status = wait_for_queued_upload(queued[table_name])
+    if status == 'queued':
+        UPLOAD_STATS.setdefault(table_name, {})['queued'] = True
+    return status == 'done'
+
+def wait_for_queued_upload(entry_id, timeout=None):
+    """Status of a queue entry after this run's drain, or 'queued' if it is still waiting.
+
+    Another process's drain may hold the entry; it is given up to
+    wait_seconds (not the lease) before the run moves on and leaves the
+    entry to the background drainer.
+    """
+    timeout = upload_queue.QUEUE_CONFIG['wait_seconds'] if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    status = upload_queue.get_statuses([entry_id]).get(entry_id)
+    while status == 'in_progress' and time.monotonic() < deadline:
+        time.sleep(1)
+        status = upload_queue.get_statuses([entry_id]).get(entry_id)
+    if status in ('pending', 'in_progress'):
+        print(f"📥 Queued snapshot #{entry_id} not uploaded yet, leaving it to the background drainer")
+        return 'queued'
+    return status
+
+def drain_upload_queue(wait=True):
+    """Replay pending queued snapshots into SQL, oldest first.
+
+    Only the newest snapshot per (table, Report_Date) is upserted; the hourly
+    snapshots it supersedes are marked as such once it lands, but every
+    queued hour still gets its history row. A failing entry stays pending
+    (failed after max_attempts) without holding up the table's other
+    Report_Dates. Returns counts, or None if another drain is already running.
+    """
+    if not QUEUE_DRAIN_LOCK.acquire(blocking=wait):
+        return None
+    
+    drain_id = f"{os.getpid()}:{threading.get_ident()}:{time.time():.6f}"
+    try:
+        upload_queue.release_claims()
+        entries = upload_queue.pending_entries()
+        if not entries:
+            return {'uploaded': 0, 'superseded': 0, 'failed': 0, 'pending': 0}
         
         conn = create_connection()
         if not conn:
-            return False
+            print(f"📥 SQL unreachable, keeping {len(entries)} queued snapshots for replay")
+            return {'uploaded': 0, 'superseded': 0, 'failed': 0, 'pending': len(entries)}
+        release_connection(conn)
         
-        try:
-            if not create_table(conn, 'ro_marketing_2', headers):
-                return False
-            
-            key_columns = ['Marketing_Source', 'Location', 'Report_Date']
-            success = upsert_data_with_created_at(conn, 'ro_marketing_2', headers, data, key_columns)
-            
-            if success:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT Location, COUNT(*) as RecordCount, MAX(Created_At) as LatestCreatedAt
-                    FROM [ro_marketing_2] 
-                    WHERE Report_Date = %s 
-                    GROUP BY Location
-                    ORDER BY Location
-                """, (today.strftime("%m/%d/%Y"),))
-                
-                location_info = cursor.fetchall()
-                print(f"RO data uploaded for {len(location_info)} locations:")
-                for location, count, latest_created_at in location_info:
-                    print(f"  {location}: {count} records, Latest Created_At: {latest_created_at}")
-            
-            return success
-        finally:
-            conn.close()
+        if len(entries) > len(UPLOAD_SOURCES):
+            print(f"📥 Replaying upload backlog: {len(entries)} queued snapshots")
+        
+        groups = {}
+        for entry in entries:
+            groups.setdefault((entry['table_name'], entry['report_date']), []).append(entry)
+        # Claim each (table, Report_Date) with the snapshots it supersedes; a key another
+        # process is already draining is left to it
+        entries = []
+        for key, group in list(groups.items()):
+            if upload_queue.claim([e['id'] for e in group], drain_id):
+                entries.extend(group)
+            else:
+                del groups[key]
+        if not entries:
+            return {'uploaded': 0, 'superseded': 0, 'failed': 0, 'pending': upload_queue.pending_count()}
+        
+        by_table = {}
+        for group in sorted(groups.values(), key=lambda g: g[-1]['id']):
+            by_table.setdefault(group[-1]['table_name'], []).append(group[-1])
+        
+        # History first: every queued hour, straight from the queued snapshots
+        hours = {}
+        for entry in entries:
+            hours.setdefault((entry['run_date'], entry['hour'], entry['created_at_hour']), []).append(entry)
+        conn = create_connection()
+        if conn:
+            try:
+                for (_, _, created_at_hour), hour_entries in hours.items():
+                    snapshots = {}
+                    for entry in hour_entries:
+                        headers, data = upload_queue.load_payload(entry['id'])
+                        rollup_columns, totals = snapshot_rollup_totals(entry['table_name'], headers, data)
+                        for key, sums in totals.items():
+                            snapshots.setdefault(key, {}).update(zip(rollup_columns, sums))
+                    record_hourly_history(conn, created_at_hour, None, snapshots)
+            finally:
+                release_connection(conn)
+        
+        counts = {'uploaded': 0, 'superseded': 0, 'failed': 0}
+        
+        def replay(table_entries):
+            def upload(_created_at_hour):
+                all_uploaded = True
+                for entry in table_entries:
+                    superseded = [e['id'] for e in entries if e['table_name'] == entry['table_name'] and
+                                  e['report_date'] == entry['report_date'] and e['id'] != entry['id']]
+                    headers, data = upload_queue.load_payload(entry['id'])
+                    report_date = datetime.datetime.strptime(entry['report_date'], "%Y-%m-%d")
+                    run_date = datetime.datetime.strptime(entry['run_date'], "%Y-%m-%d").date()
+                    print(f"Uploading queued snapshot #{entry['id']} to {entry['table_name']} "
+                          f"({entry['created_at_hour']}, {entry['row_count']} rows)")
+                    if not upload_table_snapshot(entry['table_name'], headers, data, report_date, run_date,
+                                                 entry['hour']):
+                        all_uploaded = False
+                        if upload_queue.mark_attempt_failed(entry['id'], "upload failed"):
+                            print(f"❌ Giving up on queued snapshot #{entry['id']} after "
+                                  f"{upload_queue.QUEUE_CONFIG['max_attempts']} attempts")
+                            with QUEUE_DRAIN_STATS_LOCK:
+                                counts['failed'] += 1
+                        # The table's other Report_Dates are independent snapshots, keep going
+                        continue
+                    upload_queue.mark_done(entry['id'], superseded)
+                    with QUEUE_DRAIN_STATS_LOCK:
+                        counts['uploaded'] += 1
+                        counts['superseded'] += len(superseded)
+                return all_uploaded
+            return upload
         
+        run_table_uploads([(table, replay(table_entries)) for table, table_entries in by_table.items()], None)
+        
+        upload_queue.release_claims(drain_id)
+        counts['pending'] = upload_queue.pending_count()
+        if counts['superseded'] or counts['pending'] or counts['failed']:
+            print(f"📥 Queue drained: {counts['uploaded']} uploaded, {counts['superseded']} superseded, "
+                  f"{counts['pending']} still pending, {counts['failed']} failed")
+        return counts
     except Exception as e:
-        print(f"RO upload error: {e}")
-        return False
+        print(f"⚠️ Upload queue drain failed: {e}")
+        return None
+    finally:
+        # Whatever this drain claimed but did not finish goes back to pending
+        try:
+            upload_queue.release_claims(drain_id)
+        except Exception as e:
+            print(f"⚠️ Could not release queue claims: {e}")
+        QUEUE_DRAIN_LOCK.release()
 
-def upload_all_reports(created_at_hour=None):
+def start_queue_drainer():
+    """Daemon thread that replays the backlog whenever SQL becomes reachable again"""
+    def drain_forever():
+        while True:
+            time.sleep(upload_queue.QUEUE_CONFIG['drain_interval_seconds'])
+            try:
+                if upload_queue.pending_count():
+                    drain_upload_queue(wait=False)
+            except Exception as e:
+                print(f"⚠️ Background upload drain error: {e}")
+    
+    thread = threading.Thread(target=drain_forever, name="upload-drainer", daemon=True)
+    thread.start()
+    return thread
+
+def run_table_uploads(uploads, created_at_hour):
+    """Run (table, upload_function) pairs concurrently, each on its own pooled connection.
+
+    A failure or exception in one table never cancels the other; results are
+    reported per table as {table: success}.
+    """
+    def timed_upload(table_name, upload):
+        started = time.perf_counter()
+        try:
+            success = bool(upload(created_at_hour))
+            error = None
+        except Exception as e:
+            success = False
+            error = str(e)
+        return success, error, time.perf_counter() - started
+    
+    started = time.perf_counter()
+    if UPLOAD_CONFIG['parallel'] and len(uploads) > 1:
+        with ThreadPoolExecutor(max_workers=len(uploads), thread_name_prefix="upload") as executor:
+            futures = {table: executor.submit(timed_upload, table, upload) for table, upload in uploads}
+            outcomes = {table: future.result() for table, future in futures.items()}
+    else:
+        outcomes = {table: timed_upload(table, upload) for table, upload in uploads}
+    
+    results = {}
+    print(f"\nUpload results ({time.perf_counter() - started:.2f}s wall clock):")
+    for table, (success, error, elapsed) in outcomes.items():
+        results[table] = success
+        UPLOAD_STATS.setdefault(table, {}).update(success=success, error=error, wall_seconds=round(elapsed, 3))
+        status = "✅" if success else "❌"
+        retries = UPLOAD_STATS[table].get('retries', 0)
+        print(f"  {status} {table}: {elapsed:.2f}s" + (f" - {error}" if error else "")
+              + (f" ({retries} retries, {UPLOAD_STATS[table]['backoff_seconds']:.1f}s backoff)" if retries else ""))
+    
+    return results
+
+def upload_all_reports(created_at_hour=None, run_at=None):
     try:
         print("Starting SQL upload to new tables...")
         
+        az_time = run_at or get_arizona_time()
         if not created_at_hour:
-            az_time = get_arizona_time()
             created_at_hour = az_time.strftime("%I %p").lstrip('0')
         
         print(f"Uploading data with Created_At: {created_at_hour}")
+        reset_upload_stats()
         
-        financial_success = upload_financial_report(created_at_hour)
-        ro_success = upload_ro_reports(created_at_hour)
+        if upload_queue.QUEUE_CONFIG['enabled']:
+            # Queue first so the hour survives SQL being down, then replay whatever is pending
+            queued = enqueue_current_uploads(created_at_hour, run_at=az_time)
+            drain_upload_queue()
+            statuses = {entry_id: wait_for_queued_upload(entry_id) for entry_id in queued.values()}
+            financial_success = statuses.get(queued.get('custom_financials_2')) == 'done'
+            ro_success = statuses.get(queued.get('ro_marketing_2')) == 'done'
+            upload_queue.prune_finished()
+        else:
+            results = run_table_uploads([
+                ('custom_financials_2', lambda hour: upload_financial_report(hour, az_time)),
+                ('ro_marketing_2', lambda hour: upload_ro_reports(hour, az_time))
+            ], created_at_hour)
+            financial_success = results['custom_financials_2']
+            ro_success = results['ro_marketing_2']
+            
+            if financial_success or ro_success:
+                conn = create_connection()
+                if conn:
+                    try:
+                        record_hourly_history(conn, created_at_hour, [az_time])
+                    finally:
+                        release_connection(conn)
         
         if financial_success and ro_success:
             print("All reports uploaded successfully to new tables")
             
             # Summary report
+            conn = None
             try:
                 conn = create_connection()
                 if conn:
                     cursor = conn.cursor()
-                    today = get_yesterday()
+                    today = az_time
                     today_formatted = today.strftime("%m/%d/%Y")
                     
                     cursor.execute("SELECT COUNT(*) FROM [custom_financials_2] WHERE Report_Date = %s AND Created_At = %s", 
-                                 (today_formatted, created_at_hour))
+                                 (report_date_param('custom_financials_2', today), created_at_hour))
                     financial_count = cursor.fetchone()[0]
                     
                     cursor.execute("SELECT COUNT(*) FROM [ro_marketing_2] WHERE Report_Date = %s AND Created_At = %s", 
-                                 (today_formatted, created_at_hour))
+                                 (report_date_param('ro_marketing_2', today), created_at_hour))
                     ro_count = cursor.fetchone()[0]
                     
                     print(f"\nUpload Summary for {today_formatted} at {created_at_hour}:")
                     print(f"  custom_financials_2: {financial_count} records")
                     print(f"  ro_marketing_2: {ro_count} records")
-                    
-                    conn.close()
             except Exception as e:
                 print(f"Summary report error: {e}")
+            finally:
+                release_connection(conn)
             
             return True
         elif ro_success:
@@ -416,4 +1614,20 @@ def upload_all_reports(created_at_hour=None):
         return False
 
 if __name__ == "__main__":
-    upload_all_reports()
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "--migrate-types":
+        for table in (sys.argv[2:] or sorted(set(COLUMN_TYPES) - {ROLLUP_TABLE})):
+            migrate_column_types(table)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--drain-queue":
+        print(drain_upload_queue())
+    elif len(sys.argv) > 1 and sys.argv[1] == "--rebuild-rollup":
+        rebuild_daily_rollup()
+    elif len(sys.argv) > 2 and sys.argv[1] == "--curve":
+        curve = get_intraday_curve(sys.argv[3] if len(sys.argv) > 3 else None, sys.argv[2])
+        for point in curve:
+            print(f"{point['Report_Date']} {point['Created_At']:>5} {point['Location']:<16} "
+                  f"cars {point.get('Car_Count') or 0:>4}  ROs {point.get('RO_Count') or 0:>4}  "
+                  f"sales {point.get('Sales') or 0:>12}")
+    else:
+        upload_all_reports()
@@ -0,0 +1,125 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+import notifications
+import notification_queue
+
+FAILURE = "failure: login"
+
+class DeliverNotificationsTest(unittest.TestCase):
+    """deliver_notifications against a real queue, with Graph mocked out"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patches = [
+            mock.patch.dict(notification_queue.NOTIFY_CONFIG, {
+                'db_path': os.path.join(self.directory, "notification_queue.db"), 'digest_window_minutes': 180,
+                'retry_base_seconds': 60, 'retry_max_seconds': 3600, 'give_up_hours': 24
+            }),
+            mock.patch.object(notifications, 'send_email', side_effect=self.send_email)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.sent = []
+        self.graph_up = True
+
+    def send_email(self, subject, body):
+        if not self.graph_up:
+            return False, "Graph unreachable"
+        self.sent.append((subject, body))
+        return True, "sent"
+
+    def enqueue(self, signature, hour_label):
+        return notification_queue.enqueue(signature, signature == "success", f"{signature} at {hour_label}",
+                                          f"Run at {hour_label}: {signature}", '10/18/2026', hour_label)
+
+    def statuses(self):
+        return {entry['id']: entry['status']
+                for status in ('pending', 'held', 'sent', 'digested', 'failed')
+                for entry in notification_queue.entries(status)}
+
+    def later(self, hours):
+        return notification_queue.get_arizona_time() + datetime.timedelta(hours=hours)
+
+    def test_repeats_within_the_window_are_held(self):
+        first = self.enqueue(FAILURE, '1 PM')
+        self.assertEqual(notifications.deliver_notifications(), 1)
+
+        second = self.enqueue(FAILURE, '2 PM')
+        third = self.enqueue(FAILURE, '3 PM')
+        self.assertEqual(notifications.deliver_notifications(), 0)
+
+        self.assertEqual(self.statuses(), {first: 'sent', second: 'held', third: 'held'})
+        self.assertEqual(len(self.sent), 1)
+
+    def test_state_change_sends_at_once_and_covers_only_its_own_signature(self):
+        self.enqueue(FAILURE, '1 PM')
+        notifications.deliver_notifications()
+        held_failure = self.enqueue(FAILURE, '2 PM')
+        notifications.deliver_notifications()
+        self.enqueue("success", '3 PM')
+        notifications.deliver_notifications()
+        held_success = self.enqueue("success", '4 PM')
+        notifications.deliver_notifications()
+        self.sent.clear()
+
+        # A failure after a success differs from the run before it, so it goes out now
+        relapse = self.enqueue(FAILURE, '5 PM')
+        self.assertEqual(notifications.deliver_notifications(), 1)
+
+        statuses = self.statuses()
+        self.assertEqual(statuses[relapse], 'sent')
+        self.assertEqual(statuses[held_failure], 'digested')
+        self.assertEqual(statuses[held_success], 'held')
+        subject, body = self.sent[0]
+        self.assertEqual(subject, f"{FAILURE} at 5 PM (+1 earlier)")
+        self.assertIn(f"{FAILURE} at 2 PM", body)
+        self.assertNotIn("success at", body)
+
+    def test_held_repeats_go_out_as_one_digest_after_the_window(self):
+        self.enqueue(FAILURE, '1 PM')
+        notifications.deliver_notifications()
+        second = self.enqueue(FAILURE, '2 PM')
+        third = self.enqueue(FAILURE, '3 PM')
+        notifications.deliver_notifications()
+        self.sent.clear()
+
+        self.assertEqual(notifications.deliver_notifications(now=self.later(1)), 0)
+        self.assertEqual(notifications.deliver_notifications(now=self.later(4)), 1)
+
+        # The newest repeat carries the older one
+        self.assertEqual(self.statuses()[third], 'sent')
+        self.assertEqual(self.statuses()[second], 'digested')
+        self.assertEqual(self.sent, [(f"{FAILURE} at 3 PM (+1 earlier)",
+                                      f"Run at 3 PM: {FAILURE}\n\nAlso since the last email (1 more runs held as repeats):\n"
+                                      f"   • {FAILURE} at 2 PM")])
+
+    def test_failed_send_stays_pending_until_its_backoff_passes(self):
+        entry_id = self.enqueue(FAILURE, '1 PM')
+        self.graph_up = False
+
+        self.assertEqual(notifications.deliver_notifications(), 0)
+        entry = notification_queue.entries('pending')[0]
+        self.assertEqual(entry['attempts'], 1)
+        self.assertEqual(entry['last_error'], "Graph unreachable")
+
+        self.graph_up = True
+        self.assertEqual(notifications.deliver_notifications(), 0)
+        self.assertEqual(notifications.deliver_notifications(now=self.later(1)), 1)
+        self.assertEqual(self.statuses(), {entry_id: 'sent'})
+
+    def test_gives_up_after_give_up_hours(self):
+        entry_id = self.enqueue(FAILURE, '1 PM')
+        self.graph_up = False
+
+        notifications.deliver_notifications(now=self.later(25))
+
+        self.assertEqual(self.statuses(), {entry_id: 'failed'})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import time
+import threading
+import unittest
+from unittest import mock
+
+from pipeline import Stage, run_pipeline, critical_path, check_graph
+
+def timing(start, end):
+    return {'start': start, 'end': end, 'thread': 'worker', 'error': None}
+
+class RunPipelineTest(unittest.TestCase):
+    def test_stages_see_their_dependencies_results(self):
+        stages = [
+            Stage('download', lambda results: 2, main_thread=True),
+            Stage('process', lambda results: results['download'] * 10, deps=['download']),
+            Stage('upload', lambda results: results['process'] + 1, deps=['process'])
+        ]
+
+        results, timings = run_pipeline(stages)
+
+        self.assertEqual(results, {'download': 2, 'process': 20, 'upload': 21})
+        self.assertLessEqual(timings['download']['end'], timings['process']['start'])
+        self.assertLessEqual(timings['process']['end'], timings['upload']['start'])
+
+    def test_main_thread_stages_run_on_the_calling_thread(self):
+        caller = threading.get_ident()
+        stages = [
+            Stage('browser', lambda results: threading.get_ident(), main_thread=True),
+            Stage('worker', lambda results: threading.get_ident())
+        ]
+
+        results, timings = run_pipeline(stages)
+
+        self.assertEqual(results['browser'], caller)
+        self.assertNotEqual(results['worker'], caller)
+        self.assertEqual(timings['browser']['thread'], 'main')
+        self.assertEqual(timings['worker']['thread'], 'worker')
+
+    def test_independent_stages_overlap(self):
+        both_running = threading.Barrier(2, timeout=5)
+        stages = [
+            Stage('financial', lambda results: both_running.wait() is not None),
+            Stage('ro', lambda results: both_running.wait() is not None)
+        ]
+
+        results, _ = run_pipeline(stages, max_workers=2)
+
+        self.assertEqual(results, {'financial': True, 'ro': True})
+
+    def test_failed_stage_records_none_and_dependents_still_run(self):
+        def fail(results):
+            raise RuntimeError("export timed out")
+
+        stages = [
+            Stage('download', fail),
+            Stage('process', lambda results: results['download'] is None, deps=['download'])
+        ]
+
+        results, timings = run_pipeline(stages)
+
+        self.assertIsNone(results['download'])
+        self.assertEqual(timings['download']['error'], "export timed out")
+        self.assertTrue(results['process'])
+        self.assertIsNone(timings['process']['error'])
+
+    def test_graph_errors_are_rejected_before_running(self):
+        ran = []
+        with self.assertRaises(ValueError):
+            run_pipeline([Stage('a', ran.append, deps=['missing'])])
+        with self.assertRaises(ValueError):
+            check_graph([Stage('a', ran.append, deps=['b']), Stage('b', ran.append, deps=['a'])])
+        with self.assertRaises(ValueError):
+            check_graph([Stage('a', ran.append), Stage('a', ran.append)])
+        self.assertEqual(ran, [])
+
+class CriticalPathTest(unittest.TestCase):
+    def test_follows_the_latest_finishing_dependency(self):
+        stages = [
+            Stage('financial_download', None),
+            Stage('ro_download', None, deps=['financial_download']),
+            Stage('financial_upload', None, deps=['financial_download']),
+            Stage('combine', None, deps=['ro_download']),
+            Stage('store_maintenance', None, deps=['financial_upload', 'combine'])
+        ]
+        timings = {
+            'financial_download': timing(0, 10),
+            'ro_download': timing(10, 40),
+            'financial_upload': timing(10, 15),
+            'combine': timing(40, 45),
+            'store_maintenance': timing(45, 46)
+        }
+
+        self.assertEqual(critical_path(stages, timings),
+                         ['financial_download', 'ro_download', 'combine', 'store_maintenance'])
+
+    def test_ends_at_the_last_stage_to_finish(self):
+        stages = [Stage('a', None), Stage('b', None), Stage('c', None, deps=['a'])]
+        timings = {'a': timing(0, 1), 'b': timing(0, 9), 'c': timing(1, 2)}
+
+        self.assertEqual(critical_path(stages, timings), ['b'])
+
+    def test_measured_run(self):
+        stages = [
+            Stage('slow', lambda results: time.sleep(0.2)),
+            Stage('fast', lambda results: None),
+            Stage('after_slow', lambda results: None, deps=['slow']),
+            Stage('end', lambda results: None, deps=['after_slow', 'fast'])
+        ]
+
+        _, timings = run_pipeline(stages)
+
+        self.assertEqual(critical_path(stages, timings), ['slow', 'after_slow', 'end'])
+
+class RunStagesTest(unittest.TestCase):
+    """The combine stage of app.build_run_stages"""
+    def setUp(self):
+        import app
+        self.app = app
+        dates = {'yesterday_short': '10182026', 'current_hour': '1 PM', 'run_at': None}
+        stages = {stage.name: stage for stage in app.build_run_stages(None, {}, dates)}
+        self.combine = stages['combine'].func
+
+    def test_combine_reports_combine_ro_reports_outcome(self):
+        with mock.patch.object(self.app, 'combine_ro_reports', return_value="combined.csv"):
+            self.assertTrue(self.combine({'ro_process': True}))
+        with mock.patch.object(self.app, 'combine_ro_reports', return_value=None):
+            self.assertFalse(self.combine({'ro_process': True}))
+
+    def test_combine_skipped_without_processed_ro_files(self):
+        with mock.patch.object(self.app, 'combine_ro_reports') as combine_ro_reports:
+            self.assertFalse(self.combine({'ro_process': False}))
+        combine_ro_reports.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+
+from reports import reconcile_reports
+
+LOCATIONS = ['Mesa Broadway', 'Phoenix', 'Tempe']
+
+FINANCIAL_HEADERS = ['Location', 'Car_Count', 'Total_Written_Sales', 'Report_Date', 'Created_At']
+RO_HEADERS = ['Marketing Source', 'Total Sales', 'RO Count', 'New RO Count', 'Location', 'Report_Date', 'Created_At']
+
+class ReconcileReportsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows(rows)
+        return path
+
+    def financial(self, rows):
+        return self.write_csv("financial.csv", [FINANCIAL_HEADERS] + rows)
+
+    def ro(self, rows):
+        return self.write_csv("ro.csv", [RO_HEADERS] + rows)
+
+    def test_matching_reports(self):
+        financial = self.financial([
+            ['Gemba Automotive - Mesa Broadway (003)', '4', '$1,000.00', '10/18/2026', '1 PM'],
+            ['Gemba Automotive - Phoenix (002)', '2', '500', '10/18/2026', '1 PM'],
+            ['Gemba Automotive - Tempe (001)', '0', '0', '10/18/2026', '1 PM'],
+            ['TOTAL', '6', '1500', '10/18/2026', '1 PM']
+        ])
+        ro = self.ro([
+            ['Google', '$800.00', '3', '9', 'Mesa-Broadway', '10/18/2026', '1 PM'],
+            ['Referral', '200', '1', '9', 'Mesa-Broadway', '10/18/2026', '1 PM'],
+            ['Google', '500', '2', '9', 'Phoenix', '10/18/2026', '1 PM'],
+            ['No Data', '0', '0', '0', 'Tempe', '10/18/2026', '1 PM']
+        ])
+
+        result = reconcile_reports(financial, ro, '1 PM', LOCATIONS)
+
+        self.assertTrue(result['financial_found'])
+        self.assertTrue(result['ro_found'])
+        self.assertIsNone(result['financial_error'])
+        self.assertIsNone(result['ro_error'])
+        self.assertEqual(result['financial_car_count'], 6)
+        self.assertEqual(result['financial_records'], 4)
+        self.assertEqual(result['created_at_records'], 4)
+        # "RO Count" only, never "New RO Count"
+        self.assertEqual(result['ro_total_count'], 6)
+        self.assertEqual(result['marketing_sources'], 3)
+        self.assertEqual(result['locations']['Mesa Broadway']['car_count'], 4)
+        self.assertEqual(result['locations']['Mesa Broadway']['ro_count'], 4)
+        self.assertEqual(result['locations']['Mesa Broadway']['ro_sales'], 1000.0)
+        self.assertEqual(result['financial_locations'], LOCATIONS)
+        self.assertEqual(result['ro_locations'], LOCATIONS)
+        self.assertEqual(result['missing_financial'], [])
+        self.assertEqual(result['missing_ro'], [])
+        self.assertEqual(result['mismatched_locations'], [])
+        self.assertTrue(result['totals_match'])
+
+    def test_mismatched_and_missing_locations(self):
+        financial = self.financial([
+            ['Gemba Automotive - Mesa Broadway (003)', '5', '1000', '10/18/2026', '1 PM'],
+            ['Gemba Automotive - Phoenix (002)', '2', '500', '10/18/2026', '12 PM'],
+            ['TOTAL', '7', '1500', '10/18/2026', '1 PM']
+        ])
+        ro = self.ro([
+            ['Google', '800', '3', '0', 'Mesa-Broadway', '10/18/2026', '1 PM'],
+            ['Google', '200', '1', '0', 'Tempe', '10/18/2026', '1 PM']
+        ])
+
+        result = reconcile_reports(financial, ro, '1 PM', LOCATIONS)
+
+        self.assertEqual(result['created_at_records'], 2)
+        self.assertEqual(result['mismatched_locations'], ['Mesa Broadway'])
+        self.assertEqual(result['missing_financial'], ['Tempe'])
+        self.assertEqual(result['missing_ro'], ['Phoenix'])
+        self.assertFalse(result['totals_match'])
+        # Locations that appear in neither file are still listed
+        self.assertFalse(result['locations']['Tempe']['in_financial'])
+        self.assertTrue(result['locations']['Tempe']['in_ro'])
+
+    def test_missing_files(self):
+        result = reconcile_reports(os.path.join(self.directory, "none.csv"),
+                                   os.path.join(self.directory, "none_ro.csv"), '1 PM', LOCATIONS)
+
+        self.assertFalse(result['financial_found'])
+        self.assertFalse(result['ro_found'])
+        self.assertIn("File not found", result['financial_error'])
+        self.assertIn("File not found", result['ro_error'])
+        self.assertEqual(result['missing_financial'], LOCATIONS)
+        self.assertEqual(result['missing_ro'], LOCATIONS)
+        self.assertTrue(result['totals_match'])
+
+    def test_missing_columns(self):
+        financial = self.write_csv("financial.csv", [['Location', 'Sales'], ['Phoenix', '10']])
+        ro = self.write_csv("ro.csv", [['Marketing Source', 'RO Count'], ['Google', '3']])
+
+        result = reconcile_reports(financial, ro, '1 PM', LOCATIONS)
+
+        self.assertEqual(result['financial_error'], "Car Count column not found")
+        self.assertEqual(result['ro_error'], "Location column not found")
+        self.assertEqual(result['ro_total_count'], 3)
+
+if __name__ == "__main__":
+    unittest.main()
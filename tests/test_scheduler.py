@@ -0,0 +1,59 @@
+import datetime
+import unittest
+from unittest import mock
+
+import pytz
+
+import scheduler
+
+ARIZONA = pytz.timezone('US/Arizona')
+
+def at(hour, minute, second=0):
+    return ARIZONA.localize(datetime.datetime(2026, 10, 18, hour, minute, second))
+
+class DecideTriggerTest(unittest.TestCase):
+    def setUp(self):
+        config = mock.patch.dict(scheduler.SCHEDULE_CONFIG, {
+            'catch_up': 'coalesce', 'on_time_seconds': 120, 'catch_up_limit_minutes': 30
+        })
+        config.start()
+        self.addCleanup(config.stop)
+
+    def test_on_time(self):
+        self.assertEqual(scheduler.decide_trigger(at(13, 50), at(13, 50, 1)), ('on_time', at(13, 50), 0, 1.0))
+
+    def test_late_trigger_for_its_own_slot_catches_up(self):
+        action, slot, missed, lateness = scheduler.decide_trigger(at(13, 50), at(13, 55))
+
+        self.assertEqual((action, slot, missed, lateness), ('catch_up', at(13, 50), 0, 300.0))
+
+    def test_missed_slots_coalesce_into_one_run_for_the_latest(self):
+        # Due at 10:50, woke at 1:52 PM (overrun or suspend): one run for the 1:50 slot
+        action, slot, missed, lateness = scheduler.decide_trigger(at(10, 50), at(13, 52))
+
+        self.assertEqual((action, slot, missed, lateness), ('catch_up', at(13, 50), 3, 120.0))
+
+    def test_missed_slots_are_never_on_time(self):
+        action, _, missed, _ = scheduler.decide_trigger(at(12, 50), at(13, 50, 30))
+
+        self.assertEqual((action, missed), ('catch_up', 1))
+
+    def test_skipped_past_the_catch_up_limit(self):
+        action, slot, missed, lateness = scheduler.decide_trigger(at(10, 50), at(14, 25))
+
+        self.assertEqual((action, slot, missed, lateness), ('skipped', at(13, 50), 3, 2100.0))
+
+    def test_skip_policy_waits_for_the_next_slot(self):
+        with mock.patch.dict(scheduler.SCHEDULE_CONFIG, {'catch_up': 'skip'}):
+            self.assertEqual(scheduler.decide_trigger(at(10, 50), at(13, 52))[0], 'skipped')
+            self.assertEqual(scheduler.decide_trigger(at(13, 50), at(13, 51))[0], 'on_time')
+
+    def test_slot_across_midnight(self):
+        due = ARIZONA.localize(datetime.datetime(2026, 10, 18, 23, 50))
+        woke = ARIZONA.localize(datetime.datetime(2026, 10, 19, 0, 55))
+
+        self.assertEqual(scheduler.decide_trigger(due, woke),
+                         ('catch_up', ARIZONA.localize(datetime.datetime(2026, 10, 19, 0, 50)), 1, 300.0))
+
+if __name__ == "__main__":
+    unittest.main()
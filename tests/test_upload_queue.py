@@ -0,0 +1,166 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+import sql
+import upload_queue
+
+HEADERS = ['Location', 'Car_Count', 'Report_Date', 'Created_At']
+
+class QueueTestCase(unittest.TestCase):
+    """A fresh queue database per test"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = mock.patch.dict(upload_queue.QUEUE_CONFIG, {
+            'db_path': os.path.join(self.directory, "upload_queue.db"), 'max_attempts': 2
+        })
+        self.config.start()
+
+    def tearDown(self):
+        self.config.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def enqueue(self, table_name='custom_financials_2', report_date=datetime.date(2026, 10, 18), hour=13,
+                created_at_hour='1 PM', rows=1):
+        data = [[f'Shop {i}', str(i), report_date.strftime('%m/%d/%Y'), created_at_hour] for i in range(rows)]
+        return upload_queue.enqueue(table_name, HEADERS, data, report_date, report_date, hour, created_at_hour)
+
+class UploadQueueTest(QueueTestCase):
+    def test_enqueue_round_trips_payload(self):
+        entry_id = self.enqueue(rows=3)
+
+        headers, data = upload_queue.load_payload(entry_id)
+        self.assertEqual(headers, HEADERS)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(upload_queue.pending_entries()[0]['row_count'], 3)
+
+    def test_claim_is_all_or_none(self):
+        first, second = self.enqueue(), self.enqueue(hour=14, created_at_hour='2 PM')
+
+        self.assertTrue(upload_queue.claim([first], 'drain-a'))
+        # second is free but first is held, so drain-b gets neither
+        self.assertFalse(upload_queue.claim([first, second], 'drain-b'))
+        self.assertEqual(upload_queue.get_statuses([first, second]), {first: 'in_progress', second: 'pending'})
+        self.assertEqual(upload_queue.pending_count(), 1)
+
+    def test_release_claims_of_one_drain(self):
+        first, second = self.enqueue(), self.enqueue(hour=14, created_at_hour='2 PM')
+        upload_queue.claim([first], 'drain-a')
+        upload_queue.claim([second], 'drain-b')
+
+        self.assertEqual(upload_queue.release_claims('drain-a'), 1)
+        self.assertEqual(upload_queue.get_statuses([first, second]), {first: 'pending', second: 'in_progress'})
+
+    def test_release_claims_with_expired_lease(self):
+        entry_id = self.enqueue()
+        with mock.patch.dict(upload_queue.QUEUE_CONFIG, {'lease_seconds': -60}):
+            upload_queue.claim([entry_id], 'dead-drain')
+
+        self.assertEqual(upload_queue.release_claims(), 1)
+        self.assertTrue(upload_queue.claim([entry_id], 'drain-b'))
+
+    def test_mark_done_supersedes_older_snapshots(self):
+        older, newer = self.enqueue(), self.enqueue(hour=14, created_at_hour='2 PM')
+
+        upload_queue.mark_done(newer, [older])
+
+        self.assertEqual(upload_queue.get_statuses([older, newer]), {older: 'superseded', newer: 'done'})
+        self.assertEqual(upload_queue.pending_count(), 0)
+
+    def test_failed_attempts_dead_letter_at_max_attempts(self):
+        entry_id = self.enqueue()
+
+        self.assertFalse(upload_queue.mark_attempt_failed(entry_id, "timeout"))
+        self.assertEqual(upload_queue.get_statuses([entry_id])[entry_id], 'pending')
+        self.assertTrue(upload_queue.mark_attempt_failed(entry_id, "timeout"))
+        self.assertEqual(upload_queue.pending_entries('failed')[0]['last_error'], "timeout")
+
+class DrainUploadQueueTest(QueueTestCase):
+    """drain_upload_queue against the real queue, with SQL itself mocked out"""
+    def setUp(self):
+        super().setUp()
+        self.uploaded = []
+        self.upload_results = {}
+        patches = [
+            mock.patch.object(sql, 'create_connection', return_value=object()),
+            mock.patch.object(sql, 'release_connection'),
+            mock.patch.object(sql, 'record_hourly_history', return_value=True),
+            mock.patch.object(sql, 'upload_table_snapshot', side_effect=self.upload_snapshot)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def upload_snapshot(self, table_name, headers, data, report_date, run_date, hour):
+        self.uploaded.append((table_name, report_date.date(), hour))
+        return self.upload_results.get((table_name, hour), True)
+
+    def test_newest_snapshot_per_report_date_supersedes_the_rest(self):
+        one_pm = self.enqueue(hour=13, created_at_hour='1 PM')
+        two_pm = self.enqueue(hour=14, created_at_hour='2 PM')
+        ro = self.enqueue('ro_marketing_2', hour=14, created_at_hour='2 PM')
+        next_day = self.enqueue(report_date=datetime.date(2026, 10, 19), hour=1, created_at_hour='1 AM')
+
+        counts = sql.drain_upload_queue()
+
+        self.assertEqual(counts, {'uploaded': 3, 'superseded': 1, 'failed': 0, 'pending': 0})
+        self.assertEqual(sorted(self.uploaded), [
+            ('custom_financials_2', datetime.date(2026, 10, 18), 14),
+            ('custom_financials_2', datetime.date(2026, 10, 19), 1),
+            ('ro_marketing_2', datetime.date(2026, 10, 18), 14)
+        ])
+        self.assertEqual(upload_queue.get_statuses([one_pm, two_pm, ro, next_day]),
+                         {one_pm: 'superseded', two_pm: 'done', ro: 'done', next_day: 'done'})
+        # Every queued hour still gets its history row, superseded or not
+        self.assertEqual(sql.record_hourly_history.call_count, 3)
+
+    def test_failed_upload_stays_pending_and_keeps_older_snapshots(self):
+        older = self.enqueue(hour=13, created_at_hour='1 PM')
+        newer = self.enqueue(hour=14, created_at_hour='2 PM')
+        ro = self.enqueue('ro_marketing_2', hour=14, created_at_hour='2 PM')
+        self.upload_results[('custom_financials_2', 14)] = False
+
+        counts = sql.drain_upload_queue()
+
+        self.assertEqual(counts, {'uploaded': 1, 'superseded': 0, 'failed': 0, 'pending': 2})
+        self.assertEqual(upload_queue.get_statuses([older, newer, ro]),
+                         {older: 'pending', newer: 'pending', ro: 'done'})
+
+        counts = sql.drain_upload_queue()
+        self.assertEqual(counts['failed'], 1)
+        self.assertEqual(upload_queue.get_statuses([newer])[newer], 'failed')
+
+    def test_groups_claimed_by_another_drain_are_skipped(self):
+        held = self.enqueue(hour=13, created_at_hour='1 PM')
+        free = self.enqueue('ro_marketing_2', hour=13, created_at_hour='1 PM')
+        upload_queue.claim([held], 'other-process')
+
+        counts = sql.drain_upload_queue()
+
+        self.assertEqual(counts['uploaded'], 1)
+        self.assertEqual(self.uploaded, [('ro_marketing_2', datetime.date(2026, 10, 18), 13)])
+        self.assertEqual(upload_queue.get_statuses([held, free]), {held: 'in_progress', free: 'done'})
+
+    def test_unreachable_sql_keeps_everything_queued(self):
+        entry_id = self.enqueue()
+        sql.create_connection.return_value = None
+
+        counts = sql.drain_upload_queue()
+
+        self.assertEqual(counts, {'uploaded': 0, 'superseded': 0, 'failed': 0, 'pending': 1})
+        self.assertEqual(self.uploaded, [])
+        self.assertEqual(upload_queue.get_statuses([entry_id])[entry_id], 'pending')
+
+    def test_wait_reports_an_entry_held_elsewhere_as_queued(self):
+        entry_id = self.enqueue()
+        upload_queue.claim([entry_id], 'other-process')
+
+        self.assertEqual(sql.wait_for_queued_upload(entry_id, timeout=0), 'queued')
+        upload_queue.mark_done(entry_id)
+        self.assertEqual(sql.wait_for_queued_upload(entry_id, timeout=0), 'done')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+import os
+import gzip
+import json
+import sqlite3
+import datetime
+import pytz
+
+QUEUE_CONFIG = {
+    'db_path': os.getenv('UPLOAD_QUEUE_DB', os.path.join(os.getcwd(), "Artifact Store", "upload_queue.db")),
+    'enabled': os.getenv('UPLOAD_QUEUE_ENABLED', '1') == '1',
+    # How often the background drainer looks for a backlog while SQL is down
+    'drain_interval_seconds': int(os.getenv('UPLOAD_QUEUE_DRAIN_SECONDS', '60')),
+    # Failed upserts (SQL reachable, snapshot rejected) before an entry is set aside as failed
+    'max_attempts': int(os.getenv('UPLOAD_QUEUE_MAX_ATTEMPTS', '5')),
+    # A drain claims its entries for this long; a drainer that died mid-upload loses them after it
+    'lease_seconds': int(os.getenv('UPLOAD_QUEUE_LEASE_SECONDS', '900')),
+    # How long a run waits on another process's drain before leaving its entry to the background drainer
+    'wait_seconds': int(os.getenv('UPLOAD_QUEUE_WAIT_SECONDS', '30')),
+    'retention_days': int(os.getenv('UPLOAD_QUEUE_RETENTION_DAYS', '7'))
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    created_at_hour TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    enqueued_at TEXT NOT NULL,
+    finished_at TEXT,
+    claimed_by TEXT,
+    lease_until TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_upload_queue_status ON upload_queue (status, id);
+"""
+
+def get_arizona_time():
+    return datetime.datetime.now(pytz.timezone('US/Arizona'))
+
+def timestamp(moment=None):
+    return (moment or get_arizona_time()).strftime('%Y-%m-%dT%H:%M:%S')
+
+def date_key(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+def connect():
+    os.makedirs(os.path.dirname(QUEUE_CONFIG['db_path']), exist_ok=True)
+    conn = sqlite3.connect(QUEUE_CONFIG['db_path'], timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # FULL makes each enqueue survive power loss, not just a process crash
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def encode_payload(headers, data):
+    return gzip.compress(json.dumps([headers] + [list(row) for row in data], separators=(',', ':')).encode('utf-8'))
+
+def decode_payload(payload):
+    rows = json.loads(gzip.decompress(payload).decode('utf-8'))
+    return rows[0], rows[1:]
+
+def enqueue(table_name, headers, data, report_date, run_date, hour, created_at_hour):
+    """Durably append one table snapshot; returns its queue id (ids give replay order)"""
+    conn = connect()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO upload_queue (table_name, report_date, run_date, hour, created_at_hour, "
+                "row_count, payload, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (table_name, date_key(report_date), date_key(run_date), int(hour), created_at_hour,
+                 len(data), encode_payload(headers, data), timestamp())
+            )
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def pending_entries(status='pending'):
+    """Snapshots in a status (pending by default) oldest first, without payloads (load_payload reads one on demand)"""
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "SELECT id, table_name, report_date, run_date, hour, created_at_hour, row_count, attempts, last_error "
+            "FROM upload_queue WHERE status = ? ORDER BY id", (status,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+def pending_count():
+    conn = connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM upload_queue WHERE status = 'pending'").fetchone()[0]
+    finally:
+        conn.close()
+
+def load_payload(entry_id):
+    """(headers, data) stored for a queue entry"""
+    conn = connect()
+    try:
+        row = conn.execute("SELECT payload FROM upload_queue WHERE id = ?", (entry_id,)).fetchone()
+        return decode_payload(row['payload']) if row else (None, None)
+    finally:
+        conn.close()
+
+def claim(entry_ids, drain_id):
+    """Atomically take pending entries for one drain (all or none); False if another drain holds any.
+
+    The scheduler's drainer thread and a run process can drain the same queue,
+    so an entry is only uploaded by the drain that moved it to in_progress.
+    """
+    lease_until = timestamp(get_arizona_time() + datetime.timedelta(seconds=QUEUE_CONFIG['lease_seconds']))
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        claimed = conn.executemany(
+            "UPDATE upload_queue SET status = 'in_progress', claimed_by = ?, lease_until = ? "
+            "WHERE id = ? AND status = 'pending'",
+            [(drain_id, lease_until, entry_id) for entry_id in entry_ids]
+        ).rowcount
+        if claimed != len(entry_ids):
+            conn.rollback()
+            return False
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+def release_claims(drain_id=None):
+    """Return in_progress entries to pending: one drain's leftovers, or (no drain_id) expired leases"""
+    conn = connect()
+    try:
+        with conn:
+            if drain_id:
+                cursor = conn.execute("UPDATE upload_queue SET status = 'pending', claimed_by = NULL, lease_until = NULL "
+                                      "WHERE status = 'in_progress' AND claimed_by = ?", (drain_id,))
+            else:
+                cursor = conn.execute("UPDATE upload_queue SET status = 'pending', claimed_by = NULL, lease_until = NULL "
+                                      "WHERE status = 'in_progress' AND lease_until < ?", (timestamp(),))
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+def mark_done(entry_id, superseded_ids=()):
+    """Mark an uploaded snapshot done and the older snapshots it replaced superseded, atomically"""
+    conn = connect()
+    try:
+        with conn:
+            now = timestamp()
+            conn.execute("UPDATE upload_queue SET status = 'done', finished_at = ?, claimed_by = NULL WHERE id = ?",
+                         (now, entry_id))
+            conn.executemany("UPDATE upload_queue SET status = 'superseded', finished_at = ?, claimed_by = NULL WHERE id = ?",
+                             [(now, superseded_id) for superseded_id in superseded_ids])
+    finally:
+        conn.close()
+
+def mark_attempt_failed(entry_id, error):
+    """Record a failed attempt; the entry stays pending for the next drain until max_attempts (then failed).
+
+    Returns True if the entry was given up on.
+    """
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE upload_queue SET attempts = attempts + 1, last_error = ?, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END, claimed_by = NULL, "
+                "finished_at = CASE WHEN attempts + 1 >= ? THEN ? ELSE finished_at END WHERE id = ?",
+                (str(error)[:500], QUEUE_CONFIG['max_attempts'], QUEUE_CONFIG['max_attempts'], timestamp(), entry_id)
+            )
+            row = conn.execute("SELECT status FROM upload_queue WHERE id = ?", (entry_id,)).fetchone()
+        return bool(row) and row['status'] == 'failed'
+    finally:
+        conn.close()
+
+def get_statuses(entry_ids):
+    conn = connect()
+    try:
+        rows = conn.execute(
+            f"SELECT id, status FROM upload_queue WHERE id IN ({', '.join('?' * len(entry_ids))})",
+            tuple(entry_ids)
+        ).fetchall() if entry_ids else []
+        return {row['id']: row['status'] for row in rows}
+    finally:
+        conn.close()
+
+def prune_finished(today=None):
+    """Delete done/superseded/failed snapshots past the retention window"""
+    today = today or get_arizona_time().date()
+    cutoff = (today - datetime.timedelta(days=QUEUE_CONFIG['retention_days'])).strftime("%Y-%m-%d")
+    conn = connect()
+    try:
+        with conn:
+            cursor = conn.execute("DELETE FROM upload_queue WHERE status IN ('done', 'superseded', 'failed') "
+                                  "AND run_date < ?", (cutoff,))
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    for status in ('pending', 'failed'):
+        for entry in pending_entries(status):
+            print(f"#{entry['id']:<6} {status:<8} {entry['run_date']} H{entry['hour']:02d} {entry['table_name']:<20} "
+                  f"{entry['row_count']:>5} rows  report {entry['report_date']}  attempts {entry['attempts']}"
+                  f"{'  ' + entry['last_error'] if entry['last_error'] else ''}")
+    print(f"{pending_count()} pending")